@@ -0,0 +1,332 @@
+﻿"""
+Module du client asyncio pour les traitements d'IA en grand nombre (NotesAI).
+"""
+import asyncio
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+from queue import Queue, Empty
+from threading import Thread, Lock
+
+try:
+    import aiohttp
+except ImportError:  # aiohttp est optionnel : repli sur requests dans un pool de threads
+    aiohttp = None
+
+from ai_cache import make_cache_key
+
+
+class RateLimitError(RuntimeError):
+    """Le fournisseur refuse la requête pour dépassement de quota (HTTP 429)."""
+
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        # Délai d'attente demandé par le fournisseur (secondes), s'il est indiqué
+        self.retry_after = retry_after
+
+
+def parse_retry_after(value):
+    """Lire l'en-tête Retry-After (en secondes), ou None."""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return None
+
+
+class _AiohttpTransport:
+    """Envoi des requêtes avec aiohttp : toutes partagent la boucle et ses connexions."""
+
+    # Annuler la tâche ferme la connexion : la requête s'arrête vraiment
+    abortable = True
+
+    def __init__(self, timeout, pool_size):
+        self._timeout = aiohttp.ClientTimeout(sock_connect=timeout[0], sock_read=timeout[1])
+        self._pool_size = pool_size
+        self._session = None
+
+    async def post(self, provider, url, headers, data):
+        if self._session is None:
+            # La session doit être créée dans la boucle qui l'utilise
+            connector = aiohttp.TCPConnector(limit=self._pool_size)
+            self._session = aiohttp.ClientSession(connector=connector, timeout=self._timeout)
+        async with self._session.post(url, headers=headers, json=data) as response:
+            text = await response.text()
+            return response.status, text, parse_retry_after(response.headers.get("Retry-After"))
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+class _ExecutorTransport:
+    """Envoi des requêtes par les sessions requests d'AIService, dans un pool de threads."""
+
+    # Annuler la tâche abandonne seulement son résultat : l'appel bloquant à
+    # requests continue et garde son thread et sa connexion jusqu'à la réponse
+    abortable = False
+
+    def __init__(self, ai_service, workers):
+        self._ai_service = ai_service
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+
+    def _post(self, provider, url, headers, data):
+        response = self._ai_service._post(provider, url, headers=headers, json=data)
+        return response.status_code, response.text, parse_retry_after(response.headers.get("Retry-After"))
+
+    async def post(self, provider, url, headers, data):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._executor, self._post, provider, url, headers, data)
+
+    async def close(self):
+        self._executor.shutdown(wait=False)
+
+
+class AsyncAIClient:
+    """
+    Client asyncio pour envoyer de nombreux traitements d'IA à la fois.
+
+    Une boucle d'événements tourne dans un thread dédié : des centaines de
+    requêtes peuvent y être en cours simultanément sans un thread chacune.
+    Un sémaphore par fournisseur borne le nombre de requêtes en vol (le
+    modèle local n'en reçoit qu'une à la fois). Les requêtes sont construites
+    et les réponses lues par AIService (request_spec, parse_result), et le
+    cache des réponses est partagé. Sans aiohttp, les requêtes passent par
+    les sessions requests d'AIService dans un pool de threads.
+    """
+
+    DEFAULT_CONCURRENCY = {"ollama": 1, "openai": 64, "anthropic": 64}
+
+    def __init__(self, ai_service, concurrency=None):
+        """
+        Initialiser le client et démarrer sa boucle d'événements.
+
+        Args:
+            ai_service (AIService): Le service (configuration, clés, cache)
+            concurrency (dict): Nombre maximal de requêtes en vol par fournisseur
+                (complète DEFAULT_CONCURRENCY)
+        """
+        self.ai_service = ai_service
+        self.concurrency = dict(self.DEFAULT_CONCURRENCY)
+        if concurrency:
+            self.concurrency.update(concurrency)
+
+        total = sum(self.concurrency.values())
+        if aiohttp is not None:
+            self._transport = _AiohttpTransport(ai_service.timeout, total)
+        else:
+            self._transport = _ExecutorTransport(ai_service, total)
+
+        self.loop = asyncio.new_event_loop()
+        self._semaphores = {}
+        self._thread = Thread(target=self.loop.run_forever, daemon=True)
+        self._thread.start()
+
+    def _semaphore(self, provider):
+        """Sémaphore du fournisseur (appelé dans la boucle)."""
+        semaphore = self._semaphores.get(provider)
+        if semaphore is None:
+            semaphore = self._semaphores[provider] = asyncio.Semaphore(self.concurrency.get(provider, 4))
+        return semaphore
+
+    async def complete(self, prompt, action_type, provider=None, use_cache=True):
+        """
+        Envoyer un prompt et renvoyer le texte de la réponse.
+
+        Returns:
+            tuple: (texte, réponse venue du cache)
+
+        Raises:
+            RateLimitError: Si le quota du fournisseur est dépassé
+            RuntimeError: Si le fournisseur répond par une autre erreur
+        """
+        service = self.ai_service
+        provider = provider or service.current_provider
+        provider_info = dict(service.providers[provider])
+        cache_key = make_cache_key(provider, provider_info["model"], action_type, prompt)
+        if use_cache:
+            result = service.cache.get(cache_key)
+            if result is not None:
+                return result, True
+
+        url, headers, data = service.request_spec(provider, provider_info, prompt)
+        async with self._semaphore(provider):
+            started = time.monotonic()
+            try:
+                status, text, retry_after = await self._transport.post(provider, url, headers, data)
+            except asyncio.CancelledError:
+                # Requête doublée perdante : sa durée est au moins celle-ci, on la garde
+                # pour que le p95 continue de refléter les réponses lentes
+                service.latency.record_censored(provider, provider_info["model"], action_type,
+                                                time.monotonic() - started)
+                raise
+            except Exception:
+                service.latency.record_failure(provider, provider_info["model"])
+                raise
+            elapsed = time.monotonic() - started
+        if status != 200:
+            service.latency.record_failure(provider, provider_info["model"])
+            if status == 429:
+                raise RateLimitError(f"Erreur {provider}: {status} - {text}", retry_after)
+            raise RuntimeError(f"Erreur {provider}: {status} - {text}")
+        service.latency.record(provider, provider_info["model"], action_type, elapsed)
+        result = service.parse_result(json.loads(text), provider_info, provider)
+        service.cache.put(cache_key, result)
+        return result, False
+
+    async def complete_hedged(self, prompt, action_type, providers, hedge_after, use_cache=True):
+        """
+        Envoyer un prompt au premier fournisseur, doublé si la réponse tarde.
+
+        Si le premier fournisseur n'a pas répondu après `hedge_after` secondes
+        (ou s'il échoue), la même requête part vers le suivant de la liste ;
+        la première réponse obtenue est gardée et l'autre requête est annulée
+        (sa connexion est fermée). Sans aiohttp, une requête en cours ne peut
+        pas être arrêtée : elle n'est donc jamais doublée, seul l'échec fait
+        passer au fournisseur suivant.
+
+        Args:
+            providers (list): Fournisseurs par ordre de préférence
+            hedge_after (float): Délai avant la requête de secours (None : seulement en cas d'échec)
+
+        Returns:
+            tuple: (fournisseur, texte, réponse venue du cache)
+        """
+        providers = list(providers)
+        pending = {}
+        if not self._transport.abortable:
+            hedge_after = None
+
+        def launch():
+            provider = providers.pop(0)
+            task = asyncio.ensure_future(self.complete(prompt, action_type, provider, use_cache))
+            pending[task] = provider
+
+        launch()
+        error = None
+        try:
+            while pending:
+                timeout = hedge_after if providers and len(pending) == 1 else None
+                done, _ = await asyncio.wait(pending, timeout=timeout,
+                                             return_when=asyncio.FIRST_COMPLETED)
+                if not done:
+                    # Le fournisseur dépasse son délai habituel : requête de secours
+                    launch()
+                    continue
+                for task in done:
+                    provider = pending.pop(task)
+                    if task.exception() is None:
+                        result, cached = task.result()
+                        return provider, result, cached
+                    error = task.exception()
+                if not pending and providers:
+                    launch()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+
+    async def process(self, content, action_type, provider=None, use_cache=True):
+        """
+        Traiter un contenu ; même résultat que les rappels de process_with_ai.
+
+        Returns:
+            dict: {"success", "action", "result", "cached"} ou {"success": False, "error"}
+        """
+        if not content:
+            return {"success": False, "error": "Le contenu est vide"}
+        try:
+            prompt = self.ai_service.build_prompt(content, action_type)
+            if prompt is None:
+                return {"success": False, "error": f"Prompt introuvable pour l'action : {action_type}"}
+            result, cached = await self.complete(prompt, action_type, provider, use_cache)
+            return self.ai_service.format_result(action_type, result, cached)
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+
+    def submit(self, coroutine):
+        """
+        Exécuter une coroutine dans la boucle du client depuis un autre thread.
+
+        Returns:
+            concurrent.futures.Future: Son résultat
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop)
+
+    def process_many(self, items, action_type, callback, provider=None, use_cache=True):
+        """
+        Traiter de nombreux contenus simultanément.
+
+        Args:
+            items (iterable): Paires (clé, contenu), par exemple (identifiant de note, texte)
+            action_type (str): Le type d'action
+            callback (function): Appelée avec (clé, résultat) pour chaque contenu,
+                dans le thread de la boucle (voir TkCallbackBridge pour l'interface)
+
+        Returns:
+            concurrent.futures.Future: Terminé quand tous les contenus sont traités
+        """
+        async def run_one(key, content):
+            callback(key, await self.process(content, action_type, provider, use_cache))
+
+        async def run_all():
+            await asyncio.gather(*(run_one(key, content) for key, content in items))
+
+        return self.submit(run_all())
+
+    def close(self):
+        """Fermer les connexions et arrêter la boucle."""
+        if not self.loop.is_running():
+            return
+        try:
+            self.submit(self._transport.close()).result(timeout=5)
+        except Exception as e:
+            print(f"Erreur lors de la fermeture du client IA: {str(e)}")
+        self.loop.call_soon_threadsafe(self.loop.stop)
+        self._thread.join(timeout=5)
+
+
+class TkCallbackBridge:
+    """
+    Passage des résultats d'un autre thread vers la boucle Tk.
+
+    Tk ne doit être utilisé que depuis son propre thread : les fonctions
+    enveloppées par wrap() déposent leurs appels dans une file, vidée
+    périodiquement par la boucle Tk.
+    """
+
+    def __init__(self, root, interval=50):
+        """
+        Args:
+            root (tk.Tk): La fenêtre racine
+            interval (int): Intervalle de lecture de la file (millisecondes)
+        """
+        self.root = root
+        self.interval = interval
+        self._calls = Queue()
+        self._lock = Lock()
+        self._polling = False
+
+    def wrap(self, function):
+        """Envelopper une fonction pour qu'elle s'exécute dans le thread de Tk (appeler depuis Tk)."""
+        def deliver(*args):
+            self._calls.put((function, args))
+        with self._lock:
+            if not self._polling:
+                self._polling = True
+                self.root.after(self.interval, self._drain)
+        return deliver
+
+    def _drain(self):
+        """Exécuter les appels en attente (dans le thread de Tk)."""
+        try:
+            while True:
+                function, args = self._calls.get_nowait()
+                try:
+                    function(*args)
+                except Exception as e:
+                    print(f"Erreur lors du traitement d'un résultat d'IA: {str(e)}")
+        except Empty:
+            pass
+        if self.root.winfo_exists():
+            self.root.after(self.interval, self._drain)
@@ -0,0 +1,198 @@
+﻿"""
+Module de catégorisation de toutes les notes par lots pour l'application NotesAI.
+"""
+import asyncio
+import time
+
+from ai_scheduler import PRIORITY_BACKGROUND
+
+
+UNCATEGORIZED = "Non classé"
+
+
+class TokenBucket:
+    """
+    Seau à jetons pour limiter un débit.
+
+    Le seau se remplit de `rate` jetons par seconde jusqu'à `capacity` ;
+    chaque requête en consomme et attend s'il n'y en a pas assez.
+    """
+
+    def __init__(self, rate, capacity=None):
+        """
+        Args:
+            rate (float): Jetons ajoutés par seconde
+            capacity (float): Nombre maximal de jetons (par défaut une seconde de débit)
+        """
+        self.rate = rate
+        self.capacity = capacity if capacity is not None else max(rate, 1)
+        self.tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, amount=1):
+        """Attendre que `amount` jetons soient disponibles puis les consommer."""
+        amount = min(amount, self.capacity)
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self.tokens >= amount:
+                    self.tokens -= amount
+                    return
+                await asyncio.sleep((amount - self.tokens) / self.rate)
+
+
+class BatchCategorizer:
+    """
+    Catégorisation par l'IA de toutes les notes "Non classé".
+
+    Les notes sont confiées au planificateur d'AIService avec la priorité
+    de fond, par lots de `batch_size` : les actions de l'utilisateur passent
+    devant, et le fournisseur ne reçoit pas plus de requêtes simultanées
+    que ses threads (une seule pour le modèle local). Le débit est en plus
+    limité par fournisseur (requêtes et jetons par minute) pour rester sous
+    les quotas, et un refus pour quota (429) est réessayé après le délai
+    demandé. Les catégories d'un lot sont écrites ensemble, en une seule
+    écriture sur disque, avec NoteModel.update_categories.
+
+    La reprise après une interruption est naturelle : seules les notes
+    encore "Non classé" sont envoyées, les lots déjà écrits ne sont donc pas
+    refaits. `progress` indique l'avancement et le débit : "unchanged"
+    compte les notes laissées "Non classé" (note vide, ou réponse "Non
+    classé" du modèle), "failed" les notes sans réponse utilisable.
+    """
+
+    # (requêtes par minute, jetons par minute) ; None : pas de limite
+    DEFAULT_RATE_LIMITS = {
+        "ollama": None,
+        "openai": (500, 200000),
+        "anthropic": (50, 40000),
+    }
+
+    MAX_ATTEMPTS = 5
+
+    def __init__(self, note_model, ai_service, batch_size=50, rate_limits=None):
+        """
+        Initialiser la catégorisation.
+
+        Args:
+            note_model (NoteModel): Le modèle dont les notes sont catégorisées
+            ai_service (AIService): Le service d'IA (fournisseur et modèle actuels)
+            batch_size (int): Nombre de notes écrites ensemble
+            rate_limits (dict): Limites par fournisseur (complète DEFAULT_RATE_LIMITS)
+        """
+        self.note_model = note_model
+        self.ai_service = ai_service
+        self.batch_size = batch_size
+        self.rate_limits = dict(self.DEFAULT_RATE_LIMITS)
+        if rate_limits:
+            self.rate_limits.update(rate_limits)
+        self.provider = ai_service.current_provider
+        # Limites de débit du fournisseur (None : pas de limite)
+        limits = self.rate_limits.get(self.provider)
+        if limits:
+            requests_per_minute, tokens_per_minute = limits
+            self._request_bucket = TokenBucket(requests_per_minute / 60.0)
+            self._token_bucket = TokenBucket(tokens_per_minute / 60.0, tokens_per_minute / 6.0)
+        else:
+            self._request_bucket = self._token_bucket = None
+        self._stop = False
+        self._started = None
+        self.progress = {"done": 0, "total": 0, "unchanged": 0, "failed": 0, "rate": 0.0,
+                         "finished": False}
+
+    def start(self):
+        """
+        Lancer la catégorisation dans la boucle du client asyncio.
+
+        Returns:
+            concurrent.futures.Future: Terminé à la fin (ou à l'arrêt)
+        """
+        self._stop = False
+        return self.ai_service.get_async_client().submit(self.run())
+
+    def stop(self):
+        """Arrêter après le lot en cours (ses résultats sont écrits)."""
+        self._stop = True
+
+    def _pending_notes(self):
+        """Notes encore à catégoriser, les plus récentes d'abord."""
+        return [note_id for note_id, _ in self.note_model.get_category_notes(UNCATEGORIZED)]
+
+    async def run(self):
+        """Catégoriser les notes "Non classé", lot par lot."""
+        note_ids = self._pending_notes()
+        self.progress = {"done": 0, "total": len(note_ids), "unchanged": 0, "failed": 0,
+                         "rate": 0.0, "finished": False}
+        self._started = time.monotonic()
+
+        try:
+            for start in range(0, len(note_ids), self.batch_size):
+                if self._stop:
+                    break
+                batch = note_ids[start:start + self.batch_size]
+                results = await asyncio.gather(*(self._categorize(note_id) for note_id in batch))
+                categories = {note_id: category for note_id, category in zip(batch, results)
+                              if category and category != UNCATEGORIZED}
+                # Écriture du lot hors de la boucle, en une seule écriture sur disque
+                await asyncio.get_running_loop().run_in_executor(
+                    None, lambda: self.note_model.update_categories(categories,
+                                                                    only_from=UNCATEGORIZED))
+                failed = sum(1 for category in results if not category)
+                self.progress["done"] += len(batch)
+                self.progress["failed"] += failed
+                self.progress["unchanged"] += len(batch) - len(categories) - failed
+                self.progress["rate"] = self.progress["done"] / max(time.monotonic() - self._started, 1e-6)
+        except Exception as e:
+            print(f"Erreur lors de la catégorisation des notes: {str(e)}")
+        finally:
+            self.progress["finished"] = True
+        return self.progress
+
+    async def _categorize(self, note_id):
+        """Demander la catégorie d'une note (None en cas d'échec)."""
+        loop = asyncio.get_running_loop()
+        # La lecture du contenu peut aller sur disque (stockage 'split')
+        content = await loop.run_in_executor(None, self.note_model.get_content, note_id)
+        if not content:
+            # Rien à classer : la note reste "Non classé" sans être un échec
+            return UNCATEGORIZED
+        prompt = self.ai_service.build_prompt(content, "categorie")
+        if prompt is None:
+            return None
+
+        for attempt in range(self.MAX_ATTEMPTS):
+            if self._request_bucket is not None:
+                await self._request_bucket.acquire()
+                # Estimation grossière : quatre caractères par jeton, plus la réponse
+                await self._token_bucket.acquire(len(prompt) // 4 + 16)
+            result = await self._submit(content)
+            if result.get("rate_limited"):
+                await asyncio.sleep(result.get("retry_after") or 2 ** attempt)
+                continue
+            if not result.get("success"):
+                if not result.get("cancelled"):
+                    print(f"Erreur lors de la catégorisation de {note_id}: {result.get('error')}")
+                return None
+            return result["result"]
+        return None
+
+    def _submit(self, content):
+        """
+        Confier une note au planificateur, avec la priorité de fond.
+
+        Returns:
+            asyncio.Future: Le résultat de process_with_ai
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def deliver(result):
+            # Appelée dans un thread du planificateur
+            loop.call_soon_threadsafe(lambda: future.done() or future.set_result(result))
+
+        self.ai_service.process_with_ai(content, "categorie", deliver,
+                                        priority=PRIORITY_BACKGROUND, provider=self.provider)
+        return future
@@ -0,0 +1,162 @@
+﻿"""
+Module de cache des réponses d'IA pour l'application NotesAI.
+"""
+import os
+import json
+import hashlib
+import tempfile
+from collections import OrderedDict
+from threading import Lock
+
+
+def make_cache_key(provider, model, action_type, prompt):
+    """Clé d'une réponse : fournisseur, modèle, action et empreinte du prompt complet."""
+    digest = hashlib.sha256(prompt.encode("utf-8")).hexdigest()
+    return hashlib.sha256(f"{provider}\0{model}\0{action_type}\0{digest}".encode("utf-8")).hexdigest()
+
+
+class AIResponseCache:
+    """
+    Cache des réponses d'IA à deux niveaux.
+
+    Les réponses récentes sont gardées en mémoire (LRU de `memory_size`
+    entrées) ; toutes sont aussi écrites dans le dossier `folder`, un petit
+    fichier JSON par réponse. Quand le dossier dépasse `max_disk_bytes`, les
+    fichiers les moins récemment utilisés sont supprimés. Le même prompt
+    envoyé au même modèle pour la même action renvoie donc la réponse
+    enregistrée sans nouvel appel.
+    """
+
+    def __init__(self, folder=None, memory_size=256, max_disk_bytes=50 * 1024 * 1024):
+        """
+        Initialiser le cache.
+
+        Args:
+            folder (str): Le dossier du cache sur disque (None pour la mémoire seule)
+            memory_size (int): Nombre de réponses gardées en mémoire
+            max_disk_bytes (int): Taille maximale du dossier du cache, en octets
+        """
+        self.folder = folder
+        self.memory_size = memory_size
+        self.max_disk_bytes = max_disk_bytes
+        self._lock = Lock()
+        # clé -> réponse, de la moins récente à la plus récente
+        self._memory = OrderedDict()
+        # clé -> taille du fichier, du moins récemment utilisé au plus récent
+        self._disk = OrderedDict()
+        self._disk_bytes = 0
+        self.stats = {"hits": 0, "disk_hits": 0, "misses": 0}
+
+        if folder is not None:
+            try:
+                os.makedirs(folder, exist_ok=True)
+                self._scan_folder()
+            except OSError as e:
+                print(f"Erreur lors de l'ouverture du cache IA: {str(e)}")
+                self.folder = None
+
+    def _scan_folder(self):
+        """Inventorier les fichiers du cache, du moins récemment utilisé au plus récent."""
+        entries = []
+        for entry in os.scandir(self.folder):
+            if entry.name.endswith(".json"):
+                stat = entry.stat()
+                entries.append((stat.st_mtime, entry.name[:-5], stat.st_size))
+        entries.sort()
+        for _, key, size in entries:
+            self._disk[key] = size
+            self._disk_bytes += size
+
+    def _path(self, key):
+        """Chemin du fichier d'une réponse."""
+        return os.path.join(self.folder, f"{key}.json")
+
+    def _remember(self, key, result):
+        """Placer une réponse en tête du cache mémoire."""
+        self._memory[key] = result
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_size:
+            self._memory.popitem(last=False)
+
+    def get(self, key):
+        """
+        Obtenir une réponse enregistrée.
+
+        Returns:
+            str: La réponse, ou None si elle n'est pas dans le cache
+        """
+        with self._lock:
+            if key in self._memory:
+                self._memory.move_to_end(key)
+                self.stats["hits"] += 1
+                return self._memory[key]
+            on_disk = key in self._disk
+
+        result = None
+        if on_disk:
+            try:
+                with open(self._path(key), "r", encoding="utf-8") as f:
+                    result = json.load(f)["result"]
+                # La date du fichier sert d'ordre d'utilisation pour l'éviction
+                os.utime(self._path(key))
+            except (OSError, ValueError, KeyError):
+                result = None
+
+        with self._lock:
+            if result is None:
+                self.stats["misses"] += 1
+                return None
+            self.stats["disk_hits"] += 1
+            if key in self._disk:
+                self._disk.move_to_end(key)
+            self._remember(key, result)
+            return result
+
+    def put(self, key, result):
+        """Enregistrer une réponse en mémoire et sur disque."""
+        with self._lock:
+            self._remember(key, result)
+        if self.folder is None:
+            return
+
+        data = json.dumps({"result": result}, ensure_ascii=False).encode("utf-8")
+        # Un fichier temporaire propre à chaque écriture : plusieurs threads peuvent
+        # enregistrer la même réponse en même temps
+        tmp_path = None
+        try:
+            fd, tmp_path = tempfile.mkstemp(dir=self.folder, prefix=key, suffix=".tmp")
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp_path, self._path(key))
+        except OSError as e:
+            print(f"Erreur lors de l'enregistrement du cache IA: {str(e)}")
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+
+        with self._lock:
+            self._disk_bytes += len(data) - self._disk.pop(key, 0)
+            self._disk[key] = len(data)
+            evicted = []
+            while self._disk_bytes > self.max_disk_bytes and len(self._disk) > 1:
+                old_key, size = self._disk.popitem(last=False)
+                self._disk_bytes -= size
+                evicted.append(old_key)
+        for old_key in evicted:
+            try:
+                os.remove(self._path(old_key))
+            except OSError:
+                pass
+
+    def clear(self):
+        """Vider le cache (mémoire et disque)."""
+        with self._lock:
+            keys = list(self._disk)
+            self._memory.clear()
+            self._disk.clear()
+            self._disk_bytes = 0
+        for key in keys:
+            try:
+                os.remove(self._path(key))
+            except OSError:
+                pass
@@ -0,0 +1,124 @@
+﻿"""
+Module de suivi des temps de réponse des modèles d'IA pour l'application NotesAI.
+"""
+import math
+import time
+from collections import deque
+from threading import Lock
+
+
+class LatencyTracker:
+    """
+    Temps de réponse observés par fournisseur, modèle et action.
+
+    Pour chaque triplet (fournisseur, modèle, action) sont gardés une
+    moyenne mobile exponentielle (EWMA) des durées et les `window`
+    dernières durées, d'où sont tirés les percentiles (p50, p95...) :
+    une catégorisation et un résumé n'ont pas les mêmes durées et ne
+    partagent donc pas leurs mesures. L'état de santé est commun à toutes
+    les actions d'un modèle : un échec (erreur, quota dépassé, fournisseur
+    injoignable) le met de côté pendant `cooldown` secondes ; il est
+    ensuite réessayé.
+    """
+
+    def __init__(self, alpha=0.2, window=100, cooldown=30.0):
+        """
+        Args:
+            alpha (float): Poids d'une nouvelle mesure dans la moyenne mobile
+            window (int): Nombre de mesures récentes gardées pour les percentiles
+            cooldown (float): Durée (secondes) de mise à l'écart après un échec
+        """
+        self.alpha = alpha
+        self.window = window
+        self.cooldown = cooldown
+        self._lock = Lock()
+        # (fournisseur, modèle, action) -> {"ewma", "samples"}
+        self._stats = {}
+        # (fournisseur, modèle) -> {"failures", "retry_at"}
+        self._health = {}
+
+    def _add_sample(self, provider, model, action, seconds):
+        """Ajouter une durée aux mesures d'une action (appelé sous le verrou)."""
+        entry = self._stats.get((provider, model, action))
+        if entry is None:
+            entry = self._stats[(provider, model, action)] = {
+                "ewma": None, "samples": deque(maxlen=self.window)}
+        if entry["ewma"] is None:
+            entry["ewma"] = seconds
+        else:
+            entry["ewma"] += self.alpha * (seconds - entry["ewma"])
+        entry["samples"].append(seconds)
+
+    def record(self, provider, model, action, seconds):
+        """Enregistrer la durée d'une réponse réussie (le modèle redevient disponible)."""
+        with self._lock:
+            self._add_sample(provider, model, action, seconds)
+            self._health.pop((provider, model), None)
+
+    def record_censored(self, provider, model, action, seconds):
+        """
+        Enregistrer la durée d'une requête interrompue avant sa réponse.
+
+        La réponse aurait pris au moins `seconds` : la mesure est gardée pour
+        que les percentiles reflètent les réponses lentes, sans rien changer
+        à l'état de santé (un modèle mis de côté le reste).
+        """
+        with self._lock:
+            self._add_sample(provider, model, action, seconds)
+
+    def record_failure(self, provider, model):
+        """Enregistrer un échec : le modèle est mis de côté pendant `cooldown` secondes."""
+        with self._lock:
+            health = self._health.setdefault((provider, model), {"failures": 0, "retry_at": 0.0})
+            health["failures"] += 1
+            health["retry_at"] = time.monotonic() + self.cooldown
+
+    def healthy(self, provider, model):
+        """Indiquer si le modèle peut recevoir des requêtes (pas d'échec récent)."""
+        with self._lock:
+            health = self._health.get((provider, model))
+            return health is None or time.monotonic() >= health["retry_at"]
+
+    def ewma(self, provider, model, action):
+        """Moyenne mobile des durées (secondes), ou None sans mesure."""
+        with self._lock:
+            entry = self._stats.get((provider, model, action))
+            return entry["ewma"] if entry else None
+
+    def count(self, provider, model, action):
+        """Nombre de mesures récentes."""
+        with self._lock:
+            entry = self._stats.get((provider, model, action))
+            return len(entry["samples"]) if entry else 0
+
+    def percentile(self, provider, model, action, q):
+        """
+        Percentile `q` (0 à 100) des durées récentes.
+
+        Returns:
+            float: La durée en secondes, ou None sans mesure
+        """
+        with self._lock:
+            entry = self._stats.get((provider, model, action))
+            samples = sorted(entry["samples"]) if entry else []
+        if not samples:
+            return None
+        # Méthode du rang le plus proche
+        rank = math.ceil(q / 100.0 * len(samples))
+        return samples[min(len(samples), max(rank, 1)) - 1]
+
+    def snapshot(self):
+        """
+        Résumé des mesures, pour l'affichage.
+
+        Returns:
+            dict: (fournisseur, modèle, action) -> {"ewma", "p50", "p95", "count", "healthy"}
+        """
+        with self._lock:
+            keys = list(self._stats)
+        return {key: {"ewma": self.ewma(*key),
+                      "p50": self.percentile(*key, 50),
+                      "p95": self.percentile(*key, 95),
+                      "count": self.count(*key),
+                      "healthy": self.healthy(*key[:2])}
+                for key in keys}
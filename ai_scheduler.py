@@ -0,0 +1,248 @@
+﻿"""
+Module de planification des traitements d'IA pour l'application NotesAI.
+"""
+import itertools
+from queue import PriorityQueue
+from threading import Thread, Lock, Event
+
+
+# Classes de priorité : les plus petites passent en premier
+PRIORITY_INTERACTIVE = 0
+PRIORITY_BACKGROUND = 10
+
+CANCELLED_RESULT = {"success": False, "cancelled": True, "error": "Traitement annulé"}
+
+
+class AIJob:
+    """
+    Un traitement d'IA en file d'attente, en cours ou terminé.
+
+    Plusieurs demandes identiques partagent le même traitement : chacune
+    ajoute ses fonctions de rappel (et son étiquette) à la liste des
+    destinataires. Les fragments déjà reçus en mode flux sont renvoyés à un
+    destinataire ajouté en cours de route.
+    """
+
+    def __init__(self, key, provider, priority, run):
+        """
+        Args:
+            key (str): Clé de déduplication (voir ai_cache.make_cache_key)
+            provider (str): Le fournisseur qui exécute le traitement
+            priority (int): La classe de priorité
+            run (callable): (job, on_chunk) -> dictionnaire de résultat
+        """
+        self.key = key
+        self.provider = provider
+        self.priority = priority
+        self.run = run
+        # 'queued', 'running', 'done' ou 'cancelled'
+        self.state = "queued"
+        self.result = None
+        self._lock = Lock()
+        self._done = Event()
+        self._chunks = []
+        self._streaming = False
+        # (rappel final, rappel par fragment ou None, étiquette)
+        self._listeners = []
+
+    @property
+    def cancelled(self):
+        return self.state == "cancelled"
+
+    def add_listener(self, callback, on_chunk=None, tag=None):
+        """Ajouter un destinataire au traitement (False s'il est déjà terminé)."""
+        with self._lock:
+            if self.state in ("done", "cancelled"):
+                return False
+            if on_chunk is not None:
+                self._streaming = True
+                for chunk in self._chunks:
+                    on_chunk(chunk)
+            self._listeners.append((callback, on_chunk, tag))
+            return True
+
+    @property
+    def streaming(self):
+        """Indiquer si un destinataire veut la réponse fragment par fragment."""
+        return self._streaming
+
+    def emit_chunk(self, chunk):
+        """Transmettre un fragment de réponse aux destinataires."""
+        with self._lock:
+            self._chunks.append(chunk)
+            listeners = [on_chunk for _, on_chunk, _ in self._listeners if on_chunk]
+        for on_chunk in listeners:
+            on_chunk(chunk)
+
+    def detach(self, tag=None):
+        """
+        Retirer les destinataires d'une étiquette (tous si tag est None).
+
+        Les destinataires retirés reçoivent CANCELLED_RESULT ; le traitement
+        est annulé lorsqu'il n'en reste aucun.
+        """
+        with self._lock:
+            if self.state in ("done", "cancelled"):
+                return
+            removed = [listener for listener in self._listeners if tag is None or listener[2] == tag]
+            if not removed:
+                return
+            self._listeners = [listener for listener in self._listeners if listener not in removed]
+            if not self._listeners:
+                self.state = "cancelled"
+                self._done.set()
+        for callback, _, _ in removed:
+            callback(dict(CANCELLED_RESULT))
+
+    def cancel(self):
+        """Annuler le traitement pour tous ses destinataires."""
+        self.detach()
+
+    def start(self):
+        """Passer à l'état 'running' (False si le traitement n'est plus en attente)."""
+        with self._lock:
+            if self.state != "queued":
+                return False
+            self.state = "running"
+            return True
+
+    def finish(self, result):
+        """Enregistrer le résultat et le transmettre aux destinataires."""
+        with self._lock:
+            if self.state == "cancelled":
+                return
+            self.state = "done"
+            self.result = result
+            listeners = list(self._listeners)
+            # Un destinataire en mode flux arrivé après le départ reçoit tout d'un bloc
+            whole = not self._chunks and result.get("success")
+            self._done.set()
+        for callback, on_chunk, _ in listeners:
+            if whole and on_chunk is not None:
+                on_chunk(result["result"])
+            callback(result)
+
+    def wait(self, timeout=None):
+        """Attendre la fin du traitement et renvoyer son résultat (None si annulé)."""
+        self._done.wait(timeout)
+        return self.result
+
+
+class AIJobScheduler:
+    """
+    File de traitements d'IA avec un nombre fixe de threads par fournisseur.
+
+    Un modèle local ne traite bien qu'une requête à la fois : au lieu d'un
+    thread par clic, les traitements attendent dans une file à priorités
+    (les actions de l'utilisateur passent devant le travail de fond). Une
+    demande identique à un traitement en attente ou en cours s'y rattache
+    au lieu d'être envoyée une seconde fois, et un traitement devenu inutile
+    (l'utilisateur est passé à une autre note) est annulé.
+    """
+
+    DEFAULT_WORKERS = {"ollama": 1, "openai": 4, "anthropic": 4}
+
+    def __init__(self, workers=None):
+        """
+        Args:
+            workers (dict): Nombre de threads par fournisseur (complète DEFAULT_WORKERS)
+        """
+        self.workers = dict(self.DEFAULT_WORKERS)
+        if workers:
+            self.workers.update(workers)
+        self._lock = Lock()
+        self._queues = {}
+        self._threads = {}
+        # clé -> traitement en attente ou en cours
+        self._active = {}
+        self._sequence = itertools.count()
+
+    def _queue(self, provider):
+        """File du fournisseur, dont les threads démarrent à la première demande."""
+        queue = self._queues.get(provider)
+        if queue is None:
+            queue = self._queues[provider] = PriorityQueue()
+            self._threads[provider] = [
+                Thread(target=self._worker, args=(queue,), daemon=True)
+                for _ in range(self.workers.get(provider, 2))]
+            for thread in self._threads[provider]:
+                thread.start()
+        return queue
+
+    def submit(self, key, provider, run, callback, on_chunk=None,
+               priority=PRIORITY_INTERACTIVE, tag=None):
+        """
+        Demander un traitement.
+
+        Args:
+            key (str): Clé de déduplication
+            provider (str): Le fournisseur qui exécute le traitement
+            run (callable): (job, on_chunk) -> dictionnaire de résultat
+            callback (function): Fonction de rappel appelée avec le résultat
+            on_chunk (function): Fonction recevant les fragments en mode flux
+            priority (int): PRIORITY_INTERACTIVE ou PRIORITY_BACKGROUND
+            tag (str): Étiquette permettant d'annuler la demande (par exemple la note)
+
+        Returns:
+            AIJob: Le traitement, éventuellement partagé avec une demande identique
+        """
+        with self._lock:
+            job = self._active.get(key)
+            if job is not None and job.add_listener(callback, on_chunk, tag):
+                if priority < job.priority and job.state == "queued":
+                    # Une demande interactive remonte le traitement partagé
+                    job.priority = priority
+                    self._queue(provider).put((priority, next(self._sequence), job))
+                return job
+            job = AIJob(key, provider, priority, run)
+            job.add_listener(callback, on_chunk, tag)
+            self._active[key] = job
+            self._queue(provider).put((priority, next(self._sequence), job))
+            return job
+
+    def cancel(self, tag):
+        """Annuler les demandes d'une étiquette (les autres demandes partagées continuent)."""
+        with self._lock:
+            jobs = list(self._active.values())
+        for job in jobs:
+            job.detach(tag)
+
+    def pending(self):
+        """Nombre de traitements en attente ou en cours."""
+        with self._lock:
+            return sum(1 for job in self._active.values() if job.state in ("queued", "running"))
+
+    def _worker(self, queue):
+        """Exécuter les traitements d'une file, un à la fois."""
+        while True:
+            _, _, job = queue.get()
+            if job is None:
+                return
+            # Un traitement remonté en priorité est présent deux fois dans la file,
+            # et un traitement annulé reste dans la file jusqu'à son tour
+            if not job.start():
+                self._release(job)
+                continue
+            try:
+                result = job.run(job, job.emit_chunk if job.streaming else None)
+            except Exception as e:
+                result = {"success": False, "error": str(e)}
+            job.finish(result)
+            self._release(job)
+
+    def _release(self, job):
+        """Retirer un traitement terminé ou annulé des traitements actifs."""
+        with self._lock:
+            if self._active.get(job.key) is job and job.state in ("done", "cancelled"):
+                del self._active[job.key]
+
+    def shutdown(self):
+        """Annuler les traitements en attente et arrêter les threads."""
+        with self._lock:
+            jobs = list(self._active.values())
+            queues = list(self._queues.items())
+        for job in jobs:
+            job.cancel()
+        for provider, queue in queues:
+            for _ in self._threads[provider]:
+                queue.put((float("inf"), next(self._sequence), None))
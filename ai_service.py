@@ -2,36 +2,191 @@
 Module de service d'IA pour l'intégration avec différents services d'IA.
 """
 import requests
-from threading import Thread
+from requests.adapters import HTTPAdapter
+from threading import Lock
 import os
 import json
+import zlib
+import asyncio
+import re
+import time
+
+from ai_cache import AIResponseCache, make_cache_key
+from ai_scheduler import AIJobScheduler, PRIORITY_INTERACTIVE
+from ai_async import AsyncAIClient, RateLimitError, parse_retry_after
+from ai_routing import LatencyTracker
+
+
+SENTENCE_END_RE = re.compile(r"(?<=[.!?…])\s+")
+
+
+def _split_long_paragraph(paragraph, max_chars):
+    """Découper un paragraphe trop long en phrases, puis en tranches si nécessaire."""
+    pieces = []
+    current = ""
+    for sentence in SENTENCE_END_RE.split(paragraph):
+        while len(sentence) > max_chars:
+            pieces.append(sentence[:max_chars])
+            sentence = sentence[max_chars:]
+        if current and len(current) + 1 + len(sentence) > max_chars:
+            pieces.append(current)
+            current = sentence
+        else:
+            current = f"{current} {sentence}" if current else sentence
+    if current:
+        pieces.append(current)
+    return pieces
+
+
+def split_into_chunks(text, max_chars):
+    """
+    Découper un long texte en morceaux d'au plus `max_chars` caractères,
+    aux limites des paragraphes.
+
+    Les coupures dépendent du contenu des paragraphes (un paragraphe sur
+    quatre, selon son empreinte, peut terminer un morceau assez grand) et
+    non de leur position : modifier une section ne déplace pas les coupures
+    du reste du texte, dont les résumés restent dans le cache.
+
+    Returns:
+        list: Les morceaux, dans l'ordre du texte
+    """
+    paragraphs = []
+    for paragraph in re.split(r"\n\s*\n", text):
+        paragraph = paragraph.strip()
+        if paragraph:
+            paragraphs.extend(_split_long_paragraph(paragraph, max_chars)
+                              if len(paragraph) > max_chars else [paragraph])
+
+    chunks = []
+    current = []
+    size = 0
+    for paragraph in paragraphs:
+        if current and size + 2 + len(paragraph) > max_chars:
+            chunks.append("\n\n".join(current))
+            current, size = [], 0
+        current.append(paragraph)
+        size += len(paragraph) + 2
+        if size >= max_chars // 2 and zlib.crc32(paragraph.encode("utf-8")) % 4 == 0:
+            chunks.append("\n\n".join(current))
+            current, size = [], 0
+    if current:
+        chunks.append("\n\n".join(current))
+    return chunks
+
 
 class AIService:
     """Service d'intégration avec différents services d'IA."""
 
-    def __init__(self):
+    # Routage automatique : la requête de secours part quand la première
+    # dépasse ce percentile des durées habituelles de son modèle
+    HEDGE_PERCENTILE = 95
+    # Nombre de mesures nécessaires avant de doubler une requête
+    HEDGE_MIN_SAMPLES = 5
+    # Résumé par morceaux : nombre maximal de passes de réduction
+    MAX_REDUCE_ROUNDS = 4
+
+    def __init__(self, pool_size=4, connect_timeout=5.0, read_timeout=300.0,
+                 cache_size=256, disk_cache_bytes=50 * 1024 * 1024, workers=None):
+        """
+        Initialiser le service.
+
+        Chaque fournisseur a sa propre session HTTP : les connexions (et la
+        négociation TLS des fournisseurs en ligne) sont gardées ouvertes et
+        réutilisées d'une requête à l'autre.
+
+        Args:
+            pool_size (int): Nombre de connexions gardées ouvertes par fournisseur
+            connect_timeout (float): Délai maximal d'établissement de la connexion (secondes)
+            read_timeout (float): Délai maximal d'attente de la réponse (secondes)
+            cache_size (int): Nombre de réponses gardées en mémoire
+            disk_cache_bytes (int): Taille maximale du cache sur disque (0 pour la mémoire seule)
+            workers (dict): Nombre de requêtes simultanées par fournisseur
+                (voir AIJobScheduler.DEFAULT_WORKERS)
+        """
         # Configuration par défaut
         self.providers = {
             "ollama": {
                 "url": "http://localhost:11434/api/generate",
                 "model": "mistral",
-                "type": "local"
+                "type": "local",
+                # Taille de texte (caractères) au-delà de laquelle un résumé est fait par morceaux
+                "context_chars": 12000
             },
             "openai": {
                 "url": "https://api.openai.com/v1/chat/completions",
                 "model": "gpt-3.5-turbo",
-                "type": "cloud"
+                "type": "cloud",
+                "context_chars": 40000
             },
             "anthropic": {
                 "url": "https://api.anthropic.com/v1/messages",
                 "model": "claude-3-haiku-20240307",
-                "type": "cloud"
+                "type": "cloud",
+                "context_chars": 150000
             }
         }
         
         self.current_provider = "ollama"
         self.api_keys = self.load_api_keys()
 
+        self.pool_size = pool_size
+        self.timeout = (connect_timeout, read_timeout)
+        # Sessions HTTP par fournisseur, créées à la première requête
+        self._sessions = {}
+        self._sessions_lock = Lock()
+
+        # Réponses déjà obtenues, pour ne pas refaire un appel identique
+        cache_folder = os.path.join(os.path.expanduser("~"), "NotesAI", "ai_cache")
+        self.cache = AIResponseCache(cache_folder if disk_cache_bytes else None,
+                                     memory_size=cache_size, max_disk_bytes=disk_cache_bytes)
+
+        # File des traitements, avec un nombre fixe de threads par fournisseur
+        self.scheduler = AIJobScheduler(workers)
+
+        # Client asyncio pour les traitements en grand nombre, créé au premier usage
+        self._async_client = None
+
+        # Temps de réponse observés, pour le routage automatique
+        self.latency = LatencyTracker()
+        self.auto_routing = False
+        self.hedging = True
+
+    def _session(self, provider):
+        """Obtenir la session HTTP (connexions persistantes) d'un fournisseur."""
+        with self._sessions_lock:
+            session = self._sessions.get(provider)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self._sessions[provider] = session
+            return session
+
+    def _post(self, provider, url, **kwargs):
+        """Envoyer une requête POST par la session du fournisseur."""
+        return self._session(provider).post(url, timeout=self.timeout, **kwargs)
+
+    def get_async_client(self):
+        """Obtenir le client asyncio (boucle d'événements dédiée), démarré au premier appel."""
+        with self._sessions_lock:
+            if self._async_client is None:
+                self._async_client = AsyncAIClient(self)
+            return self._async_client
+
+    def close(self):
+        """Annuler les traitements en attente et fermer les connexions (à la fermeture de l'application)."""
+        self.scheduler.shutdown()
+        if self._async_client is not None:
+            self._async_client.close()
+            self._async_client = None
+        with self._sessions_lock:
+            sessions = list(self._sessions.values())
+            self._sessions = {}
+        for session in sessions:
+            session.close()
+
     def load_api_keys(self):
         """Charger les clés API depuis un fichier de configuration."""
         config_path = os.path.join(os.path.expanduser("~"), "NotesAI", "config.json")
@@ -89,134 +244,467 @@ class AIService:
         """Obtenir le modèle actuel."""
         return self.providers[self.current_provider]["model"]
 
-    def process_with_ai(self, content, action_type, callback):
+    def set_auto_routing(self, enabled, hedging=True):
         """
-        Traiter du contenu avec l'IA.
+        Activer ou désactiver le routage automatique.
 
-        Args:
-            content (str): Le contenu à traiter
-            action_type (str): Le type d'action ('correction', 'resume', 'categorie')
-            callback (function): Fonction de rappel à appeler avec le résultat
+        En routage automatique, chaque demande va au fournisseur le plus
+        rapide (moyenne mobile des temps de réponse) parmi ceux qui ont une
+        clé API et n'ont pas échoué récemment ; le fournisseur actuel est
+        préféré tant qu'aucune mesure n'existe. Avec `hedging`, une requête
+        qui dépasse le p95 de son modèle est doublée vers le fournisseur
+        suivant et la première réponse l'emporte (avec aiohttp seulement,
+        voir AsyncAIClient.complete_hedged).
         """
-        if not content:
-            callback({"success": False, "error": "Le contenu est vide"})
-            return
+        self.auto_routing = enabled
+        self.hedging = hedging
+
+    def has_credentials(self, provider):
+        """Indiquer si un fournisseur est utilisable (le modèle local n'a pas besoin de clé)."""
+        if self.providers[provider]["type"] == "local":
+            return True
+        return bool(self.api_keys.get(f"{provider}_api_key"))
 
-        # Lancer le traitement dans un thread séparé
-        Thread(target=self._process_async, args=(content, action_type, callback)).start()
+    def rank_providers(self, action_type):
+        """
+        Fournisseurs utilisables pour une action, du plus rapide au plus lent.
 
-def _process_async(self, content, action_type, callback):
-    """
-    Traiter de manière asynchrone avec le service d'IA.
+        Les fournisseurs sans mesure passent après les autres (le fournisseur
+        actuel en premier) ; ceux qui ont échoué récemment sont exclus, sauf
+        s'il n'en reste aucun.
 
-    Args:
-        content (str): Le contenu à traiter
-        action_type (str): Le type d'action
-        callback (function): Fonction de rappel à appeler avec le résultat
-    """
-    try:
-        provider_info = self.providers[self.current_provider]
+        Returns:
+            list: Les noms des fournisseurs
+        """
+        candidates = [provider for provider in self.providers if self.has_credentials(provider)]
+        healthy = [provider for provider in candidates
+                   if self.latency.healthy(provider, self.providers[provider]["model"])]
+
+        def speed(provider):
+            ewma = self.latency.ewma(provider, self.providers[provider]["model"], action_type)
+            return (ewma is None, ewma or 0.0, provider != self.current_provider)
+
+        return sorted(healthy or candidates, key=speed)
+
+    def latency_stats(self):
+        """Temps de réponse observés par fournisseur, modèle et action (voir LatencyTracker.snapshot)."""
+        return self.latency.snapshot()
 
+    def cache_stats(self):
+        """Compteurs du cache des réponses (succès en mémoire, sur disque, échecs)."""
+        return dict(self.cache.stats)
+
+    def build_prompt(self, content, action_type):
+        """
+        Construire le prompt d'une action à partir des prompts personnalisés.
+
+        Returns:
+            str: Le prompt complet, ou None si l'action n'a pas de prompt
+        """
         # Charger les prompts personnalisés
         prompt_file = os.path.join(os.path.expanduser("~"), "NotesAI", "prompts.json")
         default_prompts = {
             "correction": "Corrige les erreurs de grammaire, d'orthographe et de syntaxe dans ce texte, sans changer le sens et ajoute la version original du texte en bas de page: {content}",
             "resume": "Résume ce texte en conservant les points essentiels, ajoute la version originale en bas de page: {content}",
-            "categorie": "Analyse ce texte et attribue-lui une catégorie parmi les suivantes : 'Travail', 'Personnel', 'Idée', 'Projet', 'Santé', 'Finance', 'Histoire', 'Informatique'. Affiche uniquement le mot de la catégorie : {content}"
+            "categorie": "Analyse ce texte et attribue-lui une catégorie parmi les suivantes : 'Travail', 'Personnel', 'Idée', 'Projet', 'Santé', 'Finance', 'Histoire', 'Informatique'. Affiche uniquement le mot de la catégorie : {content}",
+            # Résumé des notes trop longues : chaque morceau, puis la fusion des résumés
+            "resume_partie": "Résume ce passage d'un texte plus long en conservant les points essentiels, sans introduction ni conclusion : {content}",
+            "resume_fusion": "Voici les résumés successifs des parties d'un long texte. Rédige un résumé unique et cohérent du texte entier en conservant les points essentiels : {content}"
         }
 
+        prompts = dict(default_prompts)
         if os.path.exists(prompt_file):
             with open(prompt_file, "r", encoding="utf-8") as f:
-                prompts = json.load(f)
-        else:
-            prompts = default_prompts
+                prompts.update(json.load(f))
 
         prompt_template = prompts.get(action_type)
         if not prompt_template:
+            return None
+        return prompt_template.replace("{content}", content)
+
+    def process_with_ai(self, content, action_type, callback, use_cache=True, on_chunk=None,
+                        priority=PRIORITY_INTERACTIVE, tag=None, provider=None):
+        """
+        Traiter du contenu avec l'IA.
+
+        Le traitement est confié au planificateur : il attend son tour dans la
+        file du fournisseur actuel, et une demande identique déjà en attente
+        ou en cours est partagée au lieu d'être envoyée deux fois.
+
+        Args:
+            content (str): Le contenu à traiter
+            action_type (str): Le type d'action ('correction', 'resume', 'categorie')
+            callback (function): Fonction de rappel à appeler avec le résultat ; un refus
+                pour quota donne "rate_limited" et "retry_after" (délai demandé ou None)
+            use_cache (bool): False pour ignorer une réponse enregistrée et redemander
+            on_chunk (function): Si fournie, la réponse est demandée en mode flux et
+                cette fonction reçoit chaque fragment de texte dès son arrivée ;
+                `callback` est appelée à la fin avec le résultat complet
+            priority (int): PRIORITY_INTERACTIVE (clic) ou PRIORITY_BACKGROUND
+            tag (str): Étiquette pour annuler la demande avec cancel_jobs (par exemple la note)
+            provider (str): Fournisseur imposé, sans routage automatique (par défaut le
+                fournisseur actuel)
+
+        Returns:
+            AIJob: Le traitement (état, attente, annulation), ou None si la demande est invalide
+        """
+        if not content:
+            callback({"success": False, "error": "Le contenu est vide"})
+            return None
+
+        try:
+            prompt = self.build_prompt(content, action_type)
+        except Exception as e:
+            callback({"success": False, "error": str(e)})
+            return None
+        if prompt is None:
             callback({"success": False, "error": f"Prompt introuvable pour l'action : {action_type}"})
-            return
+            return None
 
-        prompt = prompt_template.replace("{content}", content)
+        # Le fournisseur est fixé à la demande : changer de modèle ne touche pas la file
+        alternates = []
+        if provider is None and self.auto_routing:
+            provider, *alternates = self.rank_providers(action_type)
+        provider = provider or self.current_provider
+        provider_info = dict(self.providers[provider])
+        cache_key = make_cache_key(provider, provider_info["model"], action_type, prompt)
 
-        # Traitement selon le type de fournisseur
+        def run(job, job_on_chunk):
+            return self._process_async(provider, provider_info, prompt, action_type,
+                                       cache_key, use_cache, job_on_chunk, job, content,
+                                       alternates)
+
+        # Une demande sans cache ne doit pas se rattacher à une demande qui l'utilise
+        job_key = cache_key if use_cache else cache_key + ":fresh"
+        return self.scheduler.submit(job_key, provider, run, callback, on_chunk,
+                                     priority=priority, tag=tag)
+
+    def cancel_jobs(self, tag):
+        """Annuler les demandes d'une étiquette (par exemple celles d'une note quittée)."""
+        self.scheduler.cancel(tag)
+
+    def _process_async(self, provider, provider_info, prompt, action_type, cache_key,
+                       use_cache=True, on_chunk=None, job=None, content=None, alternates=()):
+        """
+        Exécuter un traitement (dans un thread du planificateur).
+
+        Args:
+            provider (str): Le fournisseur
+            provider_info (dict): La configuration du fournisseur au moment de la demande
+            prompt (str): Le prompt complet
+            action_type (str): Le type d'action
+            cache_key (str): La clé de la réponse dans le cache
+            use_cache (bool): False pour ignorer une réponse enregistrée
+            on_chunk (function): Fonction recevant les fragments en mode flux
+            job (AIJob): Le traitement, pour s'arrêter s'il est annulé
+            content (str): Le contenu d'origine (pour le résumé par morceaux)
+            alternates (list): Fournisseurs de secours du routage automatique
+
+        Returns:
+            dict: Le résultat transmis aux fonctions de rappel
+        """
+        try:
+            # Une réponse déjà obtenue pour ce prompt exact est réutilisée
+            result = self.cache.get(cache_key) if use_cache else None
+            cached = result is not None
+            routed = provider
+
+            if (result is None and action_type == "resume" and content is not None
+                    and len(content) > provider_info.get("context_chars", len(content))):
+                result = self._summarize_long(provider, provider_info, content,
+                                              use_cache, on_chunk, job)
+                if result is None:
+                    return {"success": False, "cancelled": True, "error": "Traitement annulé"}
+                self.cache.put(cache_key, result)
+            elif result is None and on_chunk is not None:
+                started = time.monotonic()
+                try:
+                    result = self._stream_prompt(prompt, provider, provider_info, on_chunk, job)
+                except Exception:
+                    self.latency.record_failure(provider, provider_info["model"])
+                    raise
+                if result is None:
+                    return {"success": False, "cancelled": True, "error": "Traitement annulé"}
+                self.latency.record(provider, provider_info["model"], action_type,
+                                    time.monotonic() - started)
+                self.cache.put(cache_key, result)
+            elif result is None and alternates:
+                # Routage automatique : requête doublée si elle tarde, secours en cas d'échec
+                routed, result, cached = self._complete_routed(provider, provider_info, alternates,
+                                                               prompt, action_type, use_cache)
+            elif result is None:
+                started = time.monotonic()
+                try:
+                    # Traitement selon le type de fournisseur
+                    if provider_info["type"] == "local":
+                        response = self._process_ollama(prompt, provider_info)
+                    elif provider_info["type"] == "cloud":
+                        if provider == "openai":
+                            response = self._process_openai(prompt, provider_info)
+                        elif provider == "anthropic":
+                            response = self._process_anthropic(prompt, provider_info)
+                except Exception:
+                    self.latency.record_failure(provider, provider_info["model"])
+                    raise
+
+                if response.status_code != 200:
+                    self.latency.record_failure(provider, provider_info["model"])
+                    if response.status_code == 429:
+                        raise RateLimitError(f"Erreur {provider}: 429 - {response.text}",
+                                             parse_retry_after(response.headers.get("Retry-After")))
+                    return {"success": False,
+                            "error": f"Erreur {provider}: {response.status_code} - {response.text}"}
+                self.latency.record(provider, provider_info["model"], action_type,
+                                    time.monotonic() - started)
+                result = self._extract_result(response, provider_info, provider)
+                self.cache.put(cache_key, result)
+            elif on_chunk is not None:
+                on_chunk(result)
+
+            formatted = self.format_result(action_type, result, cached)
+            formatted["provider"] = routed
+            return formatted
+
+        except RateLimitError as e:
+            return {"success": False, "error": str(e), "rate_limited": True,
+                    "retry_after": e.retry_after}
+        except Exception as e:
+            return {"success": False, "error": str(e)}
+
+    def _complete_routed(self, provider, provider_info, alternates, prompt, action_type,
+                         use_cache=True):
+        """
+        Envoyer un prompt au fournisseur choisi, avec secours vers les suivants.
+
+        Une fois assez de mesures réunies, la requête est doublée vers le
+        fournisseur suivant si elle dépasse le p95 de son modèle ; la
+        première réponse est gardée et l'autre requête annulée.
+
+        Returns:
+            tuple: (fournisseur qui a répondu, texte, réponse venue du cache)
+        """
+        hedge_after = None
+        model = provider_info["model"]
+        # Délai tiré des durées de la même action : un résumé n'est pas doublé
+        # parce qu'il dépasse le p95 des catégorisations
+        if self.hedging and self.latency.count(provider, model, action_type) >= self.HEDGE_MIN_SAMPLES:
+            hedge_after = self.latency.percentile(provider, model, action_type, self.HEDGE_PERCENTILE)
+        client = self.get_async_client()
+        return client.submit(client.complete_hedged(prompt, action_type, [provider, *alternates],
+                                                    hedge_after, use_cache)).result()
+
+    def _stream_prompt(self, prompt, provider, provider_info, on_chunk, job=None):
+        """Envoyer un prompt en mode flux ; renvoie le texte complet, ou None si annulé."""
+        parts = []
+        for chunk in self.iter_chunks(prompt, provider, provider_info):
+            if job is not None and job.cancelled:
+                # Plus personne n'attend la réponse : on coupe le flux
+                return None
+            parts.append(chunk)
+            on_chunk(chunk)
+        return "".join(parts).strip()
+
+    def _summarize_long(self, provider, provider_info, content, use_cache=True,
+                        on_chunk=None, job=None):
+        """
+        Résumer un texte plus long que le contexte du modèle (map-reduce).
+
+        Le texte est découpé en morceaux aux limites des paragraphes ; les
+        morceaux sont résumés en parallèle par le client asyncio (dans la
+        limite de requêtes simultanées du fournisseur), puis les résumés sont
+        fusionnés. Si les résumés réunis restent trop longs, ils sont à leur
+        tour découpés et résumés, au plus MAX_REDUCE_ROUNDS fois et tant que
+        le texte raccourcit ; au-delà, la fusion porte sur le début du texte
+        tronqué à la taille du contexte. Chaque résumé de morceau est gardé dans le
+        cache : après une modification, seuls les morceaux changés sont
+        renvoyés au modèle.
+
+        Returns:
+            str: Le résumé, ou None si le traitement a été annulé
+        """
+        client = self.get_async_client()
+        max_chars = provider_info["context_chars"]
+
+        async def summarize_all(chunks):
+            prompts = [self.build_prompt(chunk, "resume_partie") for chunk in chunks]
+            results = await asyncio.gather(*(client.complete(prompt, "resume_partie", provider, use_cache)
+                                             for prompt in prompts))
+            return [text for text, _ in results]
+
+        text = content
+        for _ in range(self.MAX_REDUCE_ROUNDS):
+            summaries = client.submit(summarize_all(split_into_chunks(text, max_chars))).result()
+            if job is not None and job.cancelled:
+                return None
+            previous, text = text, "\n\n".join(summaries)
+            # S'arrêter dès que le texte tient dans le contexte, ou s'il ne raccourcit
+            # plus (modèle trop bavard, réponses en écho) : chaque passe est payante
+            if len(text) <= max_chars or len(text) >= len(previous):
+                break
+
+        if len(text) > max_chars:
+            print(f"Résumé par morceaux : texte tronqué à {max_chars} caractères avant la fusion")
+            text = text[:max_chars]
+
+        prompt = self.build_prompt(text, "resume_fusion")
+        if on_chunk is not None:
+            return self._stream_prompt(prompt, provider, provider_info, on_chunk, job)
+        result, _ = client.submit(client.complete(prompt, "resume_fusion", provider, use_cache)).result()
+        return result
+
+    def format_result(self, action_type, result, cached=False):
+        """Mettre en forme le résultat d'une action pour les fonctions de rappel."""
+        if action_type == "categorie":
+            category = result.split("\n")[0].strip()
+            if len(category.split()) > 3:
+                category = " ".join(category.split()[:2])
+            result = category
+        return {"success": True, "action": action_type, "result": result, "cached": cached}
+
+    def request_spec(self, provider, provider_info, prompt, stream=False):
+        """
+        Construire la requête d'un fournisseur (utilisée aussi par le client asyncio).
+
+        Returns:
+            tuple: (url, en-têtes, corps JSON)
+        """
         if provider_info["type"] == "local":
-            response = self._process_ollama(prompt, provider_info)
-        elif provider_info["type"] == "cloud":
-            if self.current_provider == "openai":
-                response = self._process_openai(prompt, provider_info)
-            elif self.current_provider == "anthropic":
-                response = self._process_anthropic(prompt, provider_info)
-
-        # Traiter le résultat
-        if response.status_code == 200:
-            result = self._extract_result(response, provider_info)
-
-            if action_type == "correction":
-                callback({"success": True, "action": "correction", "result": result})
-            elif action_type == "resume":
-                callback({"success": True, "action": "resume", "result": result})
-            elif action_type == "categorie":
-                category = result.split("\n")[0].strip()
-                if len(category.split()) > 3:
-                    category = " ".join(category.split()[:2])
-                callback({"success": True, "action": "categorie", "result": category})
+            data = {
+                "model": provider_info["model"],
+                "prompt": prompt,
+                "stream": stream
+            }
+            return provider_info["url"], {}, data
+
+        if provider == "openai":
+            api_key = self.api_keys.get("openai_api_key", "")
+            if not api_key:
+                raise ValueError("Clé API OpenAI manquante")
+
+            headers = {
+                "Authorization": f"Bearer {api_key}",
+                "Content-Type": "application/json"
+            }
+            data = {
+                "model": provider_info["model"],
+                "messages": [{"role": "user", "content": prompt}]
+            }
         else:
-            error_msg = f"Erreur {self.current_provider}: {response.status_code} - {response.text}"
-            callback({"success": False, "error": error_msg})
+            api_key = self.api_keys.get("anthropic_api_key", "")
+            if not api_key:
+                raise ValueError("Clé API Anthropic manquante")
 
-    except Exception as e:
-        callback({"success": False, "error": str(e)})
+            headers = {
+                "x-api-key": api_key,
+                "Content-Type": "application/json",
+                "anthropic-version": "2023-06-01"
+            }
+            data = {
+                "model": provider_info["model"],
+                "max_tokens": 4096,
+                "messages": [{"role": "user", "content": prompt}]
+            }
+        if stream:
+            data["stream"] = True
+        return provider_info["url"], headers, data
 
-    def _process_ollama(self, prompt, provider_info):
+    def _process_ollama(self, prompt, provider_info, stream=False):
         """Traitement via Ollama local."""
-        data = {
-            "model": provider_info["model"],
-            "prompt": prompt,
-            "stream": False
-        }
-        return requests.post(provider_info["url"], json=data)
+        url, headers, data = self.request_spec("ollama", provider_info, prompt, stream)
+        return self._post("ollama", url, json=data, stream=stream)
 
-    def _process_openai(self, prompt, provider_info):
+    def _process_openai(self, prompt, provider_info, stream=False):
         """Traitement via OpenAI."""
-        api_key = self.api_keys.get("openai_api_key", "")
-        if not api_key:
-            raise ValueError("Clé API OpenAI manquante")
-
-        headers = {
-            "Authorization": f"Bearer {api_key}",
-            "Content-Type": "application/json"
-        }
-        data = {
-            "model": provider_info["model"],
-            "messages": [{"role": "user", "content": prompt}]
-        }
-        return requests.post(provider_info["url"], headers=headers, json=data)
+        url, headers, data = self.request_spec("openai", provider_info, prompt, stream)
+        return self._post("openai", url, headers=headers, json=data, stream=stream)
 
-    def _process_anthropic(self, prompt, provider_info):
+    def _process_anthropic(self, prompt, provider_info, stream=False):
         """Traitement via Anthropic."""
-        api_key = self.api_keys.get("anthropic_api_key", "")
-        if not api_key:
-            raise ValueError("Clé API Anthropic manquante")
-
-        headers = {
-            "x-api-key": api_key,
-            "Content-Type": "application/json",
-            "anthropic-version": "2023-06-01"
-        }
-        data = {
-            "model": provider_info["model"],
-            "max_tokens": 4096,
-            "messages": [{"role": "user", "content": prompt}]
-        }
-        return requests.post(provider_info["url"], headers=headers, json=data)
+        url, headers, data = self.request_spec("anthropic", provider_info, prompt, stream)
+        return self._post("anthropic", url, headers=headers, json=data, stream=stream)
 
-    def _extract_result(self, response, provider_info):
+    def iter_chunks(self, prompt, provider=None, provider_info=None):
+        """
+        Envoyer un prompt en mode flux et produire la réponse au fur et à mesure.
+
+        Ollama répond par une ligne JSON par fragment, OpenAI et Anthropic
+        par des événements SSE ("data: {...}") : chaque fragment de texte est
+        produit dès sa réception.
+
+        Args:
+            prompt (str): Le prompt complet
+            provider (str): Le fournisseur (par défaut le fournisseur actuel)
+            provider_info (dict): Sa configuration (par défaut la configuration actuelle)
+
+        Yields:
+            str: Les fragments de la réponse, dans l'ordre
+        """
+        provider = provider or self.current_provider
+        provider_info = provider_info or self.providers[provider]
+        if provider_info["type"] == "local":
+            response = self._process_ollama(prompt, provider_info, stream=True)
+        elif provider == "openai":
+            response = self._process_openai(prompt, provider_info, stream=True)
+        else:
+            response = self._process_anthropic(prompt, provider_info, stream=True)
+
+        with response:
+            if response.status_code != 200:
+                raise RuntimeError(f"Erreur {provider}: {response.status_code} - {response.text}")
+            if provider_info["type"] == "local":
+                yield from self._ollama_chunks(response)
+            else:
+                yield from self._sse_chunks(response, provider)
+
+    def _ollama_chunks(self, response):
+        """Fragments d'une réponse Ollama (une ligne JSON par fragment)."""
+        for line in response.iter_lines():
+            if not line:
+                continue
+            data = json.loads(line)
+            if "error" in data:
+                raise RuntimeError(f"Erreur ollama: {data['error']}")
+            if data.get("response"):
+                yield data["response"]
+            if data.get("done"):
+                return
+
+    def _sse_chunks(self, response, provider):
+        """Fragments d'un flux SSE OpenAI ou Anthropic."""
+        for line in response.iter_lines():
+            # Les lignes sont décodées ici : le flux n'annonce pas toujours son encodage
+            line = line.decode("utf-8")
+            if not line.startswith("data:"):
+                continue
+            payload = line[5:].strip()
+            if payload == "[DONE]":
+                return
+            data = json.loads(payload)
+            if provider == "openai":
+                if data.get("choices"):
+                    text = data["choices"][0].get("delta", {}).get("content")
+                    if text:
+                        yield text
+            elif data.get("type") == "content_block_delta":
+                text = data["delta"].get("text")
+                if text:
+                    yield text
+            elif data.get("type") == "message_stop":
+                return
+            elif data.get("type") == "error":
+                raise RuntimeError(f"Erreur anthropic: {data['error'].get('message', data['error'])}")
+
+    def _extract_result(self, response, provider_info, provider=None):
         """Extraire le résultat selon le fournisseur."""
-        data = response.json()
-        
+        return self.parse_result(response.json(), provider_info, provider)
+
+    def parse_result(self, data, provider_info, provider=None):
+        """Extraire le texte de la réponse JSON d'un fournisseur."""
+        provider = provider or self.current_provider
+
         if provider_info["type"] == "local":
             return data["response"].strip()
-        elif self.current_provider == "openai":
+        elif provider == "openai":
             return data["choices"][0]["message"]["content"].strip()
-        elif self.current_provider == "anthropic":
+        elif provider == "anthropic":
             return data["content"][0]["text"].strip()
\ No newline at end of file
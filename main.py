@@ -75,14 +75,24 @@ def main():
     style.configure("TCombobox", padding=5)
 
     # Initialiser les composants
-    note_model = NoteModel()
+    # Les notes sont chargées en arrière-plan pour afficher la fenêtre immédiatement
+    # L'archivage des notes anciennes (voir note_archive) reste désactivé par
+    # défaut : les notes archivées n'apparaissent plus que dans la recherche.
+    # Passer archive_after_days (par exemple 180) pour l'activer.
+    note_model = NoteModel(progressive_load=True, archive_after_days=None)
     ai_service = AIService()
 
     # Créer l'interface
     notes_ui = NotesUI(root, note_model, ai_service)
 
     # Lancer la boucle principale
-    root.mainloop()
+    try:
+        root.mainloop()
+    finally:
+        # Seul point d'arrêt : écrire les modifications en attente, puis fermer
+        # le stockage des notes et les connexions aux services d'IA
+        note_model.close()
+        ai_service.close()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,286 @@
+﻿"""
+Module d'archivage des notes anciennes pour l'application NotesAI.
+"""
+import os
+import json
+import gzip
+from bisect import bisect_left
+from threading import RLock
+
+from note_index import tokenize, padded_trigrams
+from note_storage import FileLock
+
+
+class NoteArchive:
+    """
+    Segments d'archive compressés, en lecture seule, pour les notes peu utilisées.
+
+    Chaque segment (archive/segment_<n>.json.gz) contient un lot de notes
+    au format JSON habituel. Le manifeste (archive/manifest.json) garde pour
+    chaque segment ses notes encore archivées, son vocabulaire et
+    l'intervalle de ses dates : on sait ainsi, sans rien décompresser, si
+    une recherche peut trouver quelque chose dans un segment.
+    """
+
+    def __init__(self, save_folder):
+        """
+        Initialiser l'archive.
+
+        Args:
+            save_folder (str): Le dossier de sauvegarde de l'application
+        """
+        # Le dossier n'est créé qu'à l'écriture du premier segment
+        self.folder = os.path.join(save_folder, "archive")
+        self.manifest_file = os.path.join(self.folder, "manifest.json")
+
+        self._lock = RLock()
+        # Plusieurs instances peuvent archiver : le manifeste est relu puis réécrit sous verrou
+        self.file_lock = FileLock(os.path.join(self.folder, "archive.lock"))
+        # nom du segment -> {"ids", "words", "modified", "created"}
+        self.segments = {}
+        # identifiant de note -> nom du segment qui la contient
+        self.note_segments = {}
+        # (segment, mot) -> le segment contient-il un mot correspondant ?
+        self._word_hits = {}
+        # Date du manifeste lu (pour voir les archivages d'un autre processus)
+        self._manifest_mtime = None
+        self._read_manifest()
+
+    def _read_manifest(self):
+        """Lire le manifeste des segments."""
+        if not os.path.exists(self.manifest_file):
+            return
+        try:
+            self._manifest_mtime = os.path.getmtime(self.manifest_file)
+            with open(self.manifest_file, "r", encoding="utf-8") as f:
+                segments = json.load(f)["segments"]
+        except Exception as e:
+            print(f"Erreur lors du chargement de l'archive: {str(e)}")
+            return
+        self.segments = {}
+        self.note_segments = {}
+        self._word_hits = {}
+        for name, segment in segments.items():
+            segment["ids"] = set(segment["ids"])
+            self.segments[name] = segment
+            for note_id in segment["ids"]:
+                self.note_segments[note_id] = name
+
+    def _write_manifest(self):
+        """Écrire le manifeste via un fichier temporaire puis un renommage."""
+        segments = {name: dict(segment, ids=sorted(segment["ids"]))
+                    for name, segment in self.segments.items()}
+        tmp_path = self.manifest_file + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"segments": segments}, f, ensure_ascii=False)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.manifest_file)
+        self._manifest_mtime = os.path.getmtime(self.manifest_file)
+
+    def refresh(self):
+        """Relire le manifeste s'il a été modifié par un autre processus."""
+        with self._lock:
+            if (os.path.exists(self.manifest_file)
+                    and os.path.getmtime(self.manifest_file) != self._manifest_mtime):
+                self._read_manifest()
+
+    def _segment_path(self, name):
+        """Chemin du fichier d'un segment."""
+        return os.path.join(self.folder, f"{name}.json.gz")
+
+    def __contains__(self, note_id):
+        return note_id in self.note_segments
+
+    def __len__(self):
+        return len(self.note_segments)
+
+    def segment_of(self, note_id):
+        """Nom du segment qui contient une note (None si elle n'est pas archivée)."""
+        return self.note_segments.get(note_id)
+
+    def write_segment(self, notes):
+        """
+        Archiver un lot de notes dans un nouveau segment.
+
+        Le segment et le manifeste sont écrits sur disque avant le retour :
+        l'appelant peut ensuite retirer les notes du stockage principal.
+
+        Args:
+            notes (dict): Les notes (avec leur contenu) indexées par identifiant
+
+        Returns:
+            str: Le nom du segment, ou None en cas d'erreur
+        """
+        if not notes:
+            return None
+        os.makedirs(self.folder, exist_ok=True)
+        with self._lock, self.file_lock:
+            self.refresh()
+            number = max((int(name.rsplit("_", 1)[1]) for name in self.segments), default=0) + 1
+            name = f"segment_{number:05d}"
+            words = set()
+            for note in notes.values():
+                for field in ("title", "content", "category"):
+                    words.update(tokenize(note.get(field) or ""))
+
+            try:
+                path = self._segment_path(name)
+                with gzip.open(path + ".tmp", "wt", encoding="utf-8") as f:
+                    json.dump({note_id: dict(note) for note_id, note in notes.items()},
+                              f, ensure_ascii=False)
+                os.replace(path + ".tmp", path)
+
+                self.segments[name] = {
+                    "ids": set(notes),
+                    "words": sorted(words),
+                    "modified": [min(note.modified_ts for note in notes.values()),
+                                 max(note.modified_ts for note in notes.values())],
+                    "created": [min(note.created_ts for note in notes.values()),
+                                max(note.created_ts for note in notes.values())],
+                }
+                self._write_manifest()
+            except Exception as e:
+                self.segments.pop(name, None)
+                print(f"Erreur lors de l'archivage des notes: {str(e)}")
+                return None
+
+            for note_id in notes:
+                self.note_segments[note_id] = name
+            return name
+
+    def read_segment(self, name):
+        """
+        Lire les notes encore archivées d'un segment.
+
+        Returns:
+            dict: Les notes (dictionnaires au format JSON) indexées par identifiant
+        """
+        with self._lock:
+            segment = self.segments.get(name)
+            if segment is None:
+                return {}
+            live_ids = set(segment["ids"])
+        try:
+            with gzip.open(self._segment_path(name), "rt", encoding="utf-8") as f:
+                notes = json.load(f)
+        except Exception as e:
+            print(f"Erreur lors de la lecture de l'archive {name}: {str(e)}")
+            return {}
+        return {note_id: note for note_id, note in notes.items() if note_id in live_ids}
+
+    def release(self, note_ids):
+        """
+        Retirer des notes de l'archive (revenues dans le stockage principal
+        ou supprimées). Un segment qui n'a plus de note est supprimé.
+        """
+        if not os.path.isdir(self.folder):
+            # Aucun segment n'a jamais été écrit
+            return
+        with self._lock, self.file_lock:
+            self.refresh()
+            changed = False
+            for note_id in note_ids:
+                name = self.note_segments.pop(note_id, None)
+                if name is None:
+                    continue
+                changed = True
+                segment = self.segments[name]
+                segment["ids"].discard(note_id)
+                if not segment["ids"]:
+                    del self.segments[name]
+                    self._word_hits.clear()
+                    if os.path.exists(self._segment_path(name)):
+                        os.remove(self._segment_path(name))
+            if changed:
+                try:
+                    self._write_manifest()
+                except Exception as e:
+                    print(f"Erreur lors de l'enregistrement de l'archive: {str(e)}")
+
+    def _has_word(self, name, word):
+        """Indiquer si le vocabulaire d'un segment contient un mot correspondant."""
+        key = (name, word)
+        hit = self._word_hits.get(key)
+        if hit is None:
+            words = self.segments[name]["words"]
+            if len(word) < 3:
+                # Même règle que l'index : préfixe pour les mots courts
+                index = bisect_left(words, word)
+                hit = index < len(words) and words[index].startswith(word)
+            else:
+                hit = any(word in token for token in words)
+            self._word_hits[key] = hit
+        return hit
+
+    def _has_similar_word(self, name, word, min_similarity):
+        """Indiquer si le vocabulaire d'un segment contient un mot proche (recherche approximative)."""
+        key = (name, word, min_similarity)
+        hit = self._word_hits.get(key)
+        if hit is None:
+            # Coefficient de Jaccard exact : jamais inférieur à l'estimation de
+            # NoteSearchIndex.similar_tokens, aucun segment utile n'est donc écarté
+            word_grams = padded_trigrams(word)
+            hit = False
+            for token in self.segments[name]["words"]:
+                token_grams = padded_trigrams(token)
+                shared = len(word_grams & token_grams)
+                if shared and shared / len(word_grams | token_grams) >= min_similarity:
+                    hit = True
+                    break
+            self._word_hits[key] = hit
+        return hit
+
+    def _may_match(self, name, term):
+        """Indiquer si un critère positif peut correspondre à une note du segment."""
+        if term.kind == "date":
+            low, high = self.segments[name][term.field]
+            start, end = term.value
+            return (start is None or high >= start) and (end is None or low < end)
+        words = term.value if term.kind == "phrase" else (term.value,)
+        return all(self._has_word(name, word) for word in words)
+
+    def candidate_segments(self, terms, exclude=()):
+        """
+        Segments qui peuvent contenir des résultats pour une requête.
+
+        Seuls les critères positifs sont considérés : une requête sans
+        critère positif ne charge aucun segment.
+
+        Args:
+            terms (list): Les critères renvoyés par note_query.parse_query
+            exclude (set): Les segments déjà chargés
+
+        Returns:
+            list: Les noms des segments à charger
+        """
+        positive = [term for term in terms if not term.negated]
+        if not positive:
+            return []
+        with self._lock:
+            return [name for name in self.segments
+                    if name not in exclude
+                    and all(self._may_match(name, term) for term in positive)]
+
+    def similar_segments(self, text, exclude=(), min_similarity=0.3):
+        """
+        Segments qui peuvent contenir des résultats pour une recherche approximative.
+
+        Comme pour NoteSearchIndex.fuzzy_search, chaque mot du texte doit
+        être proche (similarité des trigrammes) d'un mot du segment.
+
+        Args:
+            text (str): Le texte recherché
+            exclude (set): Les segments déjà chargés
+            min_similarity (float): Similarité minimale entre deux mots
+
+        Returns:
+            list: Les noms des segments à charger
+        """
+        words = set(tokenize(text))
+        if not words:
+            return []
+        with self._lock:
+            return [name for name in self.segments
+                    if name not in exclude
+                    and all(self._has_similar_word(name, word, min_similarity) for word in words)]
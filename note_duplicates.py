@@ -0,0 +1,329 @@
+﻿"""
+Module de détection des notes presque identiques pour l'application NotesAI.
+"""
+import os
+import zlib
+import struct
+from array import array
+from concurrent.futures import ProcessPoolExecutor
+
+from note_index import tokenize
+from note_model import parse_timestamp
+
+
+# Nombre de mots par fragment (shingle)
+SHINGLE_SIZE = 3
+
+# Taille de la signature MinHash, découpée en BANDS bandes de ROWS valeurs
+NUM_BINS = 64
+BANDS = 16
+ROWS = NUM_BINS // BANDS
+
+# En dessous de ce nombre de mots, une note est trop courte pour être comparée
+MIN_WORDS = 8
+
+# Décalage ajouté aux valeurs empruntées à une case voisine (densification)
+_BIN_SHIFT = 26
+_VALUE_MASK = (1 << _BIN_SHIFT) - 1
+_EMPTY = 1 << 32
+
+CACHE_MAGIC = b"NMH1"
+_RECORD_HEADER = struct.Struct("<Hq")
+
+
+def shingle_hashes(text):
+    """
+    Empreintes 32 bits des fragments de SHINGLE_SIZE mots consécutifs d'un texte.
+
+    Returns:
+        set: Les empreintes, ou un ensemble vide si le texte est trop court
+    """
+    words = tokenize(text)
+    if len(words) < MIN_WORDS:
+        return set()
+    hashes = set()
+    for i in range(len(words) - SHINGLE_SIZE + 1):
+        crc = zlib.crc32(" ".join(words[i:i + SHINGLE_SIZE]).encode("utf-8"))
+        # Mélange multiplicatif : crc32 seul répartit mal les bits de poids fort
+        hashes.add((crc * 0x9E3779B1) & 0xFFFFFFFF)
+    return hashes
+
+
+def minhash_signature(text):
+    """
+    Signature MinHash d'un texte, avec une seule fonction de hachage.
+
+    Chaque empreinte tombe dans une des NUM_BINS cases selon ses bits de
+    poids fort ; la case garde la plus petite valeur reçue. Une case vide
+    reprend la valeur de la case suivante non vide, décalée de la distance
+    (densification), pour que deux textes identiques aient toujours la même
+    signature. Le coût est proportionnel à la longueur du texte, au lieu de
+    NUM_BINS hachages par fragment.
+
+    Returns:
+        tuple: NUM_BINS entiers, ou None si le texte est trop court
+    """
+    hashes = shingle_hashes(text)
+    if not hashes:
+        return None
+    bins = [_EMPTY] * NUM_BINS
+    for value in hashes:
+        index = value >> _BIN_SHIFT
+        value &= _VALUE_MASK
+        if value < bins[index]:
+            bins[index] = value
+    for index in range(NUM_BINS):
+        if bins[index] == _EMPTY:
+            distance = 1
+            while bins[(index + distance) % NUM_BINS] == _EMPTY:
+                distance += 1
+            bins[index] = (bins[(index + distance) % NUM_BINS] & _VALUE_MASK) + (distance << _BIN_SHIFT)
+    return tuple(bins)
+
+
+def minhash_signatures(texts):
+    """Signatures d'un lot de textes (exécuté dans un processus de travail)."""
+    return [minhash_signature(text) for text in texts]
+
+
+def similarity(signature_a, signature_b):
+    """Estimation de la similarité de Jaccard de deux textes d'après leurs signatures."""
+    return sum(a == b for a, b in zip(signature_a, signature_b)) / NUM_BINS
+
+
+class _UnionFind:
+    """Regroupement incrémental des notes similaires."""
+
+    def __init__(self):
+        self.parent = {}
+
+    def find(self, item):
+        parent = self.parent.setdefault(item, item)
+        if parent != item:
+            parent = self.parent[item] = self.find(parent)
+        return parent
+
+    def union(self, a, b):
+        root_a, root_b = self.find(a), self.find(b)
+        if root_a != root_b:
+            self.parent[root_b] = root_a
+
+    def groups(self):
+        groups = {}
+        for item in self.parent:
+            groups.setdefault(self.find(item), []).append(item)
+        return list(groups.values())
+
+
+class DuplicateFinder:
+    """
+    Recherche des groupes de notes presque identiques (MinHash + LSH).
+
+    Chaque note est résumée par une signature MinHash de ses fragments de
+    mots. Les signatures sont découpées en bandes : deux notes dont une
+    bande est identique deviennent candidates, puis leur similarité est
+    estimée sur la signature complète. On ne compare donc jamais toutes les
+    paires de notes. Les signatures sont gardées en mémoire et dans le
+    fichier minhash.cache, avec la date de modification de la note : seules
+    les notes modifiées depuis le dernier calcul sont relues.
+    """
+
+    CACHE_FILE = "minhash.cache"
+
+    def __init__(self, note_model, threshold=0.6, workers=None, chunk_size=500):
+        """
+        Initialiser la recherche de doublons.
+
+        Args:
+            note_model (NoteModel): Le modèle dont les notes sont comparées
+            threshold (float): Similarité minimale (0 à 1) pour regrouper deux notes
+            workers (int): Nombre de processus de calcul (None pour le nombre de processeurs)
+            chunk_size (int): Nombre de notes par tâche de calcul
+        """
+        self.note_model = note_model
+        self.threshold = threshold
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.cache_path = os.path.join(note_model.save_folder, self.CACHE_FILE)
+        # identifiant -> (date de modification, signature ou None)
+        self.signatures = None
+        self.progress = {"hashed": 0, "total": 0, "done": False}
+
+    def _load_cache(self):
+        """Lire les signatures enregistrées."""
+        signatures = {}
+        try:
+            with open(self.cache_path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return signatures
+        if not data.startswith(CACHE_MAGIC):
+            return signatures
+        try:
+            position = len(CACHE_MAGIC)
+            size = NUM_BINS * 4
+            while position < len(data):
+                id_length, modified_ts = _RECORD_HEADER.unpack_from(data, position)
+                position += _RECORD_HEADER.size
+                note_id = data[position:position + id_length].decode("utf-8")
+                position += id_length
+                if data[position] == 0:
+                    signature = None
+                    position += 1
+                else:
+                    values = array("I")
+                    values.frombytes(data[position + 1:position + 1 + size])
+                    signature = tuple(values)
+                    position += 1 + size
+                signatures[note_id] = (modified_ts, signature)
+        except (struct.error, IndexError, ValueError) as e:
+            print(f"Erreur lors du chargement des signatures: {str(e)}")
+        return signatures
+
+    def _save_cache(self):
+        """Écrire les signatures via un fichier temporaire."""
+        parts = [CACHE_MAGIC]
+        for note_id, (modified_ts, signature) in self.signatures.items():
+            encoded = note_id.encode("utf-8")
+            parts.append(_RECORD_HEADER.pack(len(encoded), modified_ts))
+            parts.append(encoded)
+            if signature is None:
+                parts.append(b"\x00")
+            else:
+                parts.append(b"\x01")
+                parts.append(array("I", signature).tobytes())
+        tmp_path = self.cache_path + ".tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(b"".join(parts))
+        os.replace(tmp_path, self.cache_path)
+
+    def _read_archived(self, note_ids, texts, dates):
+        """Lire le contenu et la date des notes archivées non chargées, segment par segment."""
+        archive = self.note_model.archive
+        segments = {archive.segment_of(note_id) for note_id in note_ids}
+        for name in segments:
+            for note_id, data in archive.read_segment(name).items():
+                if note_id in note_ids:
+                    texts[note_id] = data.get("content") or ""
+                    dates[note_id] = parse_timestamp(data.get("modified", 0))
+
+    def _refresh_signatures(self):
+        """Calculer les signatures des notes nouvelles ou modifiées."""
+        model = self.note_model
+        if self.signatures is None:
+            self.signatures = self._load_cache()
+
+        with model.lock:
+            dates = {note_id: note.modified_ts for note_id, note in model.get_all_notes().items()}
+            archived = set() if model.archive is None else set(model.archive.note_segments)
+        archived -= dates.keys()
+
+        # Une note archivée ne change plus : sa signature connue reste valable
+        stale = [note_id for note_id, modified_ts in dates.items()
+                 if self.signatures.get(note_id, (None,))[0] != modified_ts]
+        missing_archived = {note_id for note_id in archived if note_id not in self.signatures}
+        removed = [note_id for note_id in self.signatures
+                   if note_id not in dates and note_id not in archived]
+        for note_id in removed:
+            del self.signatures[note_id]
+
+        self.progress["total"] = len(stale) + len(missing_archived)
+        if not stale and not missing_archived:
+            if removed:
+                self._save_cache()
+            return
+
+        texts = {note_id: model.get_content(note_id) or "" for note_id in stale}
+        if missing_archived:
+            self._read_archived(missing_archived, texts, dates)
+
+        note_ids = list(texts)
+        chunks = [note_ids[i:i + self.chunk_size]
+                  for i in range(0, len(note_ids), self.chunk_size)]
+        text_chunks = [[texts[note_id] for note_id in chunk] for chunk in chunks]
+        if len(chunks) <= 1:
+            # Trop peu de notes pour amortir le démarrage des processus
+            self._collect(chunks, map(minhash_signatures, text_chunks), dates)
+        else:
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                self._collect(chunks, pool.map(minhash_signatures, text_chunks), dates)
+        self._save_cache()
+
+    def _collect(self, chunks, results, dates):
+        """Ranger les signatures calculées, lot par lot, en mettant à jour l'avancement."""
+        for chunk, signatures in zip(chunks, results):
+            for note_id, signature in zip(chunk, signatures):
+                self.signatures[note_id] = (dates[note_id], signature)
+            self.progress["hashed"] += len(chunk)
+
+    def find_clusters(self):
+        """
+        Rechercher les groupes de notes presque identiques.
+
+        Returns:
+            list: Les groupes (listes de triplets (identifiant, titre, date de
+            modification), la note la plus récente en premier ; titre None pour
+            une note supprimée entre-temps), du plus grand au plus petit ; None
+            en cas d'erreur
+        """
+        self.progress = {"hashed": 0, "total": 0, "done": False}
+        try:
+            self._refresh_signatures()
+            clusters = self._clusters()
+            labels = self._labels({note_id for cluster in clusters for note_id in cluster})
+            return [[(note_id, *labels.get(note_id, (None, ""))) for note_id in cluster]
+                    for cluster in clusters]
+        except Exception as e:
+            print(f"Erreur lors de la recherche des doublons: {str(e)}")
+            return None
+        finally:
+            self.progress["done"] = True
+
+    def _labels(self, note_ids):
+        """
+        Titre et date de modification des notes des groupes, sans lire leur contenu.
+
+        Les notes archivées sont lues dans leur segment, sans être chargées
+        dans le modèle.
+        """
+        model = self.note_model
+        labels = {}
+        with model.lock:
+            notes = model.get_all_notes()
+            for note_id in note_ids:
+                note = notes.get(note_id)
+                if note is not None:
+                    labels[note_id] = (note.title, note["modified"])
+        archived = note_ids - labels.keys()
+        if archived and model.archive is not None:
+            for name in {model.archive.segment_of(note_id) for note_id in archived} - {None}:
+                for note_id, data in model.archive.read_segment(name).items():
+                    if note_id in archived:
+                        labels[note_id] = (data.get("title", ""), data.get("modified", ""))
+        return labels
+
+    def _clusters(self):
+        """Regrouper les notes dont une bande de signature est identique et assez similaires."""
+        signatures = {note_id: signature for note_id, (_, signature) in self.signatures.items()
+                      if signature is not None}
+        groups = _UnionFind()
+        for band in range(BANDS):
+            start = band * ROWS
+            # Une bande à la fois : seul le premier membre de chaque case est
+            # gardé, et chaque nouvelle note n'est comparée qu'à lui
+            buckets = {}
+            for note_id, signature in signatures.items():
+                key = signature[start:start + ROWS]
+                first = buckets.setdefault(key, note_id)
+                if (first != note_id and groups.find(first) != groups.find(note_id)
+                        and similarity(signatures[first], signature) >= self.threshold):
+                    groups.union(first, note_id)
+
+        with self.note_model.lock:
+            notes = self.note_model.get_all_notes()
+            order = {note_id: notes[note_id].modified_ts if note_id in notes
+                     else self.signatures[note_id][0] for note_id in groups.parent}
+        clusters = [sorted(group, key=lambda note_id: -order[note_id])
+                    for group in groups.groups() if len(group) > 1]
+        clusters.sort(key=len, reverse=True)
+        return clusters
@@ -0,0 +1,179 @@
+﻿"""
+Module d'export des notes en fichiers Markdown pour l'application NotesAI.
+"""
+import os
+import re
+import json
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from note_model import parse_timestamp
+from note_index import normalize_text
+
+
+SLUG_RE = re.compile(r"[^a-z0-9]+")
+
+
+def slugify(title, max_length=60):
+    """Nom de fichier lisible à partir d'un titre ("Réunion d'été" -> "reunion-d-ete")."""
+    slug = SLUG_RE.sub("-", normalize_text(title)).strip("-")
+    return slug[:max_length].rstrip("-") or "note"
+
+
+def note_to_markdown(note_id, note):
+    """
+    Convertir une note en Markdown avec un en-tête (front matter) YAML.
+
+    Les chaînes sont écrites au format JSON, qui est aussi du YAML valide.
+    """
+    return ("---\n"
+            f"id: {note_id}\n"
+            f"title: {json.dumps(note['title'], ensure_ascii=False)}\n"
+            f"category: {json.dumps(note['category'], ensure_ascii=False)}\n"
+            f"created: {note['created']}\n"
+            f"modified: {note['modified']}\n"
+            "---\n\n"
+            f"{note['content']}\n")
+
+
+class MarkdownMirror:
+    """
+    Copie des notes dans un dossier, un fichier Markdown par note.
+
+    L'export est incrémental : le fichier .mirror_state.json du dossier
+    garde, pour chaque note, le fichier écrit, la date de modification (et
+    la catégorie) exportées et la date de l'export. Seules les notes
+    modifiées depuis sont réécrites, les fichiers des notes supprimées sont
+    effacés, et les écritures sont réparties sur un pool de threads.
+    """
+
+    STATE_FILE = ".mirror_state.json"
+
+    def __init__(self, note_model, folder, workers=8):
+        """
+        Initialiser le miroir.
+
+        Args:
+            note_model (NoteModel): Le modèle dont les notes sont exportées
+            folder (str): Le dossier de destination
+            workers (int): Nombre de threads d'écriture
+        """
+        self.note_model = note_model
+        self.folder = folder
+        self.workers = workers
+        self.state_path = os.path.join(folder, self.STATE_FILE)
+        self.progress = {"written": 0, "total": 0, "done": False}
+
+    def _load_state(self):
+        """Lire l'état du dernier export (note_id -> [fichier, date, catégorie, date de l'export])."""
+        try:
+            with open(self.state_path, "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return {}
+
+    def _save_state(self, state):
+        """Écrire l'état de l'export via un fichier temporaire."""
+        tmp_path = self.state_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp_path, self.state_path)
+
+    def _write_file(self, filename, text):
+        """Écrire un fichier de note via un fichier temporaire."""
+        path = os.path.join(self.folder, filename)
+        with open(path + ".tmp", "w", encoding="utf-8", newline="\n") as f:
+            f.write(text)
+        os.replace(path + ".tmp", path)
+
+    def _remove_file(self, filename):
+        """Supprimer le fichier d'une note (s'il existe encore)."""
+        try:
+            os.remove(os.path.join(self.folder, filename))
+        except FileNotFoundError:
+            pass
+
+    def _export_note(self, note_id, filename, note):
+        """Écrire une note, en lisant son contenu si nécessaire (thread du pool)."""
+        if "content" not in note:
+            note = dict(note, content=self.note_model.get_content(note_id) or "")
+        self._write_file(filename, note_to_markdown(note_id, note))
+        self.progress["written"] += 1
+
+    def run(self):
+        """
+        Mettre le dossier à jour.
+
+        Returns:
+            dict: Le nombre de notes écrites, supprimées et inchangées, ou None en cas d'erreur
+        """
+        self.progress = {"written": 0, "total": 0, "done": False}
+        try:
+            os.makedirs(self.folder, exist_ok=True)
+            return self._run()
+        except Exception as e:
+            print(f"Erreur lors de l'export des notes: {str(e)}")
+            return None
+        finally:
+            self.progress["done"] = True
+
+    def _run(self):
+        """Comparer les notes à l'état du dernier export puis écrire les différences."""
+        state = self._load_state()
+        model = self.note_model
+
+        # Notes à réécrire : (identifiant, nom de fichier, note)
+        to_write = []
+        new_state = {}
+        with model.lock:
+            exported = int(time.time())
+            for note_id, note in model.get_all_notes().items():
+                signature = [note.modified_ts, note.category]
+                previous = state.get(note_id)
+                # Les dates sont à la seconde : une modification faite dans la seconde
+                # même de l'export précédent a la même date que la version exportée,
+                # la note est donc réécrite une fois de plus
+                if (previous is not None and previous[1:3] == signature
+                        and (len(previous) < 4 or previous[1] < previous[3])):
+                    new_state[note_id] = previous
+                    continue
+                filename = f"{slugify(note.title)}_{note_id}.md"
+                to_write.append((note_id, filename, dict(note)))
+                new_state[note_id] = [filename] + signature + [exported]
+            # Les notes archivées non chargées sont en lecture seule : déjà exportées,
+            # elles n'ont pas changé
+            archived = {} if model.archive is None else dict(model.archive.note_segments)
+        segments = {}
+        for note_id, segment in archived.items():
+            if note_id in new_state:
+                continue
+            if note_id in state:
+                new_state[note_id] = state[note_id]
+            else:
+                segments.setdefault(segment, []).append(note_id)
+
+        for segment in segments:
+            for note_id, data in model.archive.read_segment(segment).items():
+                if note_id in new_state:
+                    continue
+                note = dict(data)
+                note.setdefault("content", "")
+                filename = f"{slugify(note.get('title', ''))}_{note_id}.md"
+                to_write.append((note_id, filename, note))
+                new_state[note_id] = [filename, parse_timestamp(note.get("modified", 0)),
+                                      note.get("category", ""), exported]
+
+        # Fichiers à supprimer : notes supprimées, ou renommées (le titre a changé)
+        to_remove = [entry[0] for note_id, entry in state.items()
+                     if note_id not in new_state or new_state[note_id][0] != entry[0]]
+
+        self.progress["total"] = len(to_write)
+        if to_write or to_remove:
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                list(pool.map(lambda item: self._export_note(*item), to_write))
+                list(pool.map(self._remove_file, to_remove))
+            self._save_state(new_state)
+
+        return {"written": len(to_write),
+                "deleted": len([note_id for note_id in state if note_id not in new_state]),
+                "unchanged": len(new_state) - len(to_write)}
@@ -0,0 +1,277 @@
+﻿"""
+Module d'historique des versions des notes pour l'application NotesAI.
+"""
+import os
+import json
+import time
+from difflib import SequenceMatcher
+from threading import RLock
+
+
+def make_delta(old, new):
+    """
+    Calculer les opérations qui transforment `old` en `new`.
+
+    Le résultat est une liste compacte : ["=", n] garde n caractères,
+    ["-", n] en supprime n et ["+", texte] insère du texte. Les éditions
+    d'une note étant en général locales, on retire d'abord le préfixe et le
+    suffixe communs et on ne compare finement que la partie modifiée.
+    """
+    prefix = 0
+    limit = min(len(old), len(new))
+    while prefix < limit and old[prefix] == new[prefix]:
+        prefix += 1
+    suffix = 0
+    limit -= prefix
+    while suffix < limit and old[-1 - suffix] == new[-1 - suffix]:
+        suffix += 1
+
+    old_mid = old[prefix:len(old) - suffix]
+    new_mid = new[prefix:len(new) - suffix]
+
+    ops = []
+    if prefix:
+        ops.append(["=", prefix])
+    if old_mid and new_mid and len(old_mid) + len(new_mid) <= 4000:
+        matcher = SequenceMatcher(None, old_mid, new_mid, autojunk=False)
+        for tag, i1, i2, j1, j2 in matcher.get_opcodes():
+            if tag == "equal":
+                ops.append(["=", i2 - i1])
+                continue
+            if i2 > i1:
+                ops.append(["-", i2 - i1])
+            if j2 > j1:
+                ops.append(["+", new_mid[j1:j2]])
+    else:
+        if old_mid:
+            ops.append(["-", len(old_mid)])
+        if new_mid:
+            ops.append(["+", new_mid])
+    if suffix:
+        ops.append(["=", suffix])
+    return ops
+
+
+def apply_delta(old, ops):
+    """Appliquer à `old` les opérations calculées par make_delta."""
+    parts = []
+    position = 0
+    for op, value in ops:
+        if op == "=":
+            parts.append(old[position:position + value])
+            position += value
+        elif op == "-":
+            position += value
+        else:
+            parts.append(value)
+    return "".join(parts)
+
+
+def delta_size(ops):
+    """Taille approximative d'un delta, en caractères."""
+    return sum(len(value) if op == "+" else 4 for op, value in ops)
+
+
+class NoteHistory:
+    """
+    Historique des versions de chaque note, compressé par deltas.
+
+    Une version est enregistrée au plus une fois par fenêtre de `window`
+    secondes : c'est l'état de la note avant la première modification de
+    la fenêtre. Chaque version est soit un instantané complet, soit un
+    delta par rapport à la version précédente ; un nouvel instantané n'est
+    pris que lorsque les deltas accumulés dépassent la taille du texte, ce
+    qui borne le coût de reconstruction.
+
+    L'historique d'une note est ajouté ligne par ligne dans
+    history/<note_id>.jsonl et n'est lu qu'à la première utilisation.
+    """
+
+    def __init__(self, save_folder, window=60, max_versions=50, max_age_days=30):
+        """
+        Initialiser l'historique.
+
+        Args:
+            save_folder (str): Le dossier de sauvegarde de l'application
+            window (int): Durée de regroupement des modifications, en secondes
+            max_versions (int): Nombre maximal de versions gardées par note
+            max_age_days (int): Âge maximal d'une version, en jours (None pour illimité)
+        """
+        self.folder = os.path.join(save_folder, "history")
+        os.makedirs(self.folder, exist_ok=True)
+        self.window = window
+        self.max_versions = max_versions
+        self.max_age_days = max_age_days
+
+        self._lock = RLock()
+        # note_id -> liste des versions (de la plus ancienne à la plus récente)
+        self._versions = {}
+        # note_id -> texte de la dernière version (pour calculer le delta suivant)
+        self._last_content = {}
+
+    def _path(self, note_id):
+        """Chemin du fichier d'historique d'une note."""
+        return os.path.join(self.folder, f"{note_id}.jsonl")
+
+    def _load(self, note_id):
+        """Lire l'historique d'une note s'il n'est pas déjà en mémoire."""
+        versions = self._versions.get(note_id)
+        if versions is not None:
+            return versions
+
+        versions = []
+        path = self._path(note_id)
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        versions.append(json.loads(line))
+                    except ValueError:
+                        continue  # Ligne tronquée par un arrêt brutal
+        # Un historique doit commencer par un instantané
+        while versions and "snapshot" not in versions[0]:
+            versions.pop(0)
+        self._versions[note_id] = versions
+        return versions
+
+    def record(self, note_id, title, content, modified_ts, force=False):
+        """
+        Enregistrer l'état d'une note avant modification.
+
+        Args:
+            note_id (str): L'identifiant de la note
+            title (str): Le titre de la note
+            content (str): Le contenu à conserver
+            modified_ts (int): La date de dernière modification de ce contenu
+            force (bool): Ignorer la fenêtre de regroupement (avant une
+                modification par l'IA, par exemple)
+
+        Returns:
+            bool: True si une nouvelle version a été enregistrée
+        """
+        now = int(time.time())
+        with self._lock:
+            versions = self._load(note_id)
+            if versions:
+                if not force and now - versions[-1]["recorded"] < self.window:
+                    return False
+                previous = self._content_at(note_id, len(versions) - 1)
+                if previous == content:
+                    return False
+            else:
+                previous = None
+
+            version = {"recorded": now, "modified": modified_ts, "title": title}
+            if previous is None or self._needs_snapshot(versions, len(content)):
+                version["snapshot"] = content
+            else:
+                version["delta"] = make_delta(previous, content)
+            versions.append(version)
+            self._last_content[note_id] = content
+
+            if self._apply_retention(note_id, versions, now):
+                self._rewrite(note_id)
+            else:
+                self._append(note_id, version)
+            return True
+
+    def _needs_snapshot(self, versions, text_length):
+        """Indiquer si les deltas depuis le dernier instantané deviennent trop lourds."""
+        accumulated = 0
+        for version in reversed(versions):
+            if "snapshot" in version:
+                break
+            accumulated += delta_size(version["delta"])
+        return accumulated >= max(text_length, 256)
+
+    def _apply_retention(self, note_id, versions, now):
+        """Supprimer les versions trop anciennes ou en trop ; True si l'historique a changé."""
+        drop = max(len(versions) - self.max_versions, 0)
+        if self.max_age_days is not None:
+            oldest_allowed = now - self.max_age_days * 86400
+            while drop < len(versions) - 1 and versions[drop]["recorded"] < oldest_allowed:
+                drop += 1
+        if not drop:
+            return False
+
+        # La première version gardée devient un instantané
+        first_kept = self._content_at(note_id, drop)
+        del versions[:drop]
+        versions[0].pop("delta", None)
+        versions[0]["snapshot"] = first_kept
+        return True
+
+    def _content_at(self, note_id, index):
+        """Reconstruire le contenu d'une version."""
+        versions = self._versions[note_id]
+        if index == len(versions) - 1 and note_id in self._last_content:
+            return self._last_content[note_id]
+
+        start = index
+        while "snapshot" not in versions[start]:
+            start -= 1
+        content = versions[start]["snapshot"]
+        for version in versions[start + 1:index + 1]:
+            content = apply_delta(content, version["delta"])
+
+        if index == len(versions) - 1:
+            self._last_content[note_id] = content
+        return content
+
+    def _append(self, note_id, version):
+        """Ajouter une version au fichier d'historique."""
+        try:
+            with open(self._path(note_id), "a", encoding="utf-8") as f:
+                f.write(json.dumps(version, ensure_ascii=False) + "\n")
+        except Exception as e:
+            print(f"Erreur lors de l'enregistrement de l'historique: {str(e)}")
+
+    def _rewrite(self, note_id):
+        """Réécrire entièrement le fichier d'historique d'une note."""
+        path = self._path(note_id)
+        tmp_path = path + ".tmp"
+        try:
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                for version in self._versions[note_id]:
+                    f.write(json.dumps(version, ensure_ascii=False) + "\n")
+            os.replace(tmp_path, path)
+        except Exception as e:
+            print(f"Erreur lors de l'enregistrement de l'historique: {str(e)}")
+
+    def list_versions(self, note_id):
+        """
+        Lister les versions d'une note, de la plus récente à la plus ancienne.
+
+        Returns:
+            list: Des dictionnaires avec l'indice, les dates et le titre de chaque version
+        """
+        with self._lock:
+            versions = self._load(note_id)
+            return [{"index": index,
+                     "recorded": version["recorded"],
+                     "modified": version["modified"],
+                     "title": version["title"]}
+                    for index, version in reversed(list(enumerate(versions)))]
+
+    def get_version(self, note_id, index):
+        """
+        Reconstruire une version d'une note.
+
+        Returns:
+            dict: Le titre, le contenu et la date de modification, ou None
+        """
+        with self._lock:
+            versions = self._load(note_id)
+            if not 0 <= index < len(versions):
+                return None
+            return {"title": versions[index]["title"],
+                    "content": self._content_at(note_id, index),
+                    "modified": versions[index]["modified"]}
+
+    def delete(self, note_id):
+        """Supprimer l'historique d'une note."""
+        with self._lock:
+            self._versions.pop(note_id, None)
+            self._last_content.pop(note_id, None)
+            if os.path.exists(self._path(note_id)):
+                os.remove(self._path(note_id))
@@ -0,0 +1,139 @@
+﻿"""
+Module d'import de dossiers de fichiers texte et Markdown pour l'application NotesAI.
+"""
+import os
+import re
+from concurrent.futures import ProcessPoolExecutor
+
+
+IMPORT_EXTENSIONS = (".txt", ".md", ".markdown")
+
+# Encodages essayés dans l'ordre (cp1252 pour les vieux fichiers Windows)
+ENCODINGS = ("utf-8-sig", "cp1252", "latin-1")
+
+HEADING_RE = re.compile(r"^\s{0,3}#{1,6}\s+(.+?)\s*#*\s*$")
+
+
+def find_note_files(folder, extensions=IMPORT_EXTENSIONS):
+    """Lister récursivement les fichiers importables d'un dossier, triés par chemin."""
+    paths = []
+    for root, _, files in os.walk(folder):
+        for name in files:
+            if name.lower().endswith(extensions):
+                paths.append(os.path.join(root, name))
+    paths.sort()
+    return paths
+
+
+def decode_text(data):
+    """Décoder le contenu d'un fichier en essayant les encodages courants."""
+    for encoding in ENCODINGS:
+        try:
+            return data.decode(encoding)
+        except UnicodeDecodeError:
+            continue
+    return data.decode("utf-8", errors="replace")
+
+
+def read_note_file(path):
+    """
+    Lire un fichier et le convertir en note.
+
+    Le titre est le premier titre Markdown ("# ...") ou, à défaut, la
+    première ligne non vide ; les dates sont celles du fichier.
+
+    Returns:
+        dict: La note ("title", "content", "created", "modified"), ou None
+        si le fichier est illisible
+    """
+    try:
+        with open(path, "rb") as f:
+            content = decode_text(f.read())
+        stat = os.stat(path)
+    except OSError:
+        return None
+
+    content = content.replace("\r\n", "\n").strip()
+    title = os.path.splitext(os.path.basename(path))[0]
+    for line in content.split("\n", 20)[:20]:
+        if not line.strip():
+            continue
+        heading = HEADING_RE.match(line)
+        title = heading.group(1) if heading else line.strip()
+        break
+
+    modified = int(stat.st_mtime)
+    return {"title": title[:200],
+            "content": content,
+            "created": min(int(stat.st_ctime), modified),
+            "modified": modified}
+
+
+def read_note_files(paths):
+    """Lire un lot de fichiers (exécuté dans un processus de travail)."""
+    return [read_note_file(path) for path in paths]
+
+
+class FolderImporter:
+    """
+    Import d'un dossier de fichiers .txt / .md.
+
+    Les fichiers sont lus et décodés en parallèle par un pool de processus,
+    par lots de `chunk_size` fichiers ; les notes sont ensuite créées avec
+    NoteModel.create_notes_bulk, soit une seule écriture sur disque.
+    `progress` indique l'avancement et peut être lu depuis un autre thread.
+    """
+
+    def __init__(self, note_model, workers=None, chunk_size=250):
+        """
+        Initialiser l'import.
+
+        Args:
+            note_model (NoteModel): Le modèle qui reçoit les notes
+            workers (int): Nombre de processus de lecture (None pour le nombre de processeurs)
+            chunk_size (int): Nombre de fichiers lus par tâche
+        """
+        self.note_model = note_model
+        self.workers = workers
+        self.chunk_size = chunk_size
+        self.progress = {"read": 0, "total": 0, "created": 0, "done": False}
+
+    def import_folder(self, folder, category="Importé"):
+        """
+        Importer tous les fichiers d'un dossier (et de ses sous-dossiers).
+
+        Args:
+            folder (str): Le dossier à importer
+            category (str): La catégorie donnée aux notes importées
+
+        Returns:
+            list: Les identifiants des notes créées
+        """
+        paths = find_note_files(folder)
+        self.progress = {"read": 0, "total": len(paths), "created": 0, "done": False}
+        try:
+            chunks = [paths[i:i + self.chunk_size]
+                      for i in range(0, len(paths), self.chunk_size)]
+            if len(chunks) <= 1:
+                # Trop peu de fichiers pour amortir le démarrage des processus
+                notes = self._collect(map(read_note_files, chunks))
+            else:
+                with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                    notes = self._collect(pool.map(read_note_files, chunks))
+
+            note_ids = self.note_model.create_notes_bulk(notes, category=category)
+            self.progress["created"] = len(note_ids)
+            return note_ids
+        except Exception as e:
+            print(f"Erreur lors de l'import du dossier: {str(e)}")
+            return []
+        finally:
+            self.progress["done"] = True
+
+    def _collect(self, results):
+        """Rassembler les notes lues, lot par lot, en mettant à jour l'avancement."""
+        notes = []
+        for batch in results:
+            notes.extend(note for note in batch if note is not None)
+            self.progress["read"] += len(batch)
+        return notes
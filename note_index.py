@@ -0,0 +1,396 @@
+﻿"""
+Module d'indexation des notes pour la recherche dans l'application NotesAI.
+"""
+import re
+import heapq
+import unicodedata
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+from itertools import islice
+from functools import lru_cache
+
+
+WORD_RE = re.compile(r"\w+")
+
+
+@lru_cache(maxsize=65536)
+def normalize_text(text):
+    """Mettre un texte en minuscules et retirer les accents ("Été" -> "ete")."""
+    text = text.lower()
+    if text.isascii():
+        return text
+    decomposed = unicodedata.normalize("NFKD", text)
+    return "".join(c for c in decomposed if not unicodedata.combining(c))
+
+
+def tokenize(text):
+    """Découper un texte en mots normalisés."""
+    # Les mots se répètent beaucoup : on normalise mot par mot grâce au cache
+    return [normalize_text(word) for word in WORD_RE.findall(text)]
+
+
+def token_set(text):
+    """Ensemble des mots normalisés d'un texte (comme set(tokenize(text)), plus rapide)."""
+    if text.isascii():
+        # Normaliser un texte ASCII revient à le mettre en minuscules : une seule fois pour tout le texte
+        return frozenset(WORD_RE.findall(text.lower()))
+    return frozenset(map(normalize_text, set(WORD_RE.findall(text))))
+
+
+def trigrams(word):
+    """Ensemble des trigrammes de caractères d'un mot."""
+    return {word[i:i + 3] for i in range(len(word) - 2)}
+
+
+def padded_trigrams(word):
+    """Trigrammes d'un mot encadré d'espaces, qui marquent son début et sa fin."""
+    return trigrams(f"  {word} ")
+
+
+class NoteSearchIndex:
+    """
+    Index inversé des mots du titre, du contenu et de la catégorie des notes.
+
+    L'index est construit une fois au chargement puis mis à jour note par
+    note. Les mots de la requête sont cherchés dans le vocabulaire :
+    par préfixe pour les mots courts, et comme sous-chaîne via un index de
+    trigrammes du vocabulaire pour les mots de trois lettres ou plus.
+    """
+
+    FIELDS = ("title", "content", "category")
+
+    def __init__(self):
+        # mot -> ensemble des identifiants de notes
+        self.postings = {}
+        # identifiant de note -> mots de chaque champ (titre, contenu, catégorie)
+        self.note_fields = {}
+        # Vocabulaire trié (recherche par préfixe)
+        self.vocabulary = []
+        # trigramme -> mots du vocabulaire qui le contiennent
+        self.vocabulary_trigrams = {}
+
+    def build(self, notes):
+        """Construire l'index pour toutes les notes."""
+        self.postings = {}
+        self.note_fields = {}
+        self.vocabulary = []
+        self.vocabulary_trigrams = {}
+        self.add_many(notes)
+
+    def add_many(self, notes):
+        """Indexer un lot de nouvelles notes (chargement initial, import)."""
+        note_fields = self.note_fields
+        # Une seule passe sur le lot : les identifiants sont regroupés par mot,
+        # puis chaque ensemble de l'index est complété en une fois
+        batch = defaultdict(list)
+        for note_id, note in notes.items():
+            title, content, category = fields = self._field_tokens(note)
+            note_fields[note_id] = fields
+            for token in title | content | category:
+                batch[token].append(note_id)
+
+        postings = self.postings
+        new_tokens = []
+        for token, note_ids in batch.items():
+            posting = postings.get(token)
+            if posting is None:
+                postings[token] = set(note_ids)
+                new_tokens.append(token)
+            else:
+                posting.update(note_ids)
+
+        # Le vocabulaire et ses trigrammes sont mis à jour une seule fois par lot
+        if new_tokens:
+            self.vocabulary = sorted(self.vocabulary + new_tokens)
+            for token in new_tokens:
+                for gram in self._token_grams(token):
+                    self.vocabulary_trigrams.setdefault(gram, set()).add(token)
+
+    def _field_tokens(self, note):
+        """Ensembles des mots normalisés de chaque champ d'une note."""
+        return tuple(token_set(note.get(field) or "") for field in self.FIELDS)
+
+    def add(self, note_id, note):
+        """Indexer (ou réindexer) une note."""
+        fields = self._field_tokens(note)
+        tokens = frozenset().union(*fields)
+
+        old_tokens = frozenset().union(*self.note_fields.get(note_id, ()))
+        for token in old_tokens - tokens:
+            self._remove_posting(token, note_id)
+        for token in tokens - old_tokens:
+            self._add_posting(token, note_id)
+        self.note_fields[note_id] = fields
+
+    def remove(self, note_id):
+        """Retirer une note de l'index."""
+        for token in frozenset().union(*self.note_fields.pop(note_id, ())):
+            self._remove_posting(token, note_id)
+
+    def _token_grams(self, token):
+        """
+        Trigrammes indexés pour un mot du vocabulaire.
+
+        Les trigrammes simples servent à la recherche de sous-chaînes, les
+        trigrammes avec espaces (début et fin de mot) à la recherche
+        approximative ; les deux ne peuvent pas se confondre.
+        """
+        return trigrams(token) | padded_trigrams(token)
+
+    def _add_posting(self, token, note_id):
+        """Associer un mot à une note."""
+        posting = self.postings.get(token)
+        if posting is None:
+            posting = self.postings[token] = set()
+            insort(self.vocabulary, token)
+            for gram in self._token_grams(token):
+                self.vocabulary_trigrams.setdefault(gram, set()).add(token)
+        posting.add(note_id)
+
+    def _remove_posting(self, token, note_id):
+        """Dissocier un mot d'une note (et l'oublier s'il n'est plus utilisé)."""
+        posting = self.postings.get(token)
+        if posting is None:
+            return
+        posting.discard(note_id)
+        if not posting:
+            del self.postings[token]
+            index = bisect_left(self.vocabulary, token)
+            if index < len(self.vocabulary) and self.vocabulary[index] == token:
+                del self.vocabulary[index]
+            for gram in self._token_grams(token):
+                words = self.vocabulary_trigrams.get(gram)
+                if words is not None:
+                    words.discard(token)
+                    if not words:
+                        del self.vocabulary_trigrams[gram]
+
+    def matching_tokens(self, word):
+        """Mots du vocabulaire qui correspondent à un mot de la requête."""
+        if len(word) < 3:
+            # Recherche par préfixe dans le vocabulaire trié
+            start = bisect_left(self.vocabulary, word)
+            matches = []
+            for token in self.vocabulary[start:]:
+                if not token.startswith(word):
+                    break
+                matches.append(token)
+            return matches
+
+        # Sous-chaîne : candidats partageant tous les trigrammes du mot
+        candidates = None
+        for gram in sorted(trigrams(word), key=lambda g: len(self.vocabulary_trigrams.get(g, ()))):
+            words = self.vocabulary_trigrams.get(gram)
+            if not words:
+                return []
+            candidates = set(words) if candidates is None else candidates & words
+            if not candidates:
+                return []
+        return [token for token in candidates if word in token]
+
+    def word_ids(self, word, field=None):
+        """
+        Notes dont un mot correspond à `word` (mot normalisé de la requête).
+
+        Args:
+            word (str): Le mot recherché (préfixe ou sous-chaîne)
+            field (str): Limiter la recherche à un champ ('title', 'content'
+                ou 'category'), ou None pour tous les champs
+
+        Returns:
+            set: Les identifiants des notes trouvées
+        """
+        tokens = self.matching_tokens(word)
+        ids = set()
+        for token in tokens:
+            ids |= self.postings[token]
+        if field is None or not ids:
+            return ids
+
+        position = self.FIELDS.index(field)
+        tokens = set(tokens)
+        return {note_id for note_id in ids
+                if not tokens.isdisjoint(self.note_fields[note_id][position])}
+
+    def estimate(self, word):
+        """Estimation rapide du nombre de notes correspondant à un mot."""
+        return sum(len(self.postings[token]) for token in self.matching_tokens(word))
+
+    def has_word(self, note_id, word, field=None):
+        """Vérifier qu'une note contient un mot correspondant à `word`."""
+        fields = self.note_fields.get(note_id, ())
+        if fields and field is not None:
+            fields = (fields[self.FIELDS.index(field)],)
+        if len(word) < 3:
+            return any(token.startswith(word) for tokens in fields for token in tokens)
+        return any(word in token for tokens in fields for token in tokens)
+
+    def search(self, text):
+        """
+        Rechercher les notes contenant tous les mots du texte.
+
+        Returns:
+            set: Les identifiants des notes trouvées, ou None si le texte
+            ne contient aucun mot
+        """
+        words = tokenize(text)
+        if not words:
+            return None
+
+        result = None
+        # Commencer par les mots les plus longs, en général les plus sélectifs
+        for word in sorted(set(words), key=len, reverse=True):
+            ids = self.word_ids(word)
+            result = ids if result is None else result & ids
+            if not result:
+                return set()
+        return result
+
+    def similar_tokens(self, word, min_similarity, max_tokens=50):
+        """
+        Mots du vocabulaire proches d'un mot mal orthographié.
+
+        La similarité est le coefficient de Jaccard entre les ensembles de
+        trigrammes (avec espaces de début et de fin) : seuls les mots qui
+        partagent au moins un trigramme avec la requête sont examinés.
+
+        Returns:
+            dict: mot du vocabulaire -> similarité (entre 0 et 1), limité
+            aux `max_tokens` mots les plus proches
+        """
+        word_grams = padded_trigrams(word)
+        shared = Counter()
+        for gram in word_grams:
+            shared.update(self.vocabulary_trigrams.get(gram, ()))
+
+        similar = []
+        for token, count in shared.items():
+            # len(token) + 1 = nombre de trigrammes avec espaces du mot
+            similarity = count / (len(word_grams) + len(token) + 1 - count)
+            if similarity >= min_similarity:
+                similar.append((similarity, token))
+        return {token: similarity for similarity, token in heapq.nlargest(max_tokens, similar)}
+
+    def fuzzy_search(self, text, min_similarity=0.3):
+        """
+        Rechercher les notes en tolérant les fautes de frappe.
+
+        Chaque mot de la requête doit être proche d'au moins un mot de la
+        note ; le score d'une note est la moyenne, sur les mots de la
+        requête, de la meilleure similarité trouvée.
+
+        Returns:
+            dict: identifiant de note -> score (entre 0 et 1), ou None si le
+            texte ne contient aucun mot
+        """
+        words = set(tokenize(text))
+        if not words:
+            return None
+
+        scores = None
+        for word in sorted(words, key=len, reverse=True):
+            word_scores = {}
+            for token, similarity in self.similar_tokens(word, min_similarity).items():
+                for note_id in self.postings[token]:
+                    if similarity > word_scores.get(note_id, 0.0):
+                        word_scores[note_id] = similarity
+            if scores is None:
+                scores = word_scores
+            else:
+                scores = {note_id: score + word_scores[note_id]
+                          for note_id, score in scores.items() if note_id in word_scores}
+            if not scores:
+                return {}
+        return {note_id: score / len(words) for note_id, score in scores.items()}
+
+
+class RecencyIndex:
+    """
+    Liste des notes maintenue triée par date (de modification par défaut).
+
+    Chaque modification déplace une seule entrée (recherche dichotomique),
+    ce qui évite de retrier toutes les notes à chaque sauvegarde.
+    """
+
+    def __init__(self, attribute="modified_ts"):
+        # Attribut de Note qui sert de clé de tri
+        self.attribute = attribute
+        # Clés (date, identifiant) en ordre croissant
+        self.keys = []
+        # identifiant de note -> clé actuelle
+        self.note_keys = {}
+
+    def build(self, notes):
+        """Construire l'index pour toutes les notes."""
+        self.keys = []
+        self.note_keys = {}
+        self.add_many(notes)
+
+    def add_many(self, notes):
+        """Ajouter un lot de nouvelles notes (chargement initial)."""
+        keys = [(getattr(note, self.attribute), note_id) for note_id, note in notes.items()]
+        self.note_keys.update((key[1], key) for key in keys)
+        # Le tri de Python fusionne en temps linéaire deux suites déjà triées
+        keys.sort()
+        self.keys += keys
+        self.keys.sort()
+
+    def update(self, note_id, modified):
+        """Placer une note à sa nouvelle date de modification."""
+        self.remove(note_id)
+        key = (modified, note_id)
+        insort(self.keys, key)
+        self.note_keys[note_id] = key
+
+    def remove(self, note_id):
+        """Retirer une note de l'index."""
+        key = self.note_keys.pop(note_id, None)
+        if key is None:
+            return
+        index = bisect_left(self.keys, key)
+        if index < len(self.keys) and self.keys[index] == key:
+            del self.keys[index]
+
+    def __len__(self):
+        return len(self.keys)
+
+    def date_of(self, note_id):
+        """Date indexée d'une note (None si la note n'est pas indexée)."""
+        key = self.note_keys.get(note_id)
+        return None if key is None else key[0]
+
+    def between(self, start=None, end=None):
+        """Identifiants des notes dont la date est dans [start, end[."""
+        low = 0 if start is None else bisect_left(self.keys, (start, ""))
+        high = len(self.keys) if end is None else bisect_left(self.keys, (end, ""))
+        return {note_id for _, note_id in self.keys[low:high]}
+
+    def count_between(self, start=None, end=None):
+        """Nombre de notes dont la date est dans [start, end[."""
+        low = 0 if start is None else bisect_left(self.keys, (start, ""))
+        high = len(self.keys) if end is None else bisect_left(self.keys, (end, ""))
+        return max(high - low, 0)
+
+    def newest(self, offset=0, limit=None):
+        """Identifiants des notes, de la plus récente à la plus ancienne, pour une page."""
+        end = len(self.keys) - offset
+        start = 0 if limit is None else max(end - limit, 0)
+        return [note_id for _, note_id in reversed(self.keys[start:max(end, 0)])]
+
+    def top(self, note_ids, offset=0, limit=None):
+        """
+        Trier un sous-ensemble de notes par date de modification décroissante.
+
+        Pour un grand sous-ensemble, on parcourt l'index depuis la note la
+        plus récente et on s'arrête dès que la page est complète ; pour un
+        petit sous-ensemble, on trie directement ses clés.
+        """
+        if len(note_ids) * 8 < len(self.keys):
+            keys = sorted((self.note_keys[note_id] for note_id in note_ids
+                           if note_id in self.note_keys), reverse=True)
+            keys = keys[offset:] if limit is None else keys[offset:offset + limit]
+            return [note_id for _, note_id in keys]
+
+        matches = (note_id for _, note_id in reversed(self.keys) if note_id in note_ids)
+        stop = None if limit is None else offset + limit
+        return list(islice(matches, offset, stop))
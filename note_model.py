@@ -2,128 +2,1088 @@
 Module de gestion des données pour l'application NotesAI.
 """
 import os
-import json
+import time
+import heapq
+import uuid
+from collections import OrderedDict
 from datetime import datetime
+from functools import lru_cache
+from queue import Queue
+from threading import RLock, Thread
+
+from note_storage import (JsonNoteStore, JournalNoteStore, SplitNoteStore,
+                          SQLiteNoteStore, NoteWriter)
+from note_index import NoteSearchIndex, RecencyIndex
+from note_query import parse_query, is_plain_text, QueryExecutor
+from note_history import NoteHistory
+from note_archive import NoteArchive
+
+
+DATE_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+# Table partagée des catégories : une seule chaîne par catégorie distincte
+_category_table = {}
+
+
+def intern_category(category):
+    """Obtenir l'exemplaire partagé d'un nom de catégorie."""
+    return _category_table.setdefault(category, category)
+
+
+@lru_cache(maxsize=16384)
+def _hour_start(value):
+    """Horodatage du début de l'heure "AAAA-MM-JJ HH" (heure locale)."""
+    return int(time.mktime((int(value[0:4]), int(value[5:7]), int(value[8:10]),
+                            int(value[11:13]), 0, 0, 0, 0, -1)))
+
+
+def parse_timestamp(value):
+    """Convertir une date "AAAA-MM-JJ HH:MM:SS" (heure locale) en secondes depuis l'époque."""
+    if isinstance(value, (int, float)):
+        return int(value)
+    try:
+        # Découpage direct avec un cache par heure : bien plus rapide que strptime
+        return _hour_start(value[:13]) + int(value[14:16]) * 60 + int(value[17:19])
+    except (ValueError, TypeError, OverflowError):
+        try:
+            return int(datetime.fromisoformat(value).timestamp())
+        except (ValueError, TypeError):
+            return 0
+
+
+def format_timestamp(timestamp):
+    """Formater un horodatage pour l'affichage et le fichier JSON."""
+    return time.strftime(DATE_FORMAT, time.localtime(timestamp))
+
+
+class Note:
+    """
+    Enregistrement compact d'une note.
+
+    Les dates sont des entiers (secondes depuis l'époque) et la catégorie
+    provient de la table partagée. L'accès par clé (note["modified"],
+    dict(note), ...) reste compatible avec les dictionnaires utilisés par
+    l'interface et par le format JSON. Le contenu vaut None tant qu'il
+    n'est pas chargé (mode 'split').
+    """
+
+    __slots__ = ("title", "content", "created_ts", "modified_ts", "category")
+
+    FIELDS = ("title", "content", "created", "modified", "category")
+
+    def __init__(self, title="", content="", created_ts=0, modified_ts=0, category=""):
+        self.title = title
+        self.content = content
+        self.created_ts = created_ts
+        self.modified_ts = modified_ts
+        self.category = intern_category(category)
+
+    @classmethod
+    def from_dict(cls, data):
+        """Créer une note à partir de son dictionnaire JSON."""
+        return cls(title=data.get("title", ""),
+                   content=data.get("content"),
+                   created_ts=parse_timestamp(data.get("created", 0)),
+                   modified_ts=parse_timestamp(data.get("modified", 0)),
+                   category=data.get("category", ""))
+
+    def __getitem__(self, key):
+        if key == "modified":
+            return format_timestamp(self.modified_ts)
+        if key == "created":
+            return format_timestamp(self.created_ts)
+        if key == "content":
+            if self.content is None:
+                raise KeyError(key)
+            return self.content
+        if key in ("title", "category"):
+            return getattr(self, key)
+        raise KeyError(key)
+
+    def __setitem__(self, key, value):
+        if key == "modified":
+            self.modified_ts = parse_timestamp(value)
+        elif key == "created":
+            self.created_ts = parse_timestamp(value)
+        elif key == "category":
+            self.category = intern_category(value)
+        elif key in ("title", "content"):
+            setattr(self, key, value)
+        else:
+            raise KeyError(key)
+
+    def __contains__(self, key):
+        return key in self.FIELDS and (key != "content" or self.content is not None)
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __eq__(self, other):
+        if isinstance(other, (Note, dict)):
+            return dict(self) == dict(other)
+        return NotImplemented
+
+    # Comme le dictionnaire qu'elle remplace, une note est modifiable et se
+    # compare par valeur : elle n'est donc pas hachable (ni clé ni élément d'ensemble)
+    __hash__ = None
+
+    def __repr__(self):
+        content = "non chargé" if self.content is None else f"{len(self.content)} caractères"
+        return (f"Note(title={self.title!r}, category={self.category!r}, "
+                f"modified={self['modified']!r}, content={content})")
+
+    def keys(self):
+        """Champs présents (le contenu est absent s'il n'est pas chargé)."""
+        return [field for field in self.FIELDS if field in self]
+
+    def items(self):
+        """Couples (champ, valeur), comme pour un dictionnaire."""
+        return [(field, self[field]) for field in self.keys()]
+
+    def get(self, key, default=None):
+        """Valeur d'un champ, ou `default` s'il est absent."""
+        try:
+            return self[key]
+        except KeyError:
+            return default
+
+    def setdefault(self, key, default=None):
+        """Valeur d'un champ, initialisé à `default` s'il est absent."""
+        if key not in self:
+            self[key] = default
+        return self[key]
+
+    def pop(self, key, default=None):
+        """Décharger le contenu de la note (seul champ qui peut être absent)."""
+        if key != "content" or self.content is None:
+            return default
+        content, self.content = self.content, None
+        return content
+
+    def to_dict(self):
+        """Dictionnaire JSON de la note."""
+        return dict(self.items())
 
 
 class NoteModel:
     """Modèle de données pour gérer les notes."""
 
-    def __init__(self):
+    def __init__(self, storage="journal", write_interval=1.0, content_cache_size=64,
+                 history_window=60, progressive_load=False, archive_after_days=None):
+        """
+        Initialiser le modèle.
+
+        Args:
+            storage (str): Le mode de stockage ('journal', 'json', 'split' ou 'sqlite')
+            write_interval (float): Délai minimal entre deux écritures sur disque,
+                en secondes (0 pour écrire immédiatement)
+            content_cache_size (int): Nombre de contenus gardés en mémoire
+                en mode 'split'
+            history_window (int): Durée pendant laquelle les modifications d'une
+                note sont regroupées en une seule version, en secondes
+            progressive_load (bool): Charger les notes par lots en arrière-plan
+                (voir `load_progress`) au lieu de bloquer jusqu'à la fin du chargement
+            archive_after_days (int): Archiver les notes non modifiées depuis ce
+                nombre de jours (None pour ne rien archiver)
+        """
         # Dictionnaire pour stocker les notes
         self.notes = {}
         self.current_note_id = None
 
+        # Verrou partagé avec le thread d'écriture
+        self.lock = RLock()
+
+        # Index de recherche en mémoire (inutile si le stockage sait chercher)
+        self.search_index = None
+        # Notes triées par date de modification
+        self.recency_index = RecencyIndex()
+        # Notes triées par date de création (critère created: des requêtes)
+        self.created_index = RecencyIndex("created_ts")
+        # catégorie -> identifiants des notes de cette catégorie
+        self.category_index = {}
+
+        # Contenus récemment ouverts (mode 'split' : les contenus sont lus à la demande)
+        self.content_cache = OrderedDict()
+        self.content_cache_size = content_cache_size
+        self._prefetch_queue = None
+        # Notes dont le contenu est déjà indexé (mode 'split' : un contenu est
+        # indexé à sa lecture, ou à la première recherche qui porte sur le contenu)
+        self._content_indexed = set()
+
+        # Dernier préfixe d'identifiant utilisé et compteur associé (voir _new_note_id)
+        self._id_base = None
+        self._id_seq = 0
+        # Propre à ce processus : deux instances ne créent jamais le même identifiant
+        self._id_token = uuid.uuid4().hex[:8]
+
+        # Notes archivées actuellement en mémoire (segments chargés par une recherche)
+        self.archive = None
+        self.archive_after_days = archive_after_days
+        self.archived_ids = set()
+        self._loaded_segments = set()
+
+        # Avancement du chargement progressif
+        self.load_progress = {"loaded": 0, "fraction": 1.0, "done": True}
+        self._loader = None
+
         # Créer dossier de sauvegarde si nécessaire
         self.save_folder = os.path.join(os.path.expanduser("~"), "NotesAI")
         if not os.path.exists(self.save_folder):
             os.makedirs(self.save_folder)
 
+        self.history = NoteHistory(self.save_folder, window=history_window)
+
+        self.store = self._create_store(storage)
+        self.lazy_content = getattr(self.store, "lazy_content", False)
+        self.writer = NoteWriter(self.store, self.lock, self._hot_notes, write_interval)
+        if not hasattr(self.store, "search"):
+            self.search_index = NoteSearchIndex()
+            # L'archive s'appuie sur l'index en mémoire (SQLite garde déjà ses notes sur disque)
+            self.archive = NoteArchive(self.save_folder)
+
         # Charger les notes existantes
-        self.load_notes()
+        if progressive_load:
+            self.start_loading()
+        else:
+            self.load_notes()
+
+    def _new_note_id(self):
+        """
+        Nouvel identifiant de note, unique même pour plusieurs notes créées
+        dans la même seconde (à appeler avec le verrou).
+
+        L'identifiant note_AAAAMMJJHHMMSS_<jeton> inclut un jeton aléatoire
+        propre au processus : une autre fenêtre qui crée une note dans la
+        même seconde ne peut pas remplacer la nôtre. Les notes suivantes de
+        la même seconde reçoivent un suffixe _1, _2, ...
+        """
+        base = f"note_{datetime.now().strftime('%Y%m%d%H%M%S')}_{self._id_token}"
+        seq = self._id_seq if base == self._id_base else 0
+        while True:
+            note_id = base if seq == 0 else f"{base}_{seq}"
+            seq += 1
+            if note_id not in self.notes and (self.archive is None or note_id not in self.archive):
+                break
+        self._id_base, self._id_seq = base, seq
+        return note_id
 
     def create_note(self):
         """Créer une nouvelle note."""
-        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-        note_id = f"note_{timestamp}"
-
-        self.notes[note_id] = {
-            "title": "Nouvelle Note",
-            "content": "",
-            "created": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "modified": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-            "category": "Non classé"
-        }
+        now = int(time.time())
+        with self.lock:
+            note_id = self._new_note_id()
+            self.notes[note_id] = Note(
+                title="Nouvelle Note",
+                content="",
+                created_ts=now,
+                modified_ts=now,
+                category="Non classé"
+            )
+            self.writer.mark_dirty(note_id, Note.FIELDS)
+            self._cache_content(note_id)
+            self._reindex(note_id)
+            self.recency_index.update(note_id, now)
+            self.created_index.update(note_id, now)
+            self._index_category(note_id, self.notes[note_id].category)
 
         self.current_note_id = note_id
-        self.save_notes()
         return note_id
 
+    def create_notes_bulk(self, notes_data, category="Non classé"):
+        """
+        Créer un grand nombre de notes en une seule fois (import).
+
+        Les index sont mis à jour par lot et toutes les notes sont écrites
+        sur disque en une seule opération, au lieu d'une écriture par note.
+
+        Args:
+            notes_data (list): Des dictionnaires avec "title", "content" et
+                éventuellement "category", "created" et "modified" (horodatage
+                ou chaîne "AAAA-MM-JJ HH:MM:SS")
+            category (str): La catégorie des notes qui n'en précisent pas
+
+        Returns:
+            list: Les identifiants des notes créées, dans l'ordre de `notes_data`
+        """
+        now = int(time.time())
+        created = {}
+        with self.lock:
+            for data in notes_data:
+                note_id = self._new_note_id()
+                created[note_id] = Note(
+                    title=data.get("title") or "Sans titre",
+                    content=data.get("content", ""),
+                    created_ts=parse_timestamp(data.get("created", now)),
+                    modified_ts=parse_timestamp(data.get("modified", now)),
+                    category=data.get("category") or category
+                )
+            self.notes.update(created)
+            if self.search_index is not None and self.lazy_content:
+                # Les contenus quittent la mémoire après l'écriture : comme au démarrage,
+                # ils seront indexés à la première recherche (voir _ensure_content_index)
+                self.search_index.add_many({note_id: {"title": note.title, "category": note.category}
+                                            for note_id, note in created.items()})
+            elif self.search_index is not None:
+                self.search_index.add_many(created)
+                self._content_indexed.update(created)
+            self.recency_index.add_many(created)
+            self.created_index.add_many(created)
+            for note_id, note in created.items():
+                self._index_category(note_id, note.category)
+            self.writer.mark_dirty_many(created, Note.FIELDS)
+
+        # Le compactage du journal qui suit un gros import est laissé au thread d'écriture
+        self.writer.flush(compact=False)
+        if self.lazy_content:
+            # Les contenus sont écrits : inutile de les garder tous en mémoire
+            with self.lock:
+                for note_id, note in created.items():
+                    if not self.writer.is_pending(note_id) and note_id not in self.content_cache:
+                        note.pop("content")
+        return list(created)
+
     def get_note(self, note_id):
-        """Obtenir une note par son ID."""
-        return self.notes.get(note_id)
+        """Obtenir une note par son ID (une note archivée est chargée avec son segment)."""
+        note = self.notes.get(note_id)
+        if note is None and self.archive is not None and note_id in self.archive:
+            self._load_segment(self.archive.segment_of(note_id))
+            note = self.notes.get(note_id)
+        if note is not None and self.lazy_content:
+            self.get_content(note_id)
+        return note
+
+    def get_content(self, note_id):
+        """
+        Obtenir le contenu d'une note.
+
+        En mode 'split', le contenu est lu sur disque à la première demande
+        puis gardé dans un cache LRU de `content_cache_size` notes.
+        """
+        with self.lock:
+            note = self.notes.get(note_id)
+            if note is None:
+                return None
+            if "content" in note:
+                if note_id in self.content_cache:
+                    self.content_cache.move_to_end(note_id)
+                return note["content"]
+
+        content = self.store.load_body(note_id)
+        with self.lock:
+            note = self.notes.get(note_id)
+            if note is None:
+                return content
+            # Une modification a pu arriver pendant la lecture : elle est prioritaire
+            content = note.setdefault("content", content)
+            self._cache_content(note_id)
+            if self.search_index is not None and note_id not in self._content_indexed:
+                self.search_index.add(note_id, dict(note, content=content))
+                self._content_indexed.add(note_id)
+        return content
+
+    def _cache_content(self, note_id):
+        """Marquer un contenu comme récemment utilisé et libérer les plus anciens."""
+        if not self.lazy_content:
+            return
+        self.content_cache[note_id] = True
+        self.content_cache.move_to_end(note_id)
+
+        for old_id in list(self.content_cache):
+            if len(self.content_cache) <= self.content_cache_size:
+                break
+            # Un contenu pas encore écrit sur disque doit rester en mémoire
+            if self.writer.is_pending(old_id):
+                continue
+            del self.content_cache[old_id]
+            note = self.notes.get(old_id)
+            if note is not None:
+                note.pop("content", None)
+
+    def prefetch(self, note_ids):
+        """Charger en arrière-plan le contenu de notes (voisines de la sélection)."""
+        if not self.lazy_content:
+            return
+        if self._prefetch_queue is None:
+            self._prefetch_queue = Queue()
+            Thread(target=self._prefetch_worker, daemon=True).start()
+        for note_id in note_ids:
+            self._prefetch_queue.put(note_id)
+
+    def _prefetch_worker(self):
+        """Thread de préchargement des contenus."""
+        while True:
+            note_id = self._prefetch_queue.get()
+            try:
+                self.get_content(note_id)
+            except Exception as e:
+                print(f"Erreur lors du préchargement de la note: {str(e)}")
 
     def update_note(self, note_id, title, content):
         """Mettre à jour une note existante."""
-        if note_id in self.notes:
-            self.notes[note_id]["title"] = title
-            self.notes[note_id]["content"] = content
-            self.notes[note_id]["modified"] = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
-            self.save_notes()
-            return True
+        with self.lock:
+            note = self.notes.get(note_id)
+            if note is not None:
+                self._thaw(note_id)
+                self._record_version(note_id, note, content)
+                note.title = title
+                note.content = content
+                note.modified_ts = int(time.time())
+                self.writer.mark_dirty(note_id, ("title", "content", "modified"))
+                self._cache_content(note_id)
+                self._reindex(note_id)
+                self.recency_index.update(note_id, note.modified_ts)
+                return True
         return False
 
     def update_category(self, note_id, category):
         """Mettre à jour la catégorie d'une note."""
-        if note_id in self.notes:
-            self.notes[note_id]["category"] = category
-            self.save_notes()
-            return True
+        with self.lock:
+            note = self.notes.get(note_id)
+            if note is not None:
+                self._thaw(note_id)
+                self._unindex_category(note_id, note.category)
+                note.category = intern_category(category)
+                self._index_category(note_id, note.category)
+                self.writer.mark_dirty(note_id, ("category",))
+                self._reindex(note_id)
+                return True
         return False
 
+    def update_categories(self, categories, only_from=None):
+        """
+        Mettre à jour la catégorie de plusieurs notes avec une seule écriture sur disque.
+
+        Args:
+            categories (dict): Identifiant de note -> nouvelle catégorie
+            only_from (str): Si précisé, seules les notes qui ont encore cette
+                catégorie sont modifiées (une catégorie choisie entre-temps
+                par l'utilisateur est conservée)
+
+        Returns:
+            list: Les identifiants des notes modifiées
+        """
+        updated = []
+        with self.lock:
+            for note_id, category in categories.items():
+                note = self.notes.get(note_id)
+                if note is None or (only_from is not None and note.category != only_from):
+                    continue
+                self._thaw(note_id)
+                self._unindex_category(note_id, note.category)
+                note.category = intern_category(category)
+                self._index_category(note_id, note.category)
+                self._reindex(note_id)
+                updated.append(note_id)
+            if updated:
+                self.writer.mark_dirty_many(updated, ("category",))
+        if updated:
+            self.writer.flush()
+        return updated
+
     def delete_note(self, note_id):
         """Supprimer une note."""
-        if note_id in self.notes:
-            del self.notes[note_id]
-            self.save_notes()
-            return True
+        with self.lock:
+            if note_id in self.notes:
+                self._forget(note_id)
+                self.writer.mark_deleted(note_id)
+                self.history.delete(note_id)
+                if note_id in self.archived_ids:
+                    self.archived_ids.discard(note_id)
+                    self.archive.release([note_id])
+                return True
         return False
 
+    def _forget(self, note_id):
+        """Retirer une note de la mémoire et des index (sans toucher au stockage)."""
+        self._unindex_category(note_id, self.notes.pop(note_id).category)
+        self.content_cache.pop(note_id, None)
+        self._content_indexed.discard(note_id)
+        if self.search_index is not None:
+            self.search_index.remove(note_id)
+        self.recency_index.remove(note_id)
+        self.created_index.remove(note_id)
+
+    def _hot_notes(self):
+        """Notes du stockage principal, sans les notes archivées chargées en mémoire."""
+        if not self.archived_ids:
+            return self.notes
+        return {note_id: note for note_id, note in self.notes.items()
+                if note_id not in self.archived_ids}
+
+    def _thaw(self, note_id):
+        """Ramener une note archivée dans le stockage principal (avant une modification)."""
+        if note_id in self.archived_ids:
+            self.archived_ids.discard(note_id)
+            # Le segment n'est nettoyé qu'au prochain archivage, une fois la note
+            # écrite dans le stockage principal : un arrêt brutal ne la perd pas
+            self.writer.mark_dirty(note_id, Note.FIELDS)
+
+    def archive_old_notes(self, days=None, min_notes=100):
+        """
+        Déplacer les notes non modifiées depuis `days` jours dans un segment d'archive.
+
+        Les notes archivées ne sont plus chargées au démarrage ni réécrites
+        par les sauvegardes ; elles reviennent en mémoire quand une recherche
+        touche leur segment ou qu'on les ouvre.
+
+        Args:
+            days (int): Ancienneté minimale, en jours (par défaut `archive_after_days`)
+            min_notes (int): Nombre minimal de notes pour créer un segment
+
+        Returns:
+            int: Le nombre de notes archivées
+        """
+        days = self.archive_after_days if days is None else days
+        if self.archive is None or days is None:
+            return 0
+        try:
+            return self._archive_notes(days, min_notes)
+        except Exception as e:
+            print(f"Erreur lors de l'archivage des notes: {str(e)}")
+            return 0
+
+    def _archive_notes(self, days, min_notes):
+        """Archiver les notes anciennes (voir archive_old_notes)."""
+        with self.lock:
+            # Notes revenues dans le stockage principal depuis le dernier archivage
+            stale = [note_id for note_id in self.archive.note_segments
+                     if note_id in self.notes and note_id not in self.archived_ids
+                     and not self.writer.is_pending(note_id)]
+            cutoff = int(time.time()) - days * 86400
+            note_ids = [note_id for note_id in self.recency_index.between(None, cutoff)
+                        if note_id not in self.archived_ids
+                        and not self.writer.is_pending(note_id)]
+        if stale:
+            self.archive.release(stale)
+        if len(note_ids) < min_notes:
+            return 0
+
+        notes = {}
+        for note_id in note_ids:
+            content = self.get_content(note_id)
+            with self.lock:
+                note = self.notes.get(note_id)
+                if note is not None:
+                    notes[note_id] = Note(note.title, content, note.created_ts,
+                                          note.modified_ts, note.category)
+        if self.archive.write_segment(notes) is None:
+            return 0
+
+        archived = 0
+        with self.lock:
+            unchanged = []
+            for note_id, copy in notes.items():
+                note = self.notes.get(note_id)
+                # Une note modifiée pendant l'archivage reste dans le stockage principal
+                if (note is None or note.modified_ts != copy.modified_ts
+                        or note.category != copy.category or self.writer.is_pending(note_id)):
+                    continue
+                unchanged.append(note_id)
+                self._forget(note_id)
+                self.writer.mark_deleted(note_id)
+                archived += 1
+        self.archive.release(set(notes) - set(unchanged))
+        return archived
+
+    def _load_segment(self, name):
+        """Charger en mémoire les notes d'un segment d'archive."""
+        data = self.archive.read_segment(name)
+        with self.lock:
+            if name in self._loaded_segments:
+                return
+            self._loaded_segments.add(name)
+            # Une note aussi présente dans le stockage principal y est plus récente
+            notes = {note_id: Note.from_dict(note) for note_id, note in data.items()
+                     if note_id not in self.notes}
+            self.notes.update(notes)
+            self.archived_ids.update(notes)
+            if self.search_index is not None:
+                self.search_index.add_many(notes)
+                self._content_indexed.update(notes)
+            self.recency_index.add_many(notes)
+            self.created_index.add_many(notes)
+            for note_id, note in notes.items():
+                self._index_category(note_id, note.category)
+
+    def _load_archives_for(self, terms, fuzzy_text=None):
+        """
+        Charger les segments d'archive qui peuvent répondre à une requête.
+
+        Pour une recherche approximative (`fuzzy_text`), les mots du texte
+        sont comparés au vocabulaire des segments par similarité.
+        """
+        if self.archive is None or not self.archive.segments:
+            return
+        if fuzzy_text is not None:
+            names = self.archive.similar_segments(fuzzy_text, self._loaded_segments)
+        else:
+            names = self.archive.candidate_segments(terms, self._loaded_segments)
+        for name in names:
+            self._load_segment(name)
+
+    def poll_external_changes(self):
+        """
+        Intégrer les modifications faites par un autre processus (autre fenêtre,
+        outil de synchronisation) depuis le dernier appel.
+
+        Seules les notes concernées sont mises à jour dans le modèle et les
+        index. Une note modifiée ici et pas encore écrite garde notre version,
+        qui sera écrite par-dessus.
+
+        Returns:
+            set: Les identifiants des notes ajoutées, modifiées ou supprimées
+        """
+        poll = getattr(self.store, "poll_changes", None)
+        if poll is None or not self.load_progress["done"]:
+            return set()
+        try:
+            changes = poll()
+        except Exception as e:
+            print(f"Erreur lors de la lecture des modifications externes: {str(e)}")
+            return set()
+        if not changes:
+            return set()
+
+        with self.lock:
+            if "snapshot" in changes:
+                records = self._diff_snapshot(changes["snapshot"])
+            else:
+                records = changes["records"]
+            changed = set()
+            for record in records:
+                note_id = record.get("id")
+                if note_id is None or self.writer.is_pending(note_id):
+                    continue
+                if self._apply_external(note_id, record):
+                    changed.add(note_id)
+
+        if self.archive is not None and any(r.get("op") == "delete" for r in records):
+            # Les notes supprimées ont peut-être été archivées par l'autre processus
+            self.archive.refresh()
+        return changed
+
+    def _diff_snapshot(self, snapshot):
+        """Enregistrements qui font passer le modèle à l'état d'un instantané complet."""
+        records = []
+        for note_id, data in snapshot.items():
+            note = self.notes.get(note_id)
+            if note is None or any(note.get(field) != value for field, value in data.items()
+                                   if field != "content" or "content" in note):
+                records.append({"op": "put", "id": note_id, "fields": data})
+        records.extend({"op": "delete", "id": note_id} for note_id in self.notes
+                       if note_id not in snapshot and note_id not in self.archived_ids)
+        return records
+
+    def _apply_external(self, note_id, record):
+        """Appliquer un enregistrement venu d'un autre processus ; True si la note a changé."""
+        note = self.notes.get(note_id)
+        if record.get("op") == "delete":
+            if note is None or note_id in self.archived_ids:
+                return False
+            self._forget(note_id)
+            return True
+
+        fields = record.get("fields", {})
+        if note is None:
+            note = self.notes[note_id] = Note.from_dict(fields)
+        else:
+            self._unindex_category(note_id, note.category)
+            for field, value in fields.items():
+                if field in Note.FIELDS:
+                    note[field] = value
+            if self.lazy_content and "content" not in fields:
+                # Contenu modifié sur disque : il sera relu à la demande
+                note.pop("content")
+                self.content_cache.pop(note_id, None)
+        self.archived_ids.discard(note_id)
+        self._index_category(note_id, note.category)
+        self.recency_index.update(note_id, note.modified_ts)
+        self.created_index.update(note_id, note.created_ts)
+        self._reindex(note_id)
+        return True
+
+    def note_matches(self, note_id, search_text="", category=None):
+        """
+        Vérifier qu'une seule note correspond à une recherche et à une catégorie,
+        sans exécuter la recherche sur toutes les notes.
+        """
+        with self.lock:
+            note = self.notes.get(note_id)
+            if note is None or (category is not None and note.category != category):
+                return False
+            terms = parse_query(search_text)
+            if not terms:
+                return True
+            single = {note_id: dict(note, content=self.get_content(note_id))}
+            search_index = NoteSearchIndex()
+            search_index.build(single)
+            dates = {"modified": RecencyIndex(), "created": RecencyIndex("created_ts")}
+            for index in dates.values():
+                index.build({note_id: note})
+            executor = QueryExecutor(search_index, dates, self._field_text)
+            return bool(executor.run(terms, single))
+
+    def count_archived(self):
+        """Nombre de notes archivées (chargées ou non)."""
+        return len(self.archive) if self.archive is not None else 0
+
+    def _record_version(self, note_id, note, new_content=None, force=False):
+        """Conserver dans l'historique le contenu actuel d'une note avant modification."""
+        old_content = note.content if note.content is not None else self.get_content(note_id)
+        if not old_content or old_content == new_content:
+            return False
+        return self.history.record(note_id, note.title, old_content, note.modified_ts, force)
+
+    def record_version(self, note_id):
+        """Enregistrer immédiatement une version (avant une modification par l'IA, par exemple)."""
+        with self.lock:
+            note = self.notes.get(note_id)
+            if note is None:
+                return False
+            return self._record_version(note_id, note, force=True)
+
+    def list_versions(self, note_id):
+        """
+        Lister les versions enregistrées d'une note, de la plus récente à la plus ancienne.
+
+        Returns:
+            list: Des dictionnaires avec l'indice, le titre et les dates formatées
+        """
+        return [dict(version,
+                     recorded=format_timestamp(version["recorded"]),
+                     modified=format_timestamp(version["modified"]))
+                for version in self.history.list_versions(note_id)]
+
+    def get_version(self, note_id, index):
+        """Obtenir le titre et le contenu d'une version d'une note."""
+        version = self.history.get_version(note_id, index)
+        if version is not None:
+            version["modified"] = format_timestamp(version["modified"])
+        return version
+
+    def restore_version(self, note_id, index):
+        """Remplacer le contenu d'une note par une version de son historique."""
+        version = self.history.get_version(note_id, index)
+        if version is None:
+            return False
+        # La version actuelle est conservée pour pouvoir annuler la restauration
+        self.record_version(note_id)
+        return self.update_note(note_id, version["title"], version["content"])
+
+    def _index_category(self, note_id, category):
+        """Ajouter une note à l'index des catégories."""
+        self.category_index.setdefault(category, set()).add(note_id)
+
+    def _unindex_category(self, note_id, category):
+        """Retirer une note de l'index des catégories."""
+        note_ids = self.category_index.get(category)
+        if note_ids is not None:
+            note_ids.discard(note_id)
+            if not note_ids:
+                del self.category_index[category]
+
+    def category_counts(self):
+        """
+        Obtenir le nombre de notes de chaque catégorie.
+
+        Returns:
+            list: Les couples (catégorie, nombre), des plus fournies aux moins fournies
+        """
+        with self.lock:
+            counts = [(category, len(note_ids))
+                      for category, note_ids in self.category_index.items()]
+        return sorted(counts, key=lambda item: (-item[1], item[0]))
+
+    def get_category_notes(self, category, offset=0, limit=None):
+        """
+        Obtenir les notes d'une catégorie, triées par date de modification.
+
+        Le coût dépend du nombre de notes de la catégorie, pas du nombre total de notes.
+        """
+        with self.lock:
+            note_ids = self.category_index.get(category, set())
+            return [(note_id, self.notes[note_id])
+                    for note_id in self.recency_index.top(note_ids, offset, limit)]
+
     def get_all_notes(self):
         """Obtenir toutes les notes."""
         return self.notes
 
-    def get_sorted_notes(self):
-        """Obtenir les notes triées par date de modification."""
-        return sorted(
-            self.notes.items(),
-            key=lambda x: x[1]["modified"],
-            reverse=True
-        )
-
-    def search_notes(self, search_text):
-        """Rechercher des notes par texte."""
-        search_text = search_text.lower()
-        results = []
-
-        for note_id, note in self.notes.items():
-            title = note["title"].lower()
-            content = note["content"].lower()
-            category = note["category"].lower()
-
-            if (search_text in title or
-                    search_text in content or
-                    search_text in category):
-                results.append((note_id, note))
-
-        return sorted(
-            results,
-            key=lambda x: x[1]["modified"],
-            reverse=True
-        )
+    def count_notes(self):
+        """Obtenir le nombre total de notes."""
+        return len(self.notes)
+
+    def get_sorted_notes(self, offset=0, limit=None):
+        """
+        Obtenir les notes triées par date de modification.
+
+        Args:
+            offset (int): Nombre de notes à sauter (pagination)
+            limit (int): Nombre maximal de notes à renvoyer (None pour toutes)
+
+        Returns:
+            list: Les couples (identifiant, note), de la plus récente à la plus ancienne
+        """
+        with self.lock:
+            return [(note_id, self.notes[note_id])
+                    for note_id in self.recency_index.newest(offset, limit)]
+
+    def search_notes(self, search_text, limit=None, offset=0, fuzzy=False, category=None):
+        """
+        Rechercher des notes par texte.
+
+        Le texte peut utiliser le langage de requête de note_query
+        (title:budget category:Travail modified:>2025-01-01 "phrase" -brouillon).
+
+        Args:
+            search_text (str): Le texte ou la requête recherché
+            limit (int): Nombre maximal de résultats (les plus récents d'abord)
+            offset (int): Nombre de résultats à sauter (pagination)
+            fuzzy (bool): Tolérer les fautes de frappe ; les résultats sont alors
+                classés par similarité et par date (index en mémoire uniquement,
+                la syntaxe des requêtes est alors ignorée)
+            category (str): Limiter la recherche à une catégorie exacte (None pour toutes)
+
+        Returns:
+            list: Les couples (identifiant, note), du plus pertinent au moins pertinent
+        """
+        terms = parse_query(search_text)
+
+        if fuzzy and self.search_index is not None:
+            self._load_archives_for(terms, fuzzy_text=search_text)
+            self._ensure_content_index()
+            return self._fuzzy_search(search_text, limit, offset, category)
+
+        self._load_archives_for(terms)
+        if not terms:
+            if category is not None:
+                return self.get_category_notes(category, offset, limit)
+            return self.get_sorted_notes(offset, limit)
+
+        if hasattr(self.store, "search"):
+            self.writer.flush()
+            if is_plain_text(terms) and category is None:
+                note_ids = self.store.search(search_text, limit, offset)
+            else:
+                note_ids = self.store.query(terms, limit, offset, category)
+            with self.lock:
+                return [(note_id, self.notes[note_id]) for note_id in note_ids
+                        if note_id in self.notes]
+
+        if any(term.kind != "date" and term.field in (None, "content") for term in terms):
+            self._ensure_content_index()
+        with self.lock:
+            executor = QueryExecutor(self.search_index,
+                                     {"modified": self.recency_index,
+                                      "created": self.created_index},
+                                     self._field_text)
+            if category is None:
+                note_ids = executor.run(terms, self.notes)
+            else:
+                category_ids = self.category_index.get(category, set())
+                note_ids = executor.run(terms, category_ids) & category_ids
+            return [(note_id, self.notes[note_id])
+                    for note_id in self.recency_index.top(note_ids, offset, limit)]
+
+    def _field_text(self, note_id, field):
+        """Texte d'un champ d'une note (le contenu est lu si nécessaire)."""
+        if field == "content":
+            return self.get_content(note_id)
+        return self.notes[note_id][field]
+
+    def _fuzzy_search(self, search_text, limit, offset, category=None,
+                      recency_weight=0.2, half_life_days=30):
+        """Recherche approximative, classée par similarité puis par fraîcheur."""
+        now = time.time()
+        with self.lock:
+            scores = self.search_index.fuzzy_search(search_text)
+            if scores is None:
+                if category is not None:
+                    return self.get_category_notes(category, offset, limit)
+                return self.get_sorted_notes(offset, limit)
+            if category is not None:
+                category_ids = self.category_index.get(category, set())
+                scores = {note_id: score for note_id, score in scores.items()
+                          if note_id in category_ids}
+
+            def rank(note_id):
+                age_days = max(now - self.notes[note_id].modified_ts, 0) / 86400
+                freshness = 0.5 ** (age_days / half_life_days)
+                return (1 - recency_weight) * scores[note_id] + recency_weight * freshness
+
+            if limit is None:
+                ranked = sorted(scores, key=rank, reverse=True)[offset:]
+            else:
+                ranked = heapq.nlargest(offset + limit, scores, key=rank)[offset:]
+            return [(note_id, self.notes[note_id]) for note_id in ranked]
+
+    def _reindex(self, note_id):
+        """Mettre à jour l'index de recherche pour une note."""
+        if self.search_index is not None:
+            note = self.notes[note_id]
+            if "content" not in note:
+                if note_id not in self._content_indexed:
+                    # Contenu jamais indexé : seuls le titre et la catégorie changent ici
+                    self.search_index.add(note_id, note)
+                    return
+                note = dict(note, content=self.get_content(note_id))
+            self.search_index.add(note_id, note)
+            if self.lazy_content:
+                self._content_indexed.add(note_id)
+
+    def _ensure_content_index(self):
+        """
+        Indexer le contenu des notes qui ne l'est pas encore (mode 'split').
+
+        Le démarrage ne lit aucun contenu : ils sont lus une seule fois, à
+        la première recherche qui en a besoin (les notes ouvertes entre-temps
+        sont déjà indexées).
+        """
+        if not self.lazy_content or self.search_index is None:
+            return
+        with self.lock:
+            if len(self._content_indexed) >= len(self.notes):
+                return
+            note_ids = [note_id for note_id in self.notes if note_id not in self._content_indexed]
+        self._index_contents(note_ids)
+
+    def _index_contents(self, note_ids):
+        """Lire et indexer le contenu de notes (mode 'split')."""
+        for note_id in note_ids:
+            content = self.store.load_body(note_id)
+            with self.lock:
+                # Les notes modifiées entre-temps ont déjà été réindexées
+                if note_id not in self.notes or note_id in self._content_indexed:
+                    continue
+                self.search_index.add(note_id, dict(self.notes[note_id], content=content))
+                self._content_indexed.add(note_id)
+
+    def _create_store(self, storage):
+        """Créer le stockage correspondant au mode demandé."""
+        if storage == "journal":
+            return JournalNoteStore(self.save_folder)
+        if storage == "json":
+            return JsonNoteStore(self.save_folder)
+        if storage == "split":
+            return SplitNoteStore(self.save_folder)
+        if storage == "sqlite":
+            return SQLiteNoteStore(self.save_folder)
+        raise ValueError(f"Mode de stockage {storage} non supporté")
 
     def load_notes(self):
-        """Charger les notes depuis le fichier."""
-        notes_file = os.path.join(self.save_folder, "notes.json")
+        """Charger les notes depuis le stockage."""
+        try:
+            notes = {note_id: Note.from_dict(data) for note_id, data in self.store.load().items()}
+            with self.lock:
+                self.notes = notes
+                self.content_cache.clear()
+                self._content_indexed = set()
+                if self.search_index is not None:
+                    self.search_index.build(self.notes)
+                self.recency_index.build(self.notes)
+                self.created_index.build(self.notes)
+                self.category_index = {}
+                for note_id, note in notes.items():
+                    self._index_category(note_id, note.category)
+                self.archived_ids = set()
+                self._loaded_segments = set()
 
-        if os.path.exists(notes_file):
-            try:
-                with open(notes_file, "r", encoding="utf-8") as f:
-                    self.notes = json.load(f)
-                return len(self.notes)
-            except Exception as e:
-                print(f"Erreur lors du chargement des notes: {str(e)}")
-                return 0
-        return 0
+            self.archive_old_notes()
+            return len(self.notes)
+        except Exception as e:
+            print(f"Erreur lors du chargement des notes: {str(e)}")
+            return 0
 
-    def save_notes(self):
-        """Sauvegarder les notes dans un fichier."""
-        notes_file = os.path.join(self.save_folder, "notes.json")
+    def start_loading(self, batch_size=2000):
+        """
+        Charger les notes par lots dans un thread d'arrière-plan.
+
+        Chaque lot est ajouté au modèle et aux index dès qu'il est lu ;
+        `load_progress` indique le nombre de notes chargées, la proportion
+        du fichier lue et la fin du chargement. Les premiers lots sont les
+        notes les plus récentes si le fichier a été écrit par cette version ;
+        un fichier plus ancien est lu dans son ordre, puis réécrit trié à la
+        fin du chargement pour les démarrages suivants. Si la lecture échoue, la
+        clé "error" décrit l'erreur et les instantanés complets restent
+        suspendus : les notes non lues ne sont pas écrasées sur disque.
+        """
+        with self.lock:
+            self.notes = {}
+            self.content_cache.clear()
+            self._content_indexed = set()
+            if self.search_index is not None:
+                self.search_index.build({})
+            self.recency_index.build({})
+            self.created_index.build({})
+            self.category_index = {}
+            self.archived_ids = set()
+            self._loaded_segments = set()
+            self.load_progress = {"loaded": 0, "fraction": 0.0, "done": False}
+        # Pas d'instantané complet tant que toutes les notes ne sont pas en mémoire
+        self.writer.allow_snapshots(False)
 
+        self._loader = Thread(target=self._load_worker, args=(batch_size,), daemon=True)
+        self._loader.start()
+
+    def _load_worker(self, batch_size):
+        """Thread de chargement progressif."""
+        error = None
         try:
-            with open(notes_file, "w", encoding="utf-8") as f:
-                json.dump(self.notes, f, ensure_ascii=False, indent=2)
-            return True
+            for batch, fraction in self.store.iter_load(batch_size):
+                notes = {note_id: Note.from_dict(data) for note_id, data in batch.items()}
+                with self.lock:
+                    # Une note créée pendant le chargement est prioritaire
+                    notes = {note_id: note for note_id, note in notes.items()
+                             if note_id not in self.notes}
+                    self.notes.update(notes)
+                    if self.search_index is not None:
+                        self.search_index.add_many(notes)
+                    self.recency_index.add_many(notes)
+                    self.created_index.add_many(notes)
+                    for note_id, note in notes.items():
+                        self._index_category(note_id, note.category)
+                    self.load_progress = {"loaded": len(self.notes), "fraction": fraction,
+                                          "done": False}
         except Exception as e:
-            print(f"Erreur lors de la sauvegarde des notes: {str(e)}")
-            return False
\ No newline at end of file
+            print(f"Erreur lors du chargement des notes: {str(e)}")
+            error = str(e)
+
+        if error is not None:
+            # Chargement partiel : pas d'instantané ni d'archivage, qui remplaceraient
+            # le stockage par les seules notes lues (les ajouts au journal restent possibles)
+            with self.lock:
+                self.load_progress = {"loaded": len(self.notes), "fraction": 1.0, "done": True,
+                                      "error": error}
+            return
+        self.writer.allow_snapshots(True)
+
+        # Archiver avant d'annoncer la fin du chargement : la liste affichée est alors définitive
+        self.archive_old_notes()
+        with self.lock:
+            self.load_progress = {"loaded": len(self.notes), "fraction": 1.0, "done": True}
+        if getattr(self.store, "needs_reorder", False):
+            # Fichier d'une ancienne version : le réécrire des notes récentes aux anciennes
+            self.save_notes()
+
+    def save_notes(self):
+        """Sauvegarder toutes les notes (refusé si le chargement est incomplet)."""
+        if not self.writer.snapshots_allowed:
+            return False
+        self.writer.flush()
+        with self.lock:
+            snapshot = {note_id: dict(note) for note_id, note in self._hot_notes().items()}
+        return self.store.save_all(snapshot)
+
+    def flush(self):
+        """Écrire immédiatement les modifications en attente."""
+        return self.writer.flush()
+
+    def close(self):
+        """Écrire les modifications en attente et fermer le stockage."""
+        if self._loader is not None and self._loader.is_alive():
+            # Attendre la fin du chargement pour ne jamais écrire un état partiel
+            self._loader.join()
+        self.writer.close()
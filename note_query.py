@@ -0,0 +1,254 @@
+﻿"""
+Module du langage de requête de la recherche pour l'application NotesAI.
+
+Exemple : title:budget category:Travail modified:>2025-01-01 "phrase exacte" -brouillon
+"""
+import re
+import time
+
+from note_index import tokenize
+
+
+# Noms de champs acceptés dans une requête (anglais et français, sans accents)
+FIELD_ALIASES = {
+    "title": "title", "titre": "title",
+    "content": "content", "contenu": "content",
+    "category": "category", "categorie": "category", "cat": "category",
+    "modified": "modified", "modifie": "modified",
+    "created": "created", "cree": "created",
+}
+
+DATE_FIELDS = ("modified", "created")
+
+# [-][champ:][opérateur]("phrase" | mot)
+TERM_RE = re.compile(r'(-?)(?:(\w+):)?(>=|<=|>|<)?(?:"([^"]*)"?|(\S+))')
+
+DATE_RE = re.compile(r"^(\d{4})(?:-(\d{1,2})(?:-(\d{1,2}))?)?$")
+
+
+class QueryTerm:
+    """Un critère de la requête : un mot, une phrase ou un intervalle de dates."""
+
+    __slots__ = ("kind", "field", "value", "negated")
+
+    def __init__(self, kind, field, value, negated=False):
+        # kind : 'word', 'phrase' ou 'date'
+        self.kind = kind
+        # Champ visé : 'title', 'content', 'category', 'modified', 'created' ou None
+        self.field = field
+        # Mot normalisé, tuple de mots normalisés ou intervalle (début, fin)
+        self.value = value
+        self.negated = negated
+
+    def __repr__(self):
+        sign = "-" if self.negated else ""
+        return f"{sign}{self.kind}({self.field}:{self.value!r})"
+
+
+def _date_range(text):
+    """
+    Intervalle [début, fin[ couvert par une date AAAA, AAAA-MM ou AAAA-MM-JJ.
+
+    Renvoie None si la date est incomplète ou invalide.
+    """
+    match = DATE_RE.match(text)
+    if not match:
+        return None
+    year, month, day = (int(part) if part else None for part in match.groups())
+    try:
+        if month is None:
+            start, end = (year, 1, 1), (year + 1, 1, 1)
+        elif day is None:
+            start = (year, month, 1)
+            end = (year + 1, 1, 1) if month == 12 else (year, month + 1, 1)
+        else:
+            start, end = (year, month, day), (year, month, day + 1)
+        if not 1 <= start[1] <= 12 or not 1 <= start[2] <= 31:
+            return None
+        # mktime normalise le jour suivant (32 janvier -> 1er février)
+        return (int(time.mktime(start + (0, 0, 0, 0, 0, -1))),
+                int(time.mktime(end + (0, 0, 0, 0, 0, -1))))
+    except (OverflowError, ValueError):
+        return None
+
+
+def _date_term(field, operator, text, negated):
+    """Critère de date pour `champ:[opérateur]date`."""
+    bounds = _date_range(text)
+    if bounds is None:
+        return None
+    start, end = bounds
+    if operator == ">":
+        bounds = (end, None)
+    elif operator == ">=":
+        bounds = (start, None)
+    elif operator == "<":
+        bounds = (None, start)
+    elif operator == "<=":
+        bounds = (None, end)
+    return QueryTerm("date", field, bounds, negated)
+
+
+def parse_query(text):
+    """
+    Découper une requête en critères.
+
+    Syntaxe :
+        mot               les notes contenant le mot (préfixe ou sous-chaîne)
+        "deux mots"       la phrase exacte
+        champ:mot         le mot dans un seul champ (title, content, category)
+        modified:>=2025   une date (AAAA, AAAA-MM ou AAAA-MM-JJ) avec
+                          éventuellement >, >=, < ou <= (aussi created:)
+        -critère          exclure les notes qui correspondent au critère
+
+    Un champ inconnu ("http:...") est traité comme du texte, et une date
+    incomplète (en cours de saisie) est ignorée.
+
+    Returns:
+        list: Les critères (QueryTerm), dans l'ordre de la requête
+    """
+    terms = []
+    for match in TERM_RE.finditer(text):
+        negated, field, operator, phrase, word = match.groups()
+        negated = bool(negated)
+        if field is not None:
+            field_name = FIELD_ALIASES.get(tokenize(field)[0])
+            if field_name is None:
+                # Pas un champ : on recherche le texte tel quel
+                field = None
+                word = match.group(0).lstrip("-")
+                phrase = None
+                operator = None
+            else:
+                field = field_name
+
+        if field in DATE_FIELDS:
+            term = _date_term(field, operator, phrase if phrase is not None else word, negated)
+            if term is not None:
+                terms.append(term)
+            continue
+
+        if operator:
+            # Opérateur de comparaison hors d'un champ de date : simple texte
+            word = operator + (word or "")
+        if phrase is not None:
+            words = tuple(tokenize(phrase))
+            if len(words) > 1:
+                terms.append(QueryTerm("phrase", field, words, negated))
+                continue
+        else:
+            words = tokenize(word)
+        # Un mot composé ("l'été", "e-mail") donne plusieurs critères
+        terms.extend(QueryTerm("word", field, token, negated) for token in words)
+    return terms
+
+
+def is_plain_text(terms):
+    """Indiquer si la requête n'utilise que des mots, sans champ, phrase ni exclusion."""
+    return all(term.kind == "word" and term.field is None and not term.negated for term in terms)
+
+
+class QueryExecutor:
+    """
+    Exécution d'une requête sur les index en mémoire.
+
+    On part du critère positif le plus sélectif (estimé sur l'index), puis
+    chaque autre critère est soit intersecté comme ensemble, soit vérifié
+    note par note lorsque les candidats sont peu nombreux. Les phrases sont
+    vérifiées en dernier, sur le texte, pour ne charger que peu de contenus.
+    Toutes les notes ne sont parcourues que si la requête n'a aucun critère
+    positif (uniquement des exclusions).
+    """
+
+    # En dessous de ce nombre de candidats, on vérifie note par note
+    VERIFY_LIMIT = 512
+
+    def __init__(self, search_index, date_indexes, get_text):
+        """
+        Args:
+            search_index (NoteSearchIndex): L'index des mots
+            date_indexes (dict): 'modified' / 'created' -> RecencyIndex
+            get_text (callable): (identifiant, champ) -> texte du champ
+        """
+        self.search_index = search_index
+        self.date_indexes = date_indexes
+        self.get_text = get_text
+
+    def estimate(self, term):
+        """Nombre approximatif de notes correspondant à un critère."""
+        if term.kind == "date":
+            return self.date_indexes[term.field].count_between(*term.value)
+        if term.kind == "phrase":
+            return min(self.search_index.estimate(word) for word in term.value)
+        return self.search_index.estimate(term.value)
+
+    def term_ids(self, term):
+        """Ensemble des notes correspondant à un critère (phrases : sur-ensemble)."""
+        if term.kind == "date":
+            return self.date_indexes[term.field].between(*term.value)
+        if term.kind == "phrase":
+            ids = None
+            for word in sorted(term.value, key=self.search_index.estimate):
+                word_ids = self.search_index.word_ids(word, term.field)
+                ids = word_ids if ids is None else ids & word_ids
+                if not ids:
+                    break
+            return ids
+        return self.search_index.word_ids(term.value, term.field)
+
+    def matches(self, note_id, term):
+        """Vérifier un critère pour une seule note."""
+        if term.kind == "date":
+            value = self.date_indexes[term.field].date_of(note_id)
+            start, end = term.value
+            return (value is not None and (start is None or value >= start)
+                    and (end is None or value < end))
+        if term.kind == "phrase":
+            # La phrase doit commencer au début d'un mot
+            phrase = " " + " ".join(term.value)
+            fields = (term.field,) if term.field else ("title", "content", "category")
+            return any(phrase in " " + " ".join(tokenize(self.get_text(note_id, field) or ""))
+                       for field in fields)
+        return self.search_index.has_word(note_id, term.value, term.field)
+
+    def run(self, terms, all_ids):
+        """
+        Exécuter les critères.
+
+        Args:
+            terms (list): Les critères renvoyés par parse_query
+            all_ids (iterable): Toutes les notes (utilisé seulement sans critère positif)
+
+        Returns:
+            set: Les identifiants des notes correspondantes
+        """
+        positive = sorted((term for term in terms if not term.negated), key=self.estimate)
+        negative = [term for term in terms if term.negated]
+
+        if positive:
+            candidates = self.term_ids(positive[0])
+            if positive[0].kind != "phrase":
+                # Une phrase reste à vérifier : ses mots sont présents, pas forcément dans l'ordre
+                positive = positive[1:]
+        else:
+            candidates = set(all_ids)
+
+        # Critères sur l'index d'abord, phrases (lecture du texte) ensuite
+        checks = ([(term, True) for term in positive if term.kind != "phrase"]
+                  + [(term, False) for term in negative if term.kind != "phrase"]
+                  + [(term, True) for term in positive if term.kind == "phrase"]
+                  + [(term, False) for term in negative if term.kind == "phrase"])
+        for term, expected in checks:
+            if not candidates:
+                break
+            if term.kind == "phrase" or len(candidates) <= self.VERIFY_LIMIT:
+                if term.kind == "phrase" and expected and len(candidates) > self.VERIFY_LIMIT:
+                    # Réduire d'abord par les mots de la phrase
+                    candidates &= self.term_ids(term)
+                candidates = {note_id for note_id in candidates
+                              if self.matches(note_id, term) == expected}
+            elif expected:
+                candidates &= self.term_ids(term)
+            else:
+                candidates -= self.term_ids(term)
+        return candidates
@@ -0,0 +1,1221 @@
+﻿"""
+Module de stockage persistant des notes pour l'application NotesAI.
+"""
+import os
+import re
+import json
+import time
+import codecs
+import sqlite3
+from threading import Thread, Lock, RLock, Event
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+try:
+    import msvcrt
+except ImportError:
+    msvcrt = None
+
+
+class FileLock:
+    """
+    Verrou consultatif partagé entre processus, via un fichier .lock.
+
+    Le verrou est réentrant dans un même processus (le thread d'écriture et
+    le thread d'interface passent par le même objet). Sous Windows, on
+    verrouille le premier octet du fichier avec msvcrt ; ailleurs, flock.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._thread_lock = RLock()
+        self._depth = 0
+        self._file = None
+
+    def __enter__(self):
+        self._thread_lock.acquire()
+        if self._depth == 0:
+            try:
+                self._file = open(self.path, "a+b")
+                if fcntl is not None:
+                    fcntl.flock(self._file.fileno(), fcntl.LOCK_EX)
+                elif msvcrt is not None:
+                    self._file.seek(0)
+                    while True:
+                        try:
+                            msvcrt.locking(self._file.fileno(), msvcrt.LK_LOCK, 1)
+                            break
+                        except OSError:
+                            continue  # LK_LOCK abandonne après dix secondes d'attente
+            except Exception:
+                if self._file is not None:
+                    self._file.close()
+                    self._file = None
+                self._thread_lock.release()
+                raise
+        self._depth += 1
+        return self
+
+    def __exit__(self, *exc_info):
+        self._depth -= 1
+        if self._depth == 0:
+            try:
+                if fcntl is not None:
+                    fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+                elif msvcrt is not None:
+                    self._file.seek(0)
+                    msvcrt.locking(self._file.fileno(), msvcrt.LK_UNLCK, 1)
+            finally:
+                self._file.close()
+                self._file = None
+        self._thread_lock.release()
+        return False
+
+
+class JsonNoteStore:
+    """Stockage historique : un seul fichier notes.json réécrit à chaque écriture."""
+
+    # L'écriture a besoin de toutes les notes, pas seulement des notes modifiées
+    full_snapshot = True
+
+    def __init__(self, save_folder):
+        self.notes_file = os.path.join(save_folder, "notes.json")
+        self.lock = FileLock(os.path.join(save_folder, "notes.lock"))
+        # Signature (date, taille) du fichier lors de notre dernière lecture ou écriture
+        # (gardée telle quelle après une écriture fusionnée, voir commit)
+        self._signature = None
+        # Vrai si le dernier chargement progressif a lu des notes dans le désordre
+        self.needs_reorder = False
+
+    def _file_signature(self):
+        """Date de modification et taille du fichier (None s'il n'existe pas)."""
+        try:
+            stat = os.stat(self.notes_file)
+        except FileNotFoundError:
+            return None
+        return (stat.st_mtime_ns, stat.st_size)
+
+    def load(self):
+        """Charger toutes les notes depuis le fichier."""
+        with self.lock:
+            self._signature = self._file_signature()
+            if self._signature is None:
+                return {}
+            with open(self.notes_file, "r", encoding="utf-8") as f:
+                return json.load(f)
+
+    def iter_load(self, batch_size=2000):
+        """
+        Charger les notes par lots ; produit des couples (lot, progression entre 0 et 1).
+
+        Les notes sont lues dans l'ordre du fichier : les plus récentes
+        d'abord seulement s'il a été écrit par _write_json_atomic. Sinon
+        (fichier d'une ancienne version), `needs_reorder` devient vrai et
+        une sauvegarde complète rétablit l'ordre pour le chargement suivant.
+        """
+        # Le fichier est remplacé atomiquement : la lecture en cours n'est pas affectée
+        self._signature = self._file_signature()
+        self.needs_reorder = False
+        if self._signature is None:
+            return
+        yield from _batches(_check_order(self, iter_json_object(self.notes_file)), batch_size)
+
+    def commit(self, notes, changes):
+        """
+        Enregistrer un lot de modifications (réécrit tout le fichier).
+
+        Si un autre processus a modifié le fichier entre-temps, nos
+        modifications sont appliquées sur sa version au lieu de l'écraser.
+        La signature n'avance pas alors : tant que poll_changes n'a pas
+        relu le fichier, la mémoire n'a pas les notes de l'autre processus,
+        et chaque écriture suivante doit fusionner à son tour.
+        """
+        with self.lock:
+            signature = self._signature
+            if self._file_signature() != signature:
+                try:
+                    with open(self.notes_file, "r", encoding="utf-8") as f:
+                        merged = json.load(f)
+                except Exception as e:
+                    print(f"Erreur lors de la lecture des notes: {str(e)}")
+                    merged = {}
+                for note_id, fields in changes.items():
+                    if fields is None:
+                        merged.pop(note_id, None)
+                    else:
+                        merged[note_id] = notes[note_id]
+                saved = self.save_all(merged)
+                self._signature = signature
+                return saved
+            return self.save_all(notes)
+
+    def save_all(self, notes):
+        """Sauvegarder toutes les notes dans le fichier."""
+        try:
+            with self.lock:
+                _write_json_atomic(self.notes_file, notes)
+                self._signature = self._file_signature()
+            return True
+        except Exception as e:
+            print(f"Erreur lors de la sauvegarde des notes: {str(e)}")
+            return False
+
+    def poll_changes(self):
+        """
+        Détecter les modifications faites par un autre processus.
+
+        Returns:
+            dict: {"snapshot": toutes les notes} si le fichier a changé, sinon None
+        """
+        if self._file_signature() == self._signature:
+            return None
+        with self.lock:
+            return {"snapshot": self.load()}
+
+    def close(self):
+        """Libérer les ressources du stockage."""
+
+
+class JournalNoteStore:
+    """
+    Stockage par journal : chaque modification est ajoutée en fin de fichier.
+
+    Le fichier notes.json sert d'instantané ; notes.journal contient les
+    modifications postérieures (une ligne JSON par modification). Au
+    chargement, le journal est rejoué sur l'instantané. Quand le journal
+    dépasse `compact_threshold` octets, l'écrivain écrit un nouvel
+    instantané et le journal est vidé.
+    """
+
+    full_snapshot = False
+
+    def __init__(self, save_folder, compact_threshold=1024 * 1024, name="notes"):
+        self.save_folder = save_folder
+        self.snapshot_file = os.path.join(save_folder, f"{name}.json")
+        self.journal_file = os.path.join(save_folder, f"{name}.journal")
+        # Journal en cours de compactage (renommé avant l'écriture de l'instantané)
+        self.rotated_file = self.journal_file + ".old"
+        self.compact_threshold = compact_threshold
+
+        # Coordination entre processus : verrou autour des écritures et numéro
+        # de génération incrémenté à chaque nouvel instantané
+        self.lock = FileLock(os.path.join(save_folder, f"{name}.lock"))
+        self.generation_file = os.path.join(save_folder, f"{name}.generation")
+        self._generation = None
+
+        self._journal = None
+        # Octets du journal déjà lus ou écrits par ce processus
+        self._journal_size = 0
+        # Enregistrements d'autres processus lus pendant une écriture, pas encore signalés
+        self._external = []
+        # Vrai si le dernier chargement progressif a lu l'instantané dans le désordre
+        self.needs_reorder = False
+
+    def _read_generation(self):
+        """Numéro de génération de l'instantané sur disque."""
+        try:
+            with open(self.generation_file, "r", encoding="utf-8") as f:
+                return int(f.read().strip() or 0)
+        except (FileNotFoundError, ValueError):
+            return 0
+
+    def _current_journal_size(self):
+        """Taille actuelle du fichier journal."""
+        try:
+            return os.path.getsize(self.journal_file)
+        except FileNotFoundError:
+            return 0
+
+    def load(self):
+        """Charger l'instantané puis rejouer le journal."""
+        with self.lock:
+            notes = {}
+            if os.path.exists(self.snapshot_file):
+                with open(self.snapshot_file, "r", encoding="utf-8") as f:
+                    notes = json.load(f)
+
+            # Un journal renommé subsiste si l'application s'est arrêtée pendant un compactage
+            for path in (self.rotated_file, self.journal_file):
+                if os.path.exists(path):
+                    self._replay(path, notes)
+
+            self._journal_size = self._current_journal_size()
+            self._generation = self._read_generation()
+            self._external = []
+            if self._journal is not None:
+                # Le journal a pu être remplacé par un autre processus
+                self._journal.close()
+                self._journal = None
+        return notes
+
+    def iter_load(self, batch_size=2000):
+        """
+        Charger les notes par lots ; produit des couples (lot, progression entre 0 et 1).
+
+        Le journal (petit, car compacté régulièrement) est lu en premier ;
+        ses enregistrements sont appliqués à chaque note de l'instantané au
+        fil de la lecture, puis les notes créées depuis l'instantané sont
+        produites à la fin. Comme pour JsonNoteStore, les notes récentes
+        viennent d'abord si l'instantané a été écrit par cette version ;
+        sinon `needs_reorder` devient vrai.
+        """
+        self.needs_reorder = False
+        records = {}
+        with self.lock:
+            for path in (self.rotated_file, self.journal_file):
+                if os.path.exists(path):
+                    for record in self._read_records(path):
+                        records.setdefault(record.get("id"), []).append(record)
+            self._journal_size = self._current_journal_size()
+            self._generation = self._read_generation()
+
+        def notes_with_journal():
+            if os.path.exists(self.snapshot_file):
+                snapshot = _check_order(self, iter_json_object(self.snapshot_file))
+                for note_id, note, progress in snapshot:
+                    note = self._apply_records(note_id, note, records.pop(note_id, ()))
+                    if note is not None:
+                        yield note_id, note, progress
+            for note_id, note_records in list(records.items()):
+                note = self._apply_records(note_id, None, note_records)
+                if note is not None:
+                    yield note_id, note, 1.0
+
+        yield from _batches(notes_with_journal(), batch_size)
+
+    def _apply_records(self, note_id, note, records):
+        """Appliquer les enregistrements du journal à une note (None si supprimée)."""
+        notes = {} if note is None else {note_id: note}
+        for record in records:
+            apply_record(notes, record)
+        return notes.get(note_id)
+
+    def _read_records(self, path):
+        """Lire les enregistrements valides d'un fichier journal."""
+        with open(path, "r", encoding="utf-8") as f:
+            for line in f:
+                line = line.strip()
+                if not line:
+                    continue
+                try:
+                    yield json.loads(line)
+                except ValueError:
+                    # Dernière ligne tronquée par un arrêt brutal : on l'ignore
+                    continue
+
+    def _replay(self, path, notes):
+        """Appliquer les enregistrements d'un fichier journal aux notes."""
+        for record in self._read_records(path):
+            apply_record(notes, record)
+
+    def _read_new_records(self):
+        """
+        Lire les enregistrements ajoutés au journal par d'autres processus
+        (à appeler avec le verrou, quand la génération n'a pas changé).
+        """
+        if self._current_journal_size() <= self._journal_size:
+            return []
+        with open(self.journal_file, "rb") as f:
+            f.seek(self._journal_size)
+            data = f.read()
+        # Une ligne incomplète (arrêt brutal d'un autre processus) reste à lire
+        data = data[:data.rfind(b"\n") + 1]
+        self._journal_size += len(data)
+        records = []
+        for line in data.decode("utf-8").splitlines():
+            try:
+                records.append(json.loads(line))
+            except ValueError:
+                continue
+        return records
+
+    def _catch_up(self):
+        """
+        Se resynchroniser avec le journal avant d'y écrire (avec le verrou).
+
+        Les enregistrements des autres processus sont mis de côté pour
+        `poll_changes`. Si un autre processus a écrit un nouvel instantané,
+        le journal a été remplacé : on le rouvre, et `poll_changes`
+        relira tout.
+        """
+        if self._read_generation() != self._generation:
+            if self._journal is not None:
+                self._journal.close()
+                self._journal = None
+            return
+        self._external.extend(self._read_new_records())
+
+    def poll_changes(self):
+        """
+        Détecter les modifications faites par un autre processus.
+
+        Returns:
+            dict: {"records": enregistrements du journal} pour des modifications
+            incrémentales, {"snapshot": toutes les notes} après un compactage
+            fait par un autre processus, ou None si rien n'a changé
+        """
+        if (not self._external and self._current_journal_size() == self._journal_size
+                and self._read_generation() == self._generation):
+            return None
+        with self.lock:
+            if self._read_generation() != self._generation:
+                return {"snapshot": self.load()}
+            records = self._external + self._read_new_records()
+            self._external = []
+            return {"records": records} if records else None
+
+    def commit(self, notes, changes):
+        """Ajouter au journal un enregistrement par note modifiée ou supprimée."""
+        with self.lock:
+            return self._append(notes, changes)
+
+    def _append(self, notes, changes):
+        """Écrire les enregistrements d'un lot dans le journal (avec le verrou)."""
+        lines = []
+        for note_id, fields in changes.items():
+            if fields is None:
+                record = {"op": "delete", "id": note_id}
+            else:
+                note = notes[note_id]
+                record = {"op": "put", "id": note_id,
+                          "fields": {field: note[field] for field in fields}}
+            lines.append(json.dumps(record, ensure_ascii=False) + "\n")
+        data = "".join(lines)
+
+        try:
+            self._catch_up()
+            # Nos enregistrements, écrits après, l'emportent sur ceux des autres processus
+            self._external = [record for record in self._external
+                              if record.get("id") not in changes]
+            if self._journal is None:
+                # Pas de conversion des fins de ligne : les tailles en octets doivent être exactes
+                self._journal = open(self.journal_file, "a", encoding="utf-8", newline="\n")
+            self._journal.write(data)
+            self._journal.flush()
+            os.fsync(self._journal.fileno())
+            if self._read_generation() != self._generation:
+                # Journal remplacé par un autre processus : tout sera relu par poll_changes
+                self._journal_size = self._current_journal_size()
+            else:
+                self._journal_size += len(data.encode("utf-8"))
+            return True
+        except Exception as e:
+            print(f"Erreur lors de l'écriture du journal: {str(e)}")
+            return False
+
+    def needs_compaction(self):
+        """Indiquer si le journal a dépassé le seuil de compactage."""
+        return self._journal_size >= self.compact_threshold
+
+    def compact(self, notes):
+        """
+        Écrire un nouvel instantané et vider le journal.
+
+        Le journal courant est renommé avant l'écriture de l'instantané :
+        en cas d'arrêt pendant l'écriture, il est rejoué au chargement.
+        Le compactage est reporté tant que des modifications d'un autre
+        processus n'ont pas été intégrées (voir poll_changes) : l'instantané
+        les effacerait.
+        """
+        with self.lock:
+            if self._generation is not None and (
+                    self._external or self._read_generation() != self._generation
+                    or self._current_journal_size() != self._journal_size):
+                return False
+            ok = self._write_snapshot(notes)
+            if ok:
+                self._generation = self._read_generation() + 1
+                with open(self.generation_file, "w", encoding="utf-8") as f:
+                    f.write(str(self._generation))
+            return ok
+
+    def _write_snapshot(self, notes):
+        """Remplacer l'instantané et vider le journal (avec le verrou)."""
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+        if os.path.exists(self.journal_file):
+            if os.path.exists(self.rotated_file):
+                # Un compactage précédent a échoué : on conserve ses enregistrements
+                with open(self.rotated_file, "a", encoding="utf-8") as dst, \
+                        open(self.journal_file, "r", encoding="utf-8") as src:
+                    dst.write(src.read())
+                os.remove(self.journal_file)
+            else:
+                os.replace(self.journal_file, self.rotated_file)
+        self._journal_size = 0
+
+        try:
+            _write_json_atomic(self.snapshot_file, notes)
+            if os.path.exists(self.rotated_file):
+                os.remove(self.rotated_file)
+            return True
+        except Exception as e:
+            # Le journal renommé est conservé : il sera rejoué au prochain chargement
+            print(f"Erreur lors du compactage du journal: {str(e)}")
+            return False
+
+    def save_all(self, notes):
+        """Sauvegarder toutes les notes dans un nouvel instantané."""
+        return self.compact(notes)
+
+    def close(self):
+        """Fermer le journal."""
+        if self._journal is not None:
+            self._journal.close()
+            self._journal = None
+
+
+class SplitNoteStore(JournalNoteStore):
+    """
+    Stockage séparant les métadonnées des notes de leur contenu.
+
+    Les métadonnées (titre, catégorie, dates) sont tenues dans
+    notes_meta.json et son journal, chargés au démarrage ; le contenu de
+    chaque note est un fichier texte du dossier bodies/, lu à la demande.
+    """
+
+    # Le modèle ne garde en mémoire que les contenus récemment ouverts
+    lazy_content = True
+
+    # Au-delà de ce nombre de contenus dans un lot (import), un seul sync remplace leurs fsync
+    BULK_WRITES = 64
+
+    def __init__(self, save_folder, compact_threshold=1024 * 1024):
+        super().__init__(save_folder, compact_threshold, name="notes_meta")
+        self.bodies_folder = os.path.join(save_folder, "bodies")
+        os.makedirs(self.bodies_folder, exist_ok=True)
+
+    def load(self):
+        """Charger les métadonnées (en migrant notes.json au premier lancement)."""
+        if not os.path.exists(self.snapshot_file):
+            self._migrate_legacy()
+        return super().load()
+
+    def iter_load(self, batch_size=2000):
+        """Charger les métadonnées par lots (en migrant notes.json au premier lancement)."""
+        if not os.path.exists(self.snapshot_file):
+            self._migrate_legacy()
+        yield from super().iter_load(batch_size)
+
+    def _migrate_legacy(self):
+        """Répartir les notes de notes.json entre métadonnées et fichiers de contenu."""
+        if not os.path.exists(os.path.join(self.save_folder, "notes.json")):
+            return
+
+        legacy_store = JournalNoteStore(self.save_folder)
+        legacy_notes = legacy_store.load()
+        legacy_store.close()
+        for note_id, note in legacy_notes.items():
+            self._write_body(note_id, note.get("content", ""))
+        self.compact(legacy_notes)
+        print(f"{len(legacy_notes)} notes migrées depuis notes.json")
+
+    def _body_path(self, note_id):
+        """Chemin du fichier de contenu d'une note."""
+        return os.path.join(self.bodies_folder, f"{note_id}.txt")
+
+    def load_body(self, note_id):
+        """Lire le contenu d'une note."""
+        try:
+            with open(self._body_path(note_id), "r", encoding="utf-8") as f:
+                return f.read()
+        except FileNotFoundError:
+            return ""
+
+    def _write_body(self, note_id, content, sync=True):
+        """Écrire le contenu d'une note via un fichier temporaire (sync : attendre le disque)."""
+        path = self._body_path(note_id)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(content)
+            if sync:
+                f.flush()
+                os.fsync(f.fileno())
+        os.replace(tmp_path, path)
+
+    def commit(self, notes, changes):
+        """Écrire les contenus modifiés puis journaliser les métadonnées."""
+        with self.lock:
+            return self._commit_split(notes, changes)
+
+    def _commit_split(self, notes, changes):
+        """Écrire les contenus et les métadonnées d'un lot (avec le verrou)."""
+        meta_changes = {}
+        bodies = []
+        try:
+            for note_id, fields in changes.items():
+                if fields is None:
+                    if os.path.exists(self._body_path(note_id)):
+                        os.remove(self._body_path(note_id))
+                    meta_changes[note_id] = None
+                    continue
+                if "content" in fields:
+                    bodies.append((note_id, notes[note_id]["content"]))
+                meta_fields = set(fields) - {"content"}
+                if meta_fields:
+                    meta_changes[note_id] = meta_fields
+
+            # Import : un seul os.sync (hors Windows) pour tous les contenus, avant
+            # les métadonnées, au lieu d'un fsync par fichier
+            bulk = len(bodies) > self.BULK_WRITES and hasattr(os, "sync")
+            for note_id, content in bodies:
+                self._write_body(note_id, content, sync=not bulk)
+            if bulk:
+                os.sync()
+        except Exception as e:
+            print(f"Erreur lors de l'écriture du contenu des notes: {str(e)}")
+            return False
+        return super().commit(notes, meta_changes) if meta_changes else True
+
+    def compact(self, notes):
+        """Écrire un nouvel instantané des métadonnées seules."""
+        metadata = {note_id: {field: value for field, value in note.items() if field != "content"}
+                    for note_id, note in notes.items()}
+        return super().compact(metadata)
+
+
+class SQLiteNoteStore:
+    """
+    Stockage dans une base SQLite locale (notes.db).
+
+    Chaque note modifiée est un UPSERT d'une seule ligne. Un index FTS5 sur
+    le titre, le contenu et la catégorie sert à la recherche, triée grâce
+    à un index sur la date de modification.
+
+    Chaque transaction d'écriture reçoit un numéro de révision croissant
+    (clé 'rev' de la table meta), porté par les lignes qu'elle écrit et par
+    les notes qu'elle supprime (table deleted_notes) : les autres processus
+    ne relisent que les lignes de révision supérieure à la dernière vue.
+    """
+
+    NOTE_FIELDS = ("title", "content", "created", "modified", "category")
+    full_snapshot = False
+
+    # Au-delà de ce nombre de lignes dans un lot (import), l'index FTS5 est
+    # complété par une seule requête au lieu du déclencheur ligne par ligne
+    BULK_ROWS = 500
+
+    FTS_INSERT_TRIGGER = """
+        CREATE TRIGGER IF NOT EXISTS notes_ai AFTER INSERT ON notes BEGIN
+            INSERT INTO notes_fts (rowid, title, content, category)
+            VALUES (new.rowid, new.title, new.content, new.category);
+        END"""
+
+    def __init__(self, save_folder):
+        self.db_file = os.path.join(save_folder, "notes.db")
+        self.legacy_file = os.path.join(save_folder, "notes.json")
+        self._lock = Lock()
+        self.conn = sqlite3.connect(self.db_file, check_same_thread=False)
+        self.has_fts = False
+        self._create_schema()
+        # Détection des écritures d'autres processus : PRAGMA data_version change à
+        # chaque transaction validée par une autre connexion
+        self._data_version = None
+        # Dernière révision lue, et révisions écrites par ce processus depuis
+        self._last_rev = 0
+        self._own_revs = set()
+
+    def _create_schema(self):
+        """Créer les tables, index et déclencheurs si nécessaire."""
+        with self.conn:
+            self.conn.execute("""
+                CREATE TABLE IF NOT EXISTS notes (
+                    id TEXT PRIMARY KEY,
+                    title TEXT NOT NULL DEFAULT '',
+                    content TEXT NOT NULL DEFAULT '',
+                    created TEXT NOT NULL DEFAULT '',
+                    modified TEXT NOT NULL DEFAULT '',
+                    category TEXT NOT NULL DEFAULT '',
+                    rev INTEGER NOT NULL DEFAULT 0
+                )""")
+            columns = [row[1] for row in self.conn.execute("PRAGMA table_info(notes)")]
+            if "rev" not in columns:
+                # Base créée par une version précédente
+                self.conn.execute("ALTER TABLE notes ADD COLUMN rev INTEGER NOT NULL DEFAULT 0")
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS notes_modified ON notes (modified DESC)")
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS notes_category ON notes (category, modified DESC)")
+            self.conn.execute("CREATE INDEX IF NOT EXISTS notes_rev ON notes (rev)")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS deleted_notes (id TEXT PRIMARY KEY, rev INTEGER NOT NULL)")
+            self.conn.execute(
+                "CREATE INDEX IF NOT EXISTS deleted_notes_rev ON deleted_notes (rev)")
+            self.conn.execute(
+                "CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT)")
+
+        try:
+            with self.conn:
+                self.conn.execute("""
+                    CREATE VIRTUAL TABLE IF NOT EXISTS notes_fts USING fts5(
+                        title, content, category,
+                        content='notes', content_rowid='rowid',
+                        tokenize='unicode61 remove_diacritics 2'
+                    )""")
+                self.conn.execute(self.FTS_INSERT_TRIGGER)
+                self.conn.executescript("""
+                    CREATE TRIGGER IF NOT EXISTS notes_ad AFTER DELETE ON notes BEGIN
+                        INSERT INTO notes_fts (notes_fts, rowid, title, content, category)
+                        VALUES ('delete', old.rowid, old.title, old.content, old.category);
+                    END;
+                    CREATE TRIGGER IF NOT EXISTS notes_au AFTER UPDATE ON notes BEGIN
+                        INSERT INTO notes_fts (notes_fts, rowid, title, content, category)
+                        VALUES ('delete', old.rowid, old.title, old.content, old.category);
+                        INSERT INTO notes_fts (rowid, title, content, category)
+                        VALUES (new.rowid, new.title, new.content, new.category);
+                    END;
+                """)
+            self.has_fts = True
+        except sqlite3.OperationalError as e:
+            # SQLite compilé sans FTS5 : la recherche se fera par LIKE
+            print(f"FTS5 indisponible, recherche simplifiée: {str(e)}")
+
+    def load(self):
+        """Charger toutes les notes (en migrant notes.json au premier lancement)."""
+        self._migrate_legacy()
+        with self._lock:
+            self._data_version = self._read_data_version()
+            self._last_rev = self._read_rev()
+            rows = self.conn.execute(
+                "SELECT id, title, content, created, modified, category FROM notes").fetchall()
+        return {row[0]: dict(zip(self.NOTE_FIELDS, row[1:])) for row in rows}
+
+    def iter_load(self, batch_size=2000):
+        """Charger les notes par lots, des plus récentes aux plus anciennes."""
+        self._migrate_legacy()
+        with self._lock:
+            self._data_version = self._read_data_version()
+            # Lue avant les notes : une écriture pendant le chargement sera relue par poll_changes
+            self._last_rev = self._read_rev()
+            total = self.conn.execute("SELECT COUNT(*) FROM notes").fetchone()[0]
+            cursor = self.conn.cursor()
+            cursor.execute("""
+                SELECT id, title, content, created, modified, category FROM notes
+                ORDER BY modified DESC""")
+        loaded = 0
+        while True:
+            with self._lock:
+                rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            loaded += len(rows)
+            yield ({row[0]: dict(zip(self.NOTE_FIELDS, row[1:])) for row in rows},
+                   loaded / max(total, 1))
+
+    def _migrate_legacy(self):
+        """Importer une seule fois les notes de notes.json (et de son journal)."""
+        with self._lock:
+            done = self.conn.execute(
+                "SELECT value FROM meta WHERE key = 'migrated_json'").fetchone()
+        if done or not os.path.exists(self.legacy_file):
+            return
+
+        legacy_store = JournalNoteStore(os.path.dirname(self.legacy_file))
+        legacy_notes = legacy_store.load()
+        legacy_store.close()
+        with self._lock, self.conn:
+            rev = self._next_rev()
+            self._upsert_rows([self._row(note_id, note, rev)
+                               for note_id, note in legacy_notes.items()])
+            self.conn.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('migrated_json', '1')")
+        print(f"{len(legacy_notes)} notes migrées depuis notes.json")
+
+    def _upsert_sql(self):
+        """Requête d'insertion ou de mise à jour d'une note."""
+        return """
+            INSERT INTO notes (id, title, content, created, modified, category, rev)
+            VALUES (?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (id) DO UPDATE SET
+                title = excluded.title, content = excluded.content,
+                created = excluded.created, modified = excluded.modified,
+                category = excluded.category, rev = excluded.rev"""
+
+    def _row(self, note_id, note, rev):
+        """Convertir une note en ligne SQL."""
+        return (note_id,) + tuple(note.get(field, "") for field in self.NOTE_FIELDS) + (rev,)
+
+    def _read_rev(self):
+        """Dernière révision validée dans la base."""
+        row = self.conn.execute("SELECT value FROM meta WHERE key = 'rev'").fetchone()
+        return int(row[0]) if row else 0
+
+    def _next_rev(self):
+        """
+        Réserver la révision de la transaction d'écriture en cours (avec le verrou).
+
+        L'incrément est la première écriture de la transaction : SQLite
+        n'admet qu'un écrivain à la fois, les révisions sont donc validées
+        dans l'ordre croissant.
+        """
+        self.conn.execute("""
+            INSERT INTO meta (key, value) VALUES ('rev', 1)
+            ON CONFLICT (key) DO UPDATE SET value = value + 1""")
+        return self._read_rev()
+
+    def commit(self, notes, changes):
+        """Écrire un lot de modifications dans une seule transaction."""
+        deletes = [note_id for note_id, fields in changes.items() if fields is None]
+        try:
+            with self._lock:
+                with self.conn:
+                    rev = self._next_rev()
+                    self._upsert_rows([self._row(note_id, notes[note_id], rev)
+                                       for note_id, fields in changes.items() if fields is not None])
+                    self.conn.executemany("DELETE FROM notes WHERE id = ?",
+                                          [(note_id,) for note_id in deletes])
+                    self.conn.executemany(
+                        "INSERT OR REPLACE INTO deleted_notes (id, rev) VALUES (?, ?)",
+                        [(note_id, rev) for note_id in deletes])
+                # Révision retenue seulement une fois validée : annulée, elle sera réutilisée
+                self._own_revs.add(rev)
+            return True
+        except Exception as e:
+            print(f"Erreur lors de la sauvegarde des notes: {str(e)}")
+            return False
+
+    def _upsert_rows(self, rows):
+        """
+        Écrire des lignes (dans la transaction en cours, avec le verrou).
+
+        Pour un gros lot, le déclencheur d'insertion FTS5 est retiré le
+        temps de la transaction : les nouvelles lignes (rowid supérieur au
+        plus grand existant) sont indexées par un seul INSERT ... SELECT,
+        bien plus rapide. Les lignes mises à jour gardent leur déclencheur.
+        """
+        if not self.has_fts or len(rows) < self.BULK_ROWS:
+            self.conn.executemany(self._upsert_sql(), rows)
+            return
+        last_rowid = self.conn.execute("SELECT COALESCE(MAX(rowid), 0) FROM notes").fetchone()[0]
+        self.conn.execute("DROP TRIGGER IF EXISTS notes_ai")
+        self.conn.executemany(self._upsert_sql(), rows)
+        self.conn.execute("""
+            INSERT INTO notes_fts (rowid, title, content, category)
+            SELECT rowid, title, content, category FROM notes WHERE rowid > ?""", (last_rowid,))
+        self.conn.execute(self.FTS_INSERT_TRIGGER)
+
+    def save_all(self, notes):
+        """Remplacer le contenu de la base par toutes les notes."""
+        try:
+            with self._lock:
+                with self.conn:
+                    rev = self._next_rev()
+                    removed = [(row[0], rev) for row in self.conn.execute("SELECT id FROM notes")
+                               if row[0] not in notes]
+                    self.conn.executemany(
+                        "INSERT OR REPLACE INTO deleted_notes (id, rev) VALUES (?, ?)", removed)
+                    self.conn.execute("DELETE FROM notes")
+                    self._upsert_rows([self._row(note_id, note, rev)
+                                       for note_id, note in notes.items()])
+                self._own_revs.add(rev)
+            return True
+        except Exception as e:
+            print(f"Erreur lors de la sauvegarde des notes: {str(e)}")
+            return False
+
+    def _read_data_version(self):
+        """Compteur de modifications de la base par les autres connexions."""
+        return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def poll_changes(self):
+        """
+        Détecter les modifications faites par un autre processus.
+
+        Seules les lignes et les suppressions de révision supérieure à la
+        dernière vue sont lues (index sur rev) ; celles de nos propres
+        transactions sont ignorées.
+
+        Returns:
+            dict: {"records": enregistrements au format du journal}, ou None
+        """
+        with self._lock:
+            version = self._read_data_version()
+            if version == self._data_version:
+                return None
+            self._data_version = version
+            # Bornées par la révision lue après data_version : une transaction validée
+            # ensuite change data_version et sera lue au prochain appel
+            last, current = self._last_rev, self._read_rev()
+            rows = self.conn.execute("""
+                SELECT rev, id, title, content, created, modified, category FROM notes
+                WHERE rev > ? AND rev <= ?""", (last, current)).fetchall()
+            deleted = self.conn.execute("""
+                SELECT rev, id FROM deleted_notes
+                WHERE rev > ? AND rev <= ?""", (last, current)).fetchall()
+            self._last_rev = max(last, current)
+            own = self._own_revs
+            self._own_revs = {rev for rev in own if rev > self._last_rev}
+
+        # Une note supprimée puis recréée (ou l'inverse) : la révision la plus récente l'emporte
+        events = [(row[0], {"op": "put", "id": row[1],
+                            "fields": dict(zip(self.NOTE_FIELDS, row[2:]))})
+                  for row in rows if row[0] not in own]
+        events.extend((rev, {"op": "delete", "id": note_id})
+                      for rev, note_id in deleted if rev not in own)
+        events.sort(key=lambda event: event[0])
+        records = [record for _, record in events]
+        return {"records": records} if records else None
+
+    def search(self, search_text, limit=None, offset=0):
+        """
+        Identifiants des notes correspondant au texte, triés par date de modification.
+
+        Renvoie None si le texte ne contient aucun mot.
+        """
+        words = re.findall(r"\w+", search_text)
+        if not words:
+            return None
+        # SQLite interprète LIMIT -1 comme « sans limite »
+        page = (-1 if limit is None else limit, offset)
+
+        with self._lock:
+            if self.has_fts:
+                # Chaque mot est cherché comme préfixe : "budg" trouve "budget"
+                match = " ".join(f'"{word}"*' for word in words)
+                rows = self.conn.execute("""
+                    SELECT notes.id FROM notes_fts
+                    JOIN notes ON notes.rowid = notes_fts.rowid
+                    WHERE notes_fts MATCH ?
+                    ORDER BY notes.modified DESC
+                    LIMIT ? OFFSET ?""", (match,) + page).fetchall()
+            else:
+                pattern = f"%{search_text}%"
+                rows = self.conn.execute("""
+                    SELECT id FROM notes
+                    WHERE title LIKE ? OR content LIKE ? OR category LIKE ?
+                    ORDER BY modified DESC
+                    LIMIT ? OFFSET ?""", (pattern, pattern, pattern) + page).fetchall()
+        return [row[0] for row in rows]
+
+    def query(self, terms, limit=None, offset=0, category=None):
+        """
+        Identifiants des notes correspondant aux critères d'une requête
+        (voir note_query.parse_query), triés par date de modification.
+        `category` limite les résultats à une catégorie exacte.
+
+        Chaque mot ou phrase devient une sous-requête FTS5 limitée à son
+        champ ; les dates sont comparées directement sur les colonnes, dont
+        le format "AAAA-MM-JJ HH:MM:SS" se trie comme les dates.
+        """
+        conditions = []
+        params = []
+        for term in terms:
+            if term.kind == "date":
+                start, end = term.value
+                bounds = []
+                if start is not None:
+                    bounds.append(f"notes.{term.field} >= ?")
+                    params.append(self._format_date(start))
+                if end is not None:
+                    bounds.append(f"notes.{term.field} < ?")
+                    params.append(self._format_date(end))
+                condition = " AND ".join(bounds) or "1"
+            elif self.has_fts:
+                if term.kind == "phrase":
+                    match = '"' + " ".join(term.value) + '"'
+                else:
+                    match = f'"{term.value}"*'
+                if term.field is not None:
+                    match = f"{term.field} : {match}"
+                condition = "notes.rowid IN (SELECT rowid FROM notes_fts WHERE notes_fts MATCH ?)"
+                params.append(match)
+            else:
+                pattern = "%" + (" ".join(term.value) if term.kind == "phrase" else term.value) + "%"
+                fields = (term.field,) if term.field else ("title", "content", "category")
+                condition = " OR ".join(f"notes.{field} LIKE ?" for field in fields)
+                params.extend([pattern] * len(fields))
+            conditions.append(f"NOT ({condition})" if term.negated else f"({condition})")
+        if category is not None:
+            conditions.append("notes.category = ?")
+            params.append(category)
+
+        with self._lock:
+            rows = self.conn.execute(f"""
+                SELECT notes.id FROM notes
+                WHERE {" AND ".join(conditions) or "1"}
+                ORDER BY notes.modified DESC
+                LIMIT ? OFFSET ?""", params + [-1 if limit is None else limit, offset]).fetchall()
+        return [row[0] for row in rows]
+
+    @staticmethod
+    def _format_date(timestamp):
+        """Date au format des colonnes (heure locale)."""
+        return time.strftime("%Y-%m-%d %H:%M:%S", time.localtime(timestamp))
+
+    def close(self):
+        """Fermer la connexion à la base."""
+        with self._lock:
+            self.conn.close()
+
+
+class NoteWriter:
+    """
+    Écrivain différé : les modifications sont regroupées et écrites par un thread dédié.
+
+    Le modèle en mémoire reste la référence ; le thread d'interface se
+    contente de marquer les notes modifiées et l'écriture sur disque a lieu
+    au plus une fois par `interval` secondes. Avec un intervalle nul,
+    chaque modification est écrite immédiatement sur le thread appelant.
+    """
+
+    def __init__(self, store, model_lock, get_notes, interval=1.0):
+        """
+        Initialiser l'écrivain.
+
+        Args:
+            store: Le stockage qui reçoit les lots de modifications
+            model_lock (RLock): Le verrou qui protège les notes du modèle
+            get_notes (function): Fonction renvoyant le dictionnaire des notes
+            interval (float): Délai minimal entre deux écritures, en secondes
+        """
+        self.store = store
+        self.model_lock = model_lock
+        self.get_notes = get_notes
+        self.interval = interval
+
+        # note_id -> ensemble des champs modifiés, ou None si la note est supprimée
+        self._pending = {}
+        self._flush_lock = Lock()
+        self._wake = Event()
+        self._closed = False
+        self._last_flush = 0.0
+        # Compactage laissé au thread d'écriture (voir flush)
+        self._compact_due = False
+        # Faux pendant un chargement progressif : un instantané complet serait incomplet
+        self.snapshots_allowed = True
+
+        self._thread = None
+        if interval:
+            self._thread = Thread(target=self._run, daemon=True)
+            self._thread.start()
+
+    def mark_dirty(self, note_id, fields):
+        """Signaler une note modifiée (à appeler avec le verrou du modèle)."""
+        current = self._pending.get(note_id, ())
+        if current is None:
+            # Note supprimée puis recréée : tous les champs sont à réécrire
+            fields = self.get_notes()[note_id].keys()
+            current = ()
+        self._pending[note_id] = set(current) | set(fields)
+        self._schedule()
+
+    def mark_dirty_many(self, note_ids, fields):
+        """Signaler un lot de notes modifiées, avec une seule écriture (verrou du modèle requis)."""
+        notes = self.get_notes()
+        for note_id in note_ids:
+            current = self._pending.get(note_id, ())
+            if current is None:
+                current = notes[note_id].keys()
+            self._pending[note_id] = set(current) | set(fields)
+        self._schedule()
+
+    def mark_deleted(self, note_id):
+        """Signaler une note supprimée (à appeler avec le verrou du modèle)."""
+        self._pending[note_id] = None
+        self._schedule()
+
+    def allow_snapshots(self, allowed):
+        """Autoriser ou suspendre les écritures d'instantanés complets."""
+        self.snapshots_allowed = allowed
+        if allowed and self._pending:
+            self._schedule()
+
+    def is_pending(self, note_id):
+        """Indiquer si une note a des modifications pas encore écrites."""
+        return note_id in self._pending
+
+    def _schedule(self):
+        """Déclencher une écriture, immédiate ou différée."""
+        if self._thread is None:
+            self.flush()
+        else:
+            self._wake.set()
+
+    def _run(self):
+        """Boucle du thread d'écriture."""
+        while not self._closed:
+            self._wake.wait()
+            self._wake.clear()
+            delay = self._last_flush + self.interval - time.monotonic()
+            if delay > 0 and not self._closed:
+                time.sleep(delay)
+            self.flush()
+
+    def flush(self, compact=True):
+        """
+        Écrire immédiatement toutes les modifications en attente.
+
+        Args:
+            compact (bool): False pour laisser un compactage devenu nécessaire
+                au thread d'écriture, sans le faire attendre à l'appelant
+        """
+        with self._flush_lock:
+            with self.model_lock:
+                if self.store.full_snapshot and not self.snapshots_allowed:
+                    return False
+                changes = self._pending
+                self._pending = {}
+                if not changes and not self._compact_due:
+                    return True
+                notes = self.get_notes()
+                if self.store.full_snapshot:
+                    batch = {note_id: dict(note) for note_id, note in notes.items()}
+                else:
+                    batch = {note_id: dict(notes[note_id])
+                             for note_id, fields in changes.items() if fields is not None}
+
+            if changes:
+                self._last_flush = time.monotonic()
+                ok = self.store.commit(batch, changes)
+                if not ok:
+                    # Réessayer au prochain passage sans écraser les modifications plus récentes
+                    with self.model_lock:
+                        for note_id, fields in changes.items():
+                            if note_id not in self._pending:
+                                self._pending[note_id] = fields
+                    return False
+
+            if (self.snapshots_allowed and getattr(self.store, "needs_compaction", None)
+                    and self.store.needs_compaction()):
+                if not compact and self._thread is not None:
+                    # Le thread d'écriture compacte au prochain passage
+                    self._compact_due = True
+                    self._wake.set()
+                    return True
+                self._compact_due = False
+                with self.model_lock:
+                    snapshot = {note_id: dict(note) for note_id, note in self.get_notes().items()}
+                self.store.compact(snapshot)
+            return True
+
+    def close(self):
+        """Écrire les modifications en attente, arrêter le thread et fermer le stockage."""
+        self._closed = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+        self.store.close()
+
+
+def apply_record(notes, record):
+    """Appliquer un enregistrement de journal à un dictionnaire de notes."""
+    note_id = record.get("id")
+    if record.get("op") == "put":
+        notes.setdefault(note_id, {}).update(record.get("fields", {}))
+    elif record.get("op") == "delete":
+        notes.pop(note_id, None)
+
+
+def iter_json_object(path, chunk_size=1024 * 1024):
+    """
+    Lire un objet JSON {clé: valeur, ...} entrée par entrée, sans charger tout le fichier.
+
+    Produit des triplets (clé, valeur, progression entre 0 et 1).
+    """
+    decoder = json.JSONDecoder()
+    utf8 = codecs.getincrementaldecoder("utf-8")()
+    total = max(os.path.getsize(path), 1)
+
+    with open(path, "rb") as f:
+        state = {"buffer": "", "pos": 0, "read": 0, "eof": False}
+
+        def fill():
+            """Lire un morceau de plus ; False à la fin du fichier."""
+            if state["eof"]:
+                return False
+            data = f.read(chunk_size)
+            state["read"] += len(data)
+            state["eof"] = not data
+            state["buffer"] = state["buffer"][state["pos"]:] + utf8.decode(data, final=not data)
+            state["pos"] = 0
+            return True
+
+        def next_char():
+            """Premier caractère significatif (en sautant les espaces)."""
+            while True:
+                buffer = state["buffer"]
+                while state["pos"] < len(buffer) and buffer[state["pos"]] in " \t\r\n\ufeff":
+                    state["pos"] += 1
+                if state["pos"] < len(buffer):
+                    return buffer[state["pos"]]
+                if not fill():
+                    return ""
+
+        def decode_value():
+            """Décoder une valeur JSON complète, en lisant plus si elle est coupée."""
+            while True:
+                try:
+                    value, end = decoder.raw_decode(state["buffer"], state["pos"])
+                    state["pos"] = end
+                    return value
+                except json.JSONDecodeError:
+                    if not fill():
+                        raise
+
+        if next_char() != "{":
+            raise ValueError(f"{path} ne contient pas un objet JSON")
+        state["pos"] += 1
+
+        while True:
+            char = next_char()
+            if char == "}":
+                return
+            if char == ",":
+                state["pos"] += 1
+                continue
+            key = decode_value()
+            if next_char() != ":":
+                raise ValueError(f"{path} : ':' attendu après la clé {key}")
+            state["pos"] += 1
+            next_char()
+            value = decode_value()
+            yield key, value, min(state["read"] / total, 1.0)
+
+
+def _check_order(store, entries):
+    """
+    Transmettre des triplets (clé, note, progression) en signalant au
+    stockage (`needs_reorder`) des notes qui ne vont pas de la plus récente
+    à la plus ancienne.
+    """
+    previous = None
+    for note_id, note, progress in entries:
+        modified = str(note.get("modified", ""))
+        if previous is not None and modified > previous:
+            store.needs_reorder = True
+        previous = modified
+        yield note_id, note, progress
+
+
+def _batches(entries, batch_size):
+    """Regrouper des triplets (clé, valeur, progression) en lots."""
+    batch = {}
+    progress = 0.0
+    for key, value, progress in entries:
+        batch[key] = value
+        if len(batch) >= batch_size:
+            yield batch, progress
+            batch = {}
+    if batch:
+        yield batch, 1.0
+
+
+def _write_json_atomic(path, data):
+    """
+    Écrire un fichier JSON via un fichier temporaire puis un renommage.
+
+    Les notes sont écrites de la plus récente à la plus ancienne pour que
+    le chargement progressif affiche d'abord les notes récentes.
+    """
+    data = dict(sorted(data.items(), key=lambda item: item[1].get("modified", ""), reverse=True))
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        json.dump(data, f, ensure_ascii=False, indent=2)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
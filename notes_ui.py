@@ -2,12 +2,21 @@
 Module d'interface utilisateur principale pour l'application NotesAI.
 """
 import tkinter as tk
-from tkinter import scrolledtext, ttk, messagebox
+from tkinter import scrolledtext, ttk, messagebox, filedialog
+from threading import Thread
 import os
 import json
 
 from theme_manager import ThemeManager, StyledButton
-from ui_components import ResultWindow, create_custom_dialog
+from ui_components import ResultWindow, HistoryWindow, DuplicatesWindow, create_custom_dialog
+from note_importer import FolderImporter
+from note_export import MarkdownMirror
+from note_duplicates import DuplicateFinder
+from ai_async import TkCallbackBridge
+from ai_batch import BatchCategorizer
+
+# Entrée de la liste des modèles pour le routage automatique
+AUTO_MODEL = "auto (le plus rapide)"
 
 class NotesUI:
     """Interface utilisateur principale pour l'application NotesAI."""
@@ -41,14 +50,131 @@ class NotesUI:
         self.category_label = None
         self.date_label = None
         self.search_var = None
+        self.fuzzy_var = None
+        self.fresh_var = None
+        self.category_listbox = None
         self.status_var = None
 
+        # Filtre par catégorie (None pour toutes) et catégories affichées dans le panneau
+        self.category_filter = None
+        self.facet_categories = []
+        self._facet_counts = None
+
+        # Pagination de la liste : seules les notes affichées sont demandées au modèle
+        self.page_size = 200
+        self.listed_ids = []
+
+        # Traitements d'IA en cours : (note, action) -> AIJob
+        self.ai_jobs = {}
+        # Les résultats d'IA arrivent d'autres threads : ils sont traités dans celui de Tk
+        self.ai_bridge = TkCallbackBridge(self.root)
+
+        # Catégorisation de toutes les notes en cours (None si aucune)
+        self.batch_categorizer = None
+
+        # Recherche des doublons, créée au premier usage
+        self.duplicate_finder = None
+
         # Créer l'interface
         self.create_ui()
         self.apply_theme()
 
         # Charger les notes existantes
         self.refresh_note_list()
+        self._loaded_count = 0
+        self.poll_loading()
+
+    def poll_loading(self):
+        """Afficher les notes au fur et à mesure du chargement progressif."""
+        progress = self.note_model.load_progress
+        if progress["loaded"] != self._loaded_count:
+            self._loaded_count = progress["loaded"]
+            self.refresh_note_list()
+
+        if progress.get("error"):
+            self.status_var.set(f"Chargement incomplet : {progress['loaded']} notes lues")
+            messagebox.showwarning(
+                "Chargement incomplet",
+                "Toutes les notes n'ont pas pu être lues :\n"
+                f"{progress['error']}\n\n"
+                "Les notes affichées restent modifiables, mais le fichier de notes "
+                "ne sera pas réécrit en entier avant un chargement complet.")
+            return
+
+        if progress["done"]:
+            if self._loaded_count:
+                message = f"{self.note_model.count_notes()} notes chargées"
+                archived = self.note_model.count_archived()
+                if archived:
+                    message += f" ({archived} archivées, chargées à la demande)"
+                self.status_var.set(message)
+            self.watch_external_changes()
+            return
+
+        self.status_var.set(f"Chargement des notes... {progress['loaded']} "
+                            f"({progress['fraction']:.0%})")
+        self.root.after(200, self.poll_loading)
+
+    def watch_external_changes(self, interval=2000):
+        """Vérifier régulièrement les modifications faites par une autre instance."""
+        changed = self.note_model.poll_external_changes()
+        if changed:
+            self.update_rows(changed)
+        self.root.after(interval, self.watch_external_changes, interval)
+
+    def update_rows(self, note_ids):
+        """
+        Mettre à jour dans la liste les seules lignes des notes modifiées ailleurs.
+
+        Chaque note est retirée de la liste puis réinsérée à sa place (tri par
+        date de modification) si elle correspond encore au filtre affiché.
+        """
+        if self.fuzzy_var.get() and self.search_var.get():
+            # Classement par similarité : l'ordre dépend de toutes les notes
+            self.refresh_note_list()
+            return
+        self.refresh_categories()
+
+        for note_id in note_ids:
+            if note_id in self.listed_ids:
+                index = self.listed_ids.index(note_id)
+                self.note_listbox.delete(index)
+                del self.listed_ids[index]
+
+        search_text = self.search_var.get().lower()
+        # La liste est-elle complète, ou d'autres pages restent-elles à charger ?
+        complete = len(self.listed_ids) % self.page_size != 0 or not self.listed_ids
+        notes = self.note_model.get_all_notes()
+        for note_id in note_ids:
+            note = notes.get(note_id)
+            if note is None or not self.note_model.note_matches(note_id, search_text,
+                                                                self.category_filter):
+                continue
+            # Position par date de modification décroissante
+            index = 0
+            while (index < len(self.listed_ids)
+                   and notes[self.listed_ids[index]].modified_ts >= note.modified_ts):
+                index += 1
+            if index == len(self.listed_ids) and not complete:
+                continue  # Sera affichée avec la page suivante
+            self.note_listbox.insert(index, f"{note['title']} - {note['category']}")
+            self.listed_ids.insert(index, note_id)
+
+        current_id = self.note_model.current_note_id
+        self.note_listbox.selection_clear(0, tk.END)
+        if current_id in self.listed_ids:
+            self.note_listbox.selection_set(self.listed_ids.index(current_id))
+        if current_id in note_ids:
+            if current_id in notes:
+                self.load_note_content(current_id)
+                self.status_var.set("Note modifiée par une autre fenêtre")
+            else:
+                self._set_current_note(None)
+                self.title_entry.delete(0, tk.END)
+                self.title_entry.insert(0, "Sélectionnez une note...")
+                self.text_area.delete(1.0, tk.END)
+                self.update_info_labels()
+                self.status_var.set("Note supprimée par une autre fenêtre")
 
     def toggle_theme_and_update_logo(self):
         self.toggle_theme()
@@ -105,6 +231,36 @@ class NotesUI:
                                highlightthickness=1, highlightbackground=self.theme["border"])
         search_entry.pack(side=tk.LEFT, fill=tk.X, expand=True, padx=5)
 
+        # Recherche approximative (tolère les fautes de frappe) : elle repose sur
+        # l'index en mémoire, absent avec le stockage SQLite, qui n'a pas le bouton
+        self.fuzzy_var = tk.BooleanVar(value=False)
+        if self.note_model.search_index is not None:
+            fuzzy_check = tk.Checkbutton(search_frame, text="≈", variable=self.fuzzy_var,
+                                         command=self.filter_notes,
+                                         bg=self.theme["sidebar_bg"], fg=self.theme["fg"],
+                                         selectcolor=self.theme["text_bg"],
+                                         activebackground=self.theme["sidebar_bg"])
+            fuzzy_check.pack(side=tk.LEFT, padx=(0, 5))
+
+        # Panneau des catégories, avec le nombre de notes de chacune
+        categories_label = tk.Label(left_frame, text="Catégories", font=("Arial", 12, "bold"),
+                                   bg=self.theme["sidebar_bg"], fg=self.theme["fg"])
+        categories_label.pack(anchor=tk.W, padx=10, pady=(5, 5))
+
+        category_frame = tk.Frame(left_frame, bg=self.theme["sidebar_bg"], padx=10)
+        category_frame.pack(fill=tk.X)
+
+        self.category_listbox = tk.Listbox(category_frame, selectmode=tk.SINGLE, height=6,
+                                           exportselection=False,
+                                           bg=self.theme["text_bg"], fg=self.theme["text_fg"],
+                                           font=("Arial", 10), relief=tk.FLAT,
+                                           highlightthickness=1,
+                                           highlightbackground=self.theme["border"],
+                                           selectbackground=self.theme["note_selected"],
+                                           selectforeground=self.theme["text_fg"])
+        self.category_listbox.pack(side=tk.LEFT, fill=tk.X, expand=True)
+        self.category_listbox.bind('<<ListboxSelect>>', self.select_category)
+
         # Étiquette "Mes Notes"
         notes_label = tk.Label(left_frame, text="Mes Notes", font=("Arial", 12, "bold"),
                               bg=self.theme["sidebar_bg"], fg=self.theme["fg"])
@@ -126,7 +282,14 @@ class NotesUI:
         scrollbar = tk.Scrollbar(list_frame, orient=tk.VERTICAL,
                                command=self.note_listbox.yview)
         scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
-        self.note_listbox.config(yscrollcommand=scrollbar.set)
+
+        def on_list_scroll(first, last):
+            scrollbar.set(first, last)
+            # Charger la page suivante quand on arrive en bas de la liste
+            if float(last) >= 1.0:
+                self.load_more_notes()
+
+        self.note_listbox.config(yscrollcommand=on_list_scroll)
 
         # Boutons d'actions pour les notes
         button_frame = tk.Frame(left_frame, bg=self.theme["sidebar_bg"], pady=10)
@@ -140,6 +303,22 @@ class NotesUI:
                                         text="🗑️ Supprimer", command=self.delete_note)
         self.delete_button.pack(side=tk.LEFT, padx=5)
 
+        self.history_button = StyledButton(button_frame, self.theme_manager,
+                                         text="🕘 Historique", command=self.open_history)
+        self.history_button.pack(side=tk.LEFT, padx=5)
+
+        self.import_button = StyledButton(button_frame, self.theme_manager,
+                                        text="📥 Importer", command=self.import_folder)
+        self.import_button.pack(side=tk.LEFT, padx=5)
+
+        self.export_button = StyledButton(button_frame, self.theme_manager,
+                                        text="📤 Exporter", command=self.export_mirror)
+        self.export_button.pack(side=tk.LEFT, padx=5)
+
+        self.duplicates_button = StyledButton(button_frame, self.theme_manager,
+                                            text="🔁 Doublons", command=self.find_duplicates)
+        self.duplicates_button.pack(side=tk.LEFT, padx=5)
+
         # Zone d'édition avec style moderne
         edit_frame = tk.Frame(right_frame, bg=self.theme["bg"], padx=20, pady=10)
         edit_frame.pack(fill=tk.BOTH, expand=True)
@@ -195,6 +374,7 @@ class NotesUI:
         model_label.pack(side=tk.LEFT, padx=(0, 5))
 
         ai_models = [
+            AUTO_MODEL,
             "mistral (local)",
             "llama2 (local)",
             "gemma (local)",
@@ -225,6 +405,19 @@ class NotesUI:
                                             command=lambda: self.process_with_ai("categorie"))
         self.categorize_button.pack(side=tk.LEFT, padx=5)
 
+        self.batch_button = StyledButton(ai_frame, self.theme_manager,
+                                       text="🏷️ Tout catégoriser",
+                                       command=self.categorize_all)
+        self.batch_button.pack(side=tk.LEFT, padx=5)
+
+        # Redemander une réponse au lieu de reprendre celle du cache
+        self.fresh_var = tk.BooleanVar(value=False)
+        fresh_check = tk.Checkbutton(ai_frame, text="Sans cache", variable=self.fresh_var,
+                                     bg=self.theme["bg"], fg=self.theme["fg"],
+                                     selectcolor=self.theme["text_bg"],
+                                     activebackground=self.theme["bg"])
+        fresh_check.pack(side=tk.LEFT, padx=5)
+
         
         # Bouton de thème
         self.theme_button = StyledButton(ai_frame, self.theme_manager, text="Mode Sombre",
@@ -278,9 +471,14 @@ class NotesUI:
         self.theme_button.update_style(self.theme)
         self.new_button.update_style(self.theme)
         self.delete_button.update_style(self.theme)
+        self.history_button.update_style(self.theme)
+        self.import_button.update_style(self.theme)
+        self.export_button.update_style(self.theme)
+        self.duplicates_button.update_style(self.theme)
         self.correct_button.update_style(self.theme)
         self.summarize_button.update_style(self.theme)
         self.categorize_button.update_style(self.theme)
+        self.batch_button.update_style(self.theme)
 
         # Mettre à jour le style ttk
         style = ttk.Style()
@@ -346,37 +544,44 @@ class NotesUI:
     def new_note(self):
         """Créer une nouvelle note."""
         note_id = self.note_model.create_note()
-        self.note_model.current_note_id = note_id
+        self._set_current_note(note_id)
         self.refresh_note_list()
 
         # Sélectionner la nouvelle note
-        items = self.note_listbox.get(0, tk.END)
-        for i, item in enumerate(items):
-            if item.startswith("Nouvelle Note"):
-                self.note_listbox.selection_set(i)
-                self.note_listbox.see(i)
-                break
+        if note_id in self.listed_ids:
+            index = self.listed_ids.index(note_id)
+            self.note_listbox.selection_set(index)
+            self.note_listbox.see(index)
 
         # Mettre à jour l'interface
         self.load_note_content(note_id)
         self.status_var.set("Nouvelle note créée")
 
+    def _set_current_note(self, note_id):
+        """Changer de note courante en annulant les traitements d'IA de la note quittée."""
+        previous = self.note_model.current_note_id
+        if previous and previous != note_id:
+            self.ai_service.cancel_jobs(previous)
+        self.note_model.current_note_id = note_id
+
     def load_selected_note(self, event=None):
         """Charger la note sélectionnée."""
         if not self.note_listbox.curselection():
             return
 
         index = self.note_listbox.curselection()[0]
-        display_title = self.note_listbox.get(index)
+        if index >= len(self.listed_ids):
+            return
+
+        note_id = self.listed_ids[index]
+        note = self.note_model.get_note(note_id)
+        if note:
+            self._set_current_note(note_id)
+            self.load_note_content(note_id)
+            self.status_var.set(f"Note chargée - Modifiée le {note['modified']}")
 
-        # Trouver la note correspondante
-        for note_id, note in self.note_model.get_all_notes().items():
-            list_title = f"{note['title']} - {note['category']}"
-            if list_title == display_title:
-                self.note_model.current_note_id = note_id
-                self.load_note_content(note_id)
-                self.status_var.set(f"Note chargée - Modifiée le {note['modified']}")
-                break
+        # Précharger les notes voisines pour une navigation fluide
+        self.note_model.prefetch(self.listed_ids[max(index - 2, 0):index + 3])
 
     def load_note_content(self, note_id):
         """Charger le contenu d'une note dans l'interface."""
@@ -434,31 +639,191 @@ class NotesUI:
             self.note_model.delete_note(self.note_model.current_note_id)
             self.refresh_note_list()
 
-            self.note_model.current_note_id = None
+            self._set_current_note(None)
             self.title_entry.delete(0, tk.END)
             self.title_entry.insert(0, "Sélectionnez une note...")
             self.text_area.delete(1.0, tk.END)
             self.update_info_labels()
             self.status_var.set("Note supprimée")
 
+    def open_history(self):
+        """Ouvrir l'historique des versions de la note actuelle."""
+        note_id = self.note_model.current_note_id
+        if not note_id:
+            messagebox.showinfo("Information", "Aucune note sélectionnée")
+            return
+
+        def on_restore():
+            self.load_note_content(note_id)
+            self.refresh_note_list()
+            self.status_var.set("Version restaurée")
+
+        HistoryWindow(self.root, self.note_model, note_id, self.theme, on_restore)
+
+    def refresh_categories(self):
+        """Mettre à jour le panneau des catégories si les nombres de notes ont changé."""
+        counts = self.note_model.category_counts()
+        if counts == self._facet_counts:
+            return
+        self._facet_counts = counts
+
+        self.category_listbox.delete(0, tk.END)
+        self.category_listbox.insert(tk.END, f"Toutes ({self.note_model.count_notes()})")
+        self.facet_categories = [None]
+        for category, count in counts:
+            self.category_listbox.insert(tk.END, f"{category} ({count})")
+            self.facet_categories.append(category)
+
+        # La catégorie filtrée a disparu : revenir à toutes les notes, en
+        # reconstruisant la liste affichée avec listed_ids
+        if self.category_filter not in self.facet_categories:
+            self.category_filter = None
+            self.category_listbox.selection_set(0)
+            self.filter_notes()
+            return
+        self.category_listbox.selection_set(self.facet_categories.index(self.category_filter))
+
+    def select_category(self, event=None):
+        """Filtrer la liste sur la catégorie choisie dans le panneau."""
+        if not self.category_listbox.curselection():
+            return
+        index = self.category_listbox.curselection()[0]
+        if index < len(self.facet_categories):
+            self.category_filter = self.facet_categories[index]
+            self.filter_notes()
+
+    def import_folder(self):
+        """Importer un dossier de fichiers .txt / .md en arrière-plan."""
+        folder = filedialog.askdirectory(parent=self.root, title="Dossier à importer")
+        if not folder:
+            return
+
+        importer = FolderImporter(self.note_model)
+        Thread(target=importer.import_folder, args=(folder,), daemon=True).start()
+        self.import_button.config(state=tk.DISABLED)
+        self.poll_import(importer)
+
+    def poll_import(self, importer):
+        """Afficher l'avancement de l'import dans la barre d'état."""
+        progress = importer.progress
+        if not progress["done"]:
+            self.status_var.set(f"Import... {progress['read']}/{progress['total']} fichiers lus")
+            self.root.after(200, self.poll_import, importer)
+            return
+
+        self.import_button.config(state=tk.NORMAL)
+        self.refresh_note_list()
+        self.status_var.set(f"{progress['created']} notes importées")
+
+    def export_mirror(self):
+        """Mettre à jour la copie Markdown des notes dans un dossier, en arrière-plan."""
+        folder = filedialog.askdirectory(parent=self.root, title="Dossier d'export Markdown")
+        if not folder:
+            return
+
+        mirror = MarkdownMirror(self.note_model, folder)
+        result = {}
+        Thread(target=lambda: result.update(stats=mirror.run()), daemon=True).start()
+        self.export_button.config(state=tk.DISABLED)
+        self.poll_export(mirror, result)
+
+    def poll_export(self, mirror, result):
+        """Afficher l'avancement de l'export dans la barre d'état."""
+        progress = mirror.progress
+        if "stats" not in result:
+            self.status_var.set(f"Export... {progress['written']}/{progress['total']} notes écrites")
+            self.root.after(200, self.poll_export, mirror, result)
+            return
+
+        self.export_button.config(state=tk.NORMAL)
+        stats = result["stats"]
+        if stats is None:
+            self.status_var.set("Erreur lors de l'export")
+        else:
+            self.status_var.set(f"Export terminé : {stats['written']} écrites, "
+                                f"{stats['deleted']} supprimées, {stats['unchanged']} inchangées")
+
+    def find_duplicates(self):
+        """Rechercher les notes presque identiques en arrière-plan."""
+        # Le même objet garde les signatures en mémoire d'une recherche à l'autre
+        if self.duplicate_finder is None:
+            self.duplicate_finder = DuplicateFinder(self.note_model)
+        finder = self.duplicate_finder
+        result = {}
+        Thread(target=lambda: result.update(clusters=finder.find_clusters()), daemon=True).start()
+        self.duplicates_button.config(state=tk.DISABLED)
+        self.poll_duplicates(finder, result)
+
+    def poll_duplicates(self, finder, result):
+        """Afficher l'avancement de la recherche, puis les groupes trouvés."""
+        progress = finder.progress
+        if "clusters" not in result:
+            self.status_var.set(f"Recherche des doublons... {progress['hashed']}/{progress['total']} notes analysées")
+            self.root.after(200, self.poll_duplicates, finder, result)
+            return
+
+        self.duplicates_button.config(state=tk.NORMAL)
+        clusters = result["clusters"]
+        if clusters is None:
+            self.status_var.set("Erreur lors de la recherche des doublons")
+            return
+        self.status_var.set(f"{len(clusters)} groupes de notes en double")
+        DuplicatesWindow(self.root, self.note_model, clusters, self.theme, self.open_note)
+
+    def open_note(self, note_id):
+        """Afficher une note dans l'éditeur (depuis une autre fenêtre)."""
+        note = self.note_model.get_note(note_id)
+        if note is None:
+            return
+        self._set_current_note(note_id)
+        self.load_note_content(note_id)
+        if note_id in self.listed_ids:
+            index = self.listed_ids.index(note_id)
+            self.note_listbox.selection_clear(0, tk.END)
+            self.note_listbox.selection_set(index)
+            self.note_listbox.see(index)
+        self.status_var.set(f"Note chargée - Modifiée le {note['modified']}")
+
     def filter_notes(self, *args):
         """Filtrer les notes par recherche."""
+        # Une nouvelle recherche repart de la première page
+        self.listed_ids = []
         self.refresh_note_list()
 
     def refresh_note_list(self):
         """Mettre à jour la liste des notes."""
+        self.refresh_categories()
+        # Conserver au moins autant de notes que celles déjà affichées
+        limit = max(self.page_size, len(self.listed_ids))
         self.note_listbox.delete(0, tk.END)
+        self.listed_ids = []
+        self._append_notes(self._fetch_notes(0, limit))
+
+    def load_more_notes(self):
+        """Ajouter la page suivante à la liste des notes."""
+        if len(self.listed_ids) % self.page_size:
+            return  # La dernière page est déjà affichée
+        self._append_notes(self._fetch_notes(len(self.listed_ids), self.page_size))
 
+    def _fetch_notes(self, offset, limit):
+        """Obtenir une page de notes (filtrée par la recherche et la catégorie éventuelles)."""
         search_text = self.search_var.get().lower() if self.search_var else ""
 
         if search_text:
-            notes = self.note_model.search_notes(search_text)
-        else:
-            notes = self.note_model.get_sorted_notes()
-
+            fuzzy = self.fuzzy_var.get() if self.fuzzy_var else False
+            return self.note_model.search_notes(search_text, limit=limit, offset=offset,
+                                                fuzzy=fuzzy, category=self.category_filter)
+        if self.category_filter is not None:
+            return self.note_model.get_category_notes(self.category_filter,
+                                                      offset=offset, limit=limit)
+        return self.note_model.get_sorted_notes(offset=offset, limit=limit)
+
+    def _append_notes(self, notes):
+        """Ajouter des notes à la fin de la liste."""
         for note_id, note in notes:
             display_text = f"{note['title']} - {note['category']}"
             self.note_listbox.insert(tk.END, display_text)
+            self.listed_ids.append(note_id)
 
             # Si c'est la note actuelle, la sélectionner
             if note_id == self.note_model.current_note_id:
@@ -468,6 +833,13 @@ class NotesUI:
         """Mettre à jour le modèle d'IA sélectionné."""
         selected = self.model_var.get()
         
+        if selected == AUTO_MODEL:
+            # Chaque demande va au fournisseur le plus rapide, doublée si elle tarde
+            self.ai_service.set_auto_routing(True)
+            self.status_var.set("Routage automatique vers le modèle le plus rapide")
+            return
+        self.ai_service.set_auto_routing(False)
+
         # Extraire nom + fournisseur
         if "(openai)" in selected:
             model_name = selected.split(" (")[0]
@@ -494,33 +866,97 @@ class NotesUI:
             messagebox.showinfo("Information", "La note est vide")
             return
 
+        # Un même traitement déjà demandé pour cette note n'est pas relancé
+        note_id = self.note_model.current_note_id
+        job = self.ai_jobs.get((note_id, action_type))
+        if job is not None and job.state in ("queued", "running"):
+            self.status_var.set("Traitement déjà en cours pour cette note")
+            return
+
         # Mise à jour du statut
-        self.status_var.set(f"Traitement avec {self.ai_service.get_model()}...")
+        if self.ai_service.auto_routing:
+            self.status_var.set("Traitement (routage automatique)...")
+        else:
+            self.status_var.set(f"Traitement avec {self.ai_service.get_model()}...")
         self.root.update_idletasks()
 
+        # Le résumé s'affiche au fur et à mesure de sa génération
+        stream_window = None
+        if action_type == "resume":
+            stream_window = ResultWindow(self.root, "Résumé", "", self.theme, streaming=True)
+
         # Définir la fonction de callback
         def ai_callback(result):
+            self.ai_jobs.pop((note_id, action_type), None)
+            if stream_window is not None:
+                stream_window.finish(None if result["success"] else result["error"])
+            if result.get("cancelled"):
+                # L'utilisateur est passé à une autre note
+                self.status_var.set("Traitement annulé")
+                return
             if result["success"]:
+                origin = " (cache)" if result.get("cached") else ""
+                if self.ai_service.auto_routing and result.get("provider"):
+                    origin += f" via {result['provider']}"
                 if result["action"] == "correction":
+                    # Garder le texte d'origine dans l'historique avant de le remplacer
+                    self.note_model.record_version(note_id)
                     self.text_area.delete(1.0, tk.END)
                     self.text_area.insert(tk.END, result["result"])
                     self.auto_save()
-                    self.status_var.set("Correction appliquée")
+                    self.status_var.set("Correction appliquée" + origin)
                 elif result["action"] == "resume":
-                    ResultWindow(self.root, "Résumé", result["result"], self.theme)
-                    self.status_var.set("Résumé généré")
+                    self.status_var.set("Résumé généré" + origin)
                 elif result["action"] == "categorie":
-                    self.note_model.update_category(self.note_model.current_note_id, result["result"])
+                    self.note_model.update_category(note_id, result["result"])
                     self.update_info_labels()
                     self.refresh_note_list()
                     messagebox.showinfo("Catégorisation", f"Catégorie attribuée: {result['result']}")
-                    self.status_var.set("Catégorie mise à jour")
+                    self.status_var.set("Catégorie mise à jour" + origin)
             else:
                 messagebox.showerror("Erreur", result["error"])
                 self.status_var.set("Erreur lors du traitement")
 
-        # Lancer le traitement
-        self.ai_service.process_with_ai(content, action_type, ai_callback)
+        # Lancer le traitement (annulé si l'utilisateur quitte la note)
+        job = self.ai_service.process_with_ai(content, action_type, self.ai_bridge.wrap(ai_callback),
+                                              use_cache=not self.fresh_var.get(),
+                                              on_chunk=stream_window.append if stream_window else None,
+                                              tag=note_id)
+        if job is not None and job.state in ("queued", "running"):
+            self.ai_jobs[(note_id, action_type)] = job
+
+    def categorize_all(self):
+        """Catégoriser toutes les notes "Non classé" en arrière-plan (ou arrêter)."""
+        if self.batch_categorizer is not None:
+            self.batch_categorizer.stop()
+            self.status_var.set("Arrêt après le lot en cours...")
+            return
+
+        self.batch_categorizer = BatchCategorizer(self.note_model, self.ai_service)
+        self.batch_categorizer.start()
+        self.batch_button.config(text="⏹️ Arrêter")
+        self.poll_batch()
+
+    def poll_batch(self):
+        """Afficher l'avancement et le débit de la catégorisation dans la barre d'état."""
+        progress = self.batch_categorizer.progress
+        if progress["done"]:
+            # Les catégories écrites par lot apparaissent au fur et à mesure
+            self.refresh_categories()
+        if not progress["finished"]:
+            self.status_var.set(f"Catégorisation... {progress['done']}/{progress['total']} notes "
+                                f"({progress['rate']:.1f} notes/s)")
+            self.root.after(500, self.poll_batch)
+            return
+
+        self.batch_categorizer = None
+        self.batch_button.config(text="🏷️ Tout catégoriser")
+        self.refresh_note_list()
+        categorized = progress["done"] - progress["unchanged"] - progress["failed"]
+        self.status_var.set(f"Catégorisation terminée : {categorized} notes catégorisées, "
+                            f"{progress['unchanged']} laissées \"Non classé\", "
+                            f"{progress['failed']} en échec")
+
     def open_api_key_dialog(self):
         """Fenêtre pour saisir et enregistrer une clé API."""
         def save_key():
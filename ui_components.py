@@ -3,12 +3,16 @@ Module de composants d'interface utilisateur pour l'application NotesAI.
 """
 import tkinter as tk
 from tkinter import scrolledtext, messagebox, ttk
+from queue import Queue, Empty
 
 
 class ResultWindow:
     """Fenêtre de résultat pour afficher des contenus générés par l'IA."""
 
-    def __init__(self, root, title, content, theme):
+    # Intervalle d'affichage des fragments reçus en mode flux (millisecondes)
+    STREAM_INTERVAL = 50
+
+    def __init__(self, root, title, content, theme, streaming=False):
         """
         Initialiser une fenêtre de résultat.
 
@@ -17,7 +21,11 @@ class ResultWindow:
             title (str): Le titre de la fenêtre
             content (str): Le contenu à afficher
             theme (dict): Le thème actuel
+            streaming (bool): True si le contenu arrive par fragments (voir append)
         """
+        self.title = title
+        # Fragments reçus d'un autre thread, affichés par la boucle Tk
+        self._chunks = Queue()
         self.window = tk.Toplevel(root)
         self.window.title(title)
         self.window.geometry("600x500")
@@ -28,9 +36,10 @@ class ResultWindow:
         main_frame.pack(fill=tk.BOTH, expand=True)
 
         # Titre
-        title_label = tk.Label(main_frame, text=title, font=("Arial", 16, "bold"),
-                               bg=theme["bg"], fg=theme["fg"])
-        title_label.pack(anchor=tk.W, pady=(0, 15))
+        self.title_label = tk.Label(main_frame, text=f"{title}..." if streaming else title,
+                                    font=("Arial", 16, "bold"),
+                                    bg=theme["bg"], fg=theme["fg"])
+        self.title_label.pack(anchor=tk.W, pady=(0, 15))
 
         # Cadre pour la zone de texte
         text_frame = tk.Frame(main_frame, bg=theme["border"], padx=1, pady=1)
@@ -63,6 +72,39 @@ class ResultWindow:
         self.window.transient(root)
         self.window.grab_set()
 
+        if streaming:
+            self.window.after(self.STREAM_INTERVAL, self._show_chunks)
+
+    def append(self, text):
+        """Ajouter un fragment de texte (utilisable depuis n'importe quel thread)."""
+        self._chunks.put(text)
+
+    def finish(self, error=None):
+        """Signaler la fin du flux, éventuellement en erreur (depuis n'importe quel thread)."""
+        self._chunks.put((error,))
+
+    def _show_chunks(self):
+        """Afficher les fragments reçus depuis le dernier passage."""
+        if not self.window.winfo_exists():
+            return
+        parts = []
+        try:
+            while True:
+                chunk = self._chunks.get_nowait()
+                if isinstance(chunk, tuple):
+                    self.text_area.insert(tk.END, "".join(parts))
+                    if chunk[0]:
+                        self.text_area.insert(tk.END, f"\n\n[{chunk[0]}]")
+                    self.title_label.config(text=self.title)
+                    return
+                parts.append(chunk)
+        except Empty:
+            pass
+        if parts:
+            self.text_area.insert(tk.END, "".join(parts))
+            self.text_area.see(tk.END)
+        self.window.after(self.STREAM_INTERVAL, self._show_chunks)
+
     def copy_to_clipboard(self):
         """Copier le contenu dans le presse-papiers."""
         content = self.text_area.get(1.0, tk.END).strip()
@@ -71,6 +113,219 @@ class ResultWindow:
         messagebox.showinfo("Information", "Copié dans le presse-papiers")
 
 
+class HistoryWindow:
+    """Fenêtre listant les versions d'une note, avec aperçu et restauration."""
+
+    def __init__(self, root, note_model, note_id, theme, on_restore=None):
+        """
+        Initialiser la fenêtre d'historique.
+
+        Args:
+            root (tk.Tk): La fenêtre racine
+            note_model (NoteModel): Le modèle de données pour les notes
+            note_id (str): L'identifiant de la note
+            theme (dict): Le thème actuel
+            on_restore (function): Fonction appelée après une restauration
+        """
+        self.note_model = note_model
+        self.note_id = note_id
+        self.on_restore = on_restore
+        self.versions = note_model.list_versions(note_id)
+
+        self.window = tk.Toplevel(root)
+        self.window.title("Historique de la note")
+        self.window.geometry("800x500")
+        self.window.configure(bg=theme["bg"])
+
+        main_frame = tk.Frame(self.window, bg=theme["bg"], padx=20, pady=20)
+        main_frame.pack(fill=tk.BOTH, expand=True)
+
+        # Liste des versions à gauche, aperçu à droite
+        self.version_listbox = tk.Listbox(main_frame, width=28, font=("Arial", 10),
+                                          bg=theme["text_bg"], fg=theme["text_fg"],
+                                          relief=tk.FLAT, highlightthickness=1,
+                                          highlightbackground=theme["border"],
+                                          selectbackground=theme["note_selected"],
+                                          selectforeground=theme["text_fg"])
+        self.version_listbox.pack(side=tk.LEFT, fill=tk.Y)
+        for version in self.versions:
+            self.version_listbox.insert(tk.END, version["modified"])
+        self.version_listbox.bind('<<ListboxSelect>>', self.show_version)
+
+        right_frame = tk.Frame(main_frame, bg=theme["bg"], padx=10)
+        right_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        self.preview = scrolledtext.ScrolledText(right_frame, wrap=tk.WORD,
+                                                 font=("Arial", 11),
+                                                 bg=theme["text_bg"], fg=theme["text_fg"],
+                                                 relief=tk.FLAT, padx=10, pady=10)
+        self.preview.pack(fill=tk.BOTH, expand=True)
+        if not self.versions:
+            self.preview.insert(tk.END, "Aucune version enregistrée pour cette note.")
+
+        button_frame = tk.Frame(right_frame, bg=theme["bg"], pady=15)
+        button_frame.pack(fill=tk.X)
+
+        restore_button = tk.Button(button_frame, text="Restaurer", relief=tk.FLAT,
+                                   bg=theme["accent"], fg="white",
+                                   padx=10, pady=5, command=self.restore)
+        restore_button.pack(side=tk.LEFT, padx=5)
+
+        close_button = tk.Button(button_frame, text="Fermer", relief=tk.FLAT,
+                                 bg=theme["button_bg"], fg=theme["button_fg"],
+                                 padx=10, pady=5, command=self.window.destroy)
+        close_button.pack(side=tk.RIGHT, padx=5)
+
+        self.window.transient(root)
+        self.window.grab_set()
+
+    def _selected_version(self):
+        """Version sélectionnée dans la liste, ou None."""
+        if not self.version_listbox.curselection():
+            return None
+        return self.versions[self.version_listbox.curselection()[0]]
+
+    def show_version(self, event=None):
+        """Afficher l'aperçu de la version sélectionnée."""
+        version = self._selected_version()
+        if version is None:
+            return
+        data = self.note_model.get_version(self.note_id, version["index"])
+        self.preview.delete(1.0, tk.END)
+        if data:
+            self.preview.insert(tk.END, data["content"])
+
+    def restore(self):
+        """Restaurer la version sélectionnée."""
+        version = self._selected_version()
+        if version is None:
+            messagebox.showinfo("Information", "Aucune version sélectionnée")
+            return
+        if self.note_model.restore_version(self.note_id, version["index"]):
+            self.window.destroy()
+            if self.on_restore:
+                self.on_restore()
+
+
+class DuplicatesWindow:
+    """Fenêtre listant les groupes de notes presque identiques."""
+
+    def __init__(self, root, note_model, clusters, theme, on_open=None):
+        """
+        Initialiser la fenêtre des doublons.
+
+        Args:
+            root (tk.Tk): La fenêtre racine
+            note_model (NoteModel): Le modèle de données pour les notes
+            clusters (list): Les groupes renvoyés par DuplicateFinder.find_clusters
+                (triplets identifiant, titre, date)
+            theme (dict): Le thème actuel
+            on_open (function): Fonction appelée avec l'identifiant de la note à ouvrir
+        """
+        self.note_model = note_model
+        self.clusters = clusters
+        self.on_open = on_open
+        self.cluster_entries = []
+
+        self.window = tk.Toplevel(root)
+        self.window.title("Notes en double")
+        self.window.geometry("900x550")
+        self.window.configure(bg=theme["bg"])
+
+        main_frame = tk.Frame(self.window, bg=theme["bg"], padx=20, pady=20)
+        main_frame.pack(fill=tk.BOTH, expand=True)
+
+        listbox_options = dict(font=("Arial", 10), bg=theme["text_bg"], fg=theme["text_fg"],
+                               relief=tk.FLAT, highlightthickness=1,
+                               highlightbackground=theme["border"],
+                               selectbackground=theme["note_selected"],
+                               selectforeground=theme["text_fg"], exportselection=False)
+
+        # Groupes à gauche, notes du groupe au milieu, aperçu à droite
+        self.cluster_listbox = tk.Listbox(main_frame, width=32, **listbox_options)
+        self.cluster_listbox.pack(side=tk.LEFT, fill=tk.Y)
+        for cluster in clusters:
+            self.cluster_listbox.insert(tk.END, f"{len(cluster)} notes - {self._label(cluster[0])}")
+        self.cluster_listbox.bind('<<ListboxSelect>>', self.show_cluster)
+
+        self.note_listbox = tk.Listbox(main_frame, width=32, **listbox_options)
+        self.note_listbox.pack(side=tk.LEFT, fill=tk.Y, padx=(10, 0))
+        self.note_listbox.bind('<<ListboxSelect>>', self.show_note)
+        self.note_listbox.bind('<Double-Button-1>', self.open_note)
+
+        right_frame = tk.Frame(main_frame, bg=theme["bg"], padx=10)
+        right_frame.pack(side=tk.LEFT, fill=tk.BOTH, expand=True)
+
+        self.preview = scrolledtext.ScrolledText(right_frame, wrap=tk.WORD,
+                                                 font=("Arial", 11),
+                                                 bg=theme["text_bg"], fg=theme["text_fg"],
+                                                 relief=tk.FLAT, padx=10, pady=10)
+        self.preview.pack(fill=tk.BOTH, expand=True)
+        if not clusters:
+            self.preview.insert(tk.END, "Aucune note en double.")
+
+        button_frame = tk.Frame(right_frame, bg=theme["bg"], pady=15)
+        button_frame.pack(fill=tk.X)
+
+        open_button = tk.Button(button_frame, text="Ouvrir", relief=tk.FLAT,
+                                bg=theme["accent"], fg="white",
+                                padx=10, pady=5, command=self.open_note)
+        open_button.pack(side=tk.LEFT, padx=5)
+
+        close_button = tk.Button(button_frame, text="Fermer", relief=tk.FLAT,
+                                 bg=theme["button_bg"], fg=theme["button_fg"],
+                                 padx=10, pady=5, command=self.window.destroy)
+        close_button.pack(side=tk.RIGHT, padx=5)
+
+        self.window.transient(root)
+
+    @staticmethod
+    def _label(entry):
+        """Titre d'une note pour les listes (sans lire la note : voir DuplicateFinder)."""
+        _, title, modified = entry
+        if title is None:
+            return "(supprimée)"
+        return f"{title or 'Sans titre'} ({modified})"
+
+    def show_cluster(self, event=None):
+        """Afficher les notes du groupe sélectionné."""
+        if not self.cluster_listbox.curselection():
+            return
+        self.cluster_entries = self.clusters[self.cluster_listbox.curselection()[0]]
+        self.note_listbox.delete(0, tk.END)
+        for entry in self.cluster_entries:
+            self.note_listbox.insert(tk.END, self._label(entry))
+        self.note_listbox.selection_set(0)
+        self.show_note()
+
+    def _selected_note(self):
+        """Identifiant de la note sélectionnée dans le groupe, ou None."""
+        if not self.note_listbox.curselection():
+            return None
+        return self.cluster_entries[self.note_listbox.curselection()[0]][0]
+
+    def show_note(self, event=None):
+        """Afficher l'aperçu de la note sélectionnée."""
+        note_id = self._selected_note()
+        if note_id is None:
+            return
+        self.preview.delete(1.0, tk.END)
+        # Seule la note affichée est lue (une note archivée est chargée avec son segment)
+        if self.note_model.get_note(note_id) is None:
+            self.preview.insert(tk.END, "(supprimée)")
+            return
+        self.preview.insert(tk.END, self.note_model.get_content(note_id) or "")
+
+    def open_note(self, event=None):
+        """Ouvrir la note sélectionnée dans la fenêtre principale."""
+        note_id = self._selected_note()
+        if note_id is None:
+            messagebox.showinfo("Information", "Aucune note sélectionnée")
+            return
+        if self.on_open:
+            self.on_open(note_id)
+
+
 def create_custom_dialog(root, title, message, theme):
     """
     Créer une boîte de dialogue personnalisée.